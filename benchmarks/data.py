@@ -0,0 +1,44 @@
+# -*- coding: utf-8 -*-
+"""
+Synthetic grade files for the benchmarks.
+"""
+
+import random
+import typing as tp
+
+from uppraisal.helpers import put_excel
+
+COMMENT_TEMPLATES = (
+    '<p>Well done.</p><p>Analysis: {a}/10<br>Presentation: {b}/10</p>',
+    '<p>Good attempt, but see the rubric.</p><ul><li>Analysis: {a}/10</li><li>Presentation: {b}/10</li></ul>',
+    '<p>Please come to office hours.</p><p>Analysis: {a}/10<br>Presentation: {b}/10</p>',
+)
+
+
+def grade_rows(
+        n_rows: int,
+        seed: int = 0,
+        html_format: bool = True
+) -> tp.Iterator[tp.List[tp.Any]]:
+    """
+    Generator of a header row and `n_rows` rows with user ids 1 to n_rows, float grades and rubric-like comments.
+    Comments repeat often, like comments built from a rubric template.
+    """
+
+    rng = random.Random(seed)
+    yield ['user_id', 'grade', 'submission_comment']
+    for user_id in range(1, n_rows + 1):
+        a, b = rng.randint(4, 10), rng.randint(4, 10)
+        comment = rng.choice(COMMENT_TEMPLATES).format(a=a, b=b)
+        if not html_format:
+            comment = f'Analysis: {a}/10, presentation: {b}/10'
+        yield [user_id, round((a + b) / 2, 1), comment]
+
+
+def write_workbook(filepath: str, n_rows: int, seed: int = 0, worksheet_name: str = 'Sheet1') -> str:
+    """
+    Write a synthetic grade workbook with `n_rows` students.
+    """
+
+    put_excel(filepath, grade_rows(n_rows, seed), worksheet_names=worksheet_name)
+    return filepath
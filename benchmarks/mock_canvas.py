@@ -0,0 +1,489 @@
+# -*- coding: utf-8 -*-
+"""
+Local stand-in for the parts of the Canvas API used by uppraisal.
+
+The server keeps grades and comments in memory, so uploads can be checked by listing the submissions afterwards.
+Latency, errors, Progress job duration and the rate limit bucket are configurable, see `MockCanvas`.
+"""
+
+import hashlib
+import json
+import random
+import re
+import threading
+import time
+import typing as tp
+from collections import Counter
+from http.server import BaseHTTPRequestHandler
+from http.server import HTTPServer
+from socketserver import ThreadingMixIn
+from urllib.parse import parse_qs
+from urllib.parse import urlencode
+from urllib.parse import urlparse
+
+API_PREFIX = '/api/v1'
+
+Reply = tp.Tuple[int, tp.Dict[str, str], tp.Any]
+
+
+class ThreadingHTTPServer(ThreadingMixIn, HTTPServer):
+    """
+    HTTP server handling every request in a thread, like `http.server.ThreadingHTTPServer` of Python 3.7 and later.
+    """
+
+    daemon_threads = True
+
+
+class MockCanvas(object):
+    """
+    Canvas stand-in serving update_grades with Progress jobs, single submissions, paginated submission listings per
+    assignment and per course, and attachment downloads with Range requests.
+
+    :param n_students: Number of students enrolled in every assignment, with user ids 1 to n_students.
+    :type n_students: int
+    :param progress_time: Seconds before a Progress job of update_grades completes.
+    :type progress_time: float
+    :param latency: Seconds every request is delayed.
+    :type latency: float
+    :param error_rate: Fraction of requests answered with a 500 error without being processed.
+    :type error_rate: float
+    :param drop_rate: Fraction of requests that are processed, but answered with a 502 error, like a response lost
+    by a proxy.
+    :type drop_rate: float
+    :param bucket_size: Capacity of the rate limit bucket.
+    :type bucket_size: float
+    :param leak_rate: Units per second the rate limit bucket drains.
+    :type leak_rate: float
+    :param request_cost: Units every request adds to the rate limit bucket.
+    :type request_cost: float
+    :param omit_last_link: Boolean indicating whether the "last" link is left out of paginated listings.
+    :type omit_last_link: bool
+    :param points_possible: Points possible of every assignment.
+    :type points_possible: float
+    :param file_size: Size in bytes of the attachment of every submission.
+    :type file_size: int
+    :param seed: Seed for the injected errors.
+    :type seed: int
+    """
+
+    def __init__(
+            self,
+            n_students: int = 1000,
+            progress_time: float = 0.5,
+            latency: float = 0.0,
+            error_rate: float = 0.0,
+            drop_rate: float = 0.0,
+            bucket_size: float = 700.0,
+            leak_rate: float = 10000.0,
+            request_cost: float = 1.0,
+            omit_last_link: bool = False,
+            points_possible: float = 10.0,
+            file_size: int = 1024,
+            seed: int = 0
+    ):
+        self.n_students = n_students
+        self.progress_time = progress_time
+        self.latency = latency
+        self.error_rate = error_rate
+        self.drop_rate = drop_rate
+        self.bucket_size = bucket_size
+        self.leak_rate = leak_rate
+        self.request_cost = request_cost
+        self.omit_last_link = omit_last_link
+        self.points_possible = points_possible
+        self.file_size = file_size
+        self.stats: tp.Counter[str] = Counter()
+        self.grades: tp.Dict[tp.Tuple[int, int, int], tp.Any] = {}
+        self.comments: tp.Dict[tp.Tuple[int, int, int], tp.List[str]] = {}
+        self.progress: tp.Dict[int, float] = {}
+        self._bucket_level = 0.0
+        self._bucket_time = time.monotonic()
+        self._random = random.Random(seed)
+        self._lock = threading.Lock()
+        self._server: tp.Optional[ThreadingHTTPServer] = None
+        self._routes = [
+            ('POST', re.compile(r'/courses/(\d+)/assignments/(\d+)/submissions/update_grades$'), self.update_grades),
+            ('PUT', re.compile(r'/courses/(\d+)/assignments/(\d+)/submissions/(\d+)$'), self.put_submission),
+            ('GET', re.compile(r'/courses/(\d+)/assignments/(\d+)/submissions/(\d+)$'), self.get_submission),
+            ('GET', re.compile(r'/courses/(\d+)/assignments/(\d+)$'), self.get_assignment),
+            ('GET', re.compile(r'/courses/(\d+)/assignments/(\d+)/submissions$'), self.list_submissions),
+            ('GET', re.compile(r'/courses/(\d+)/students/submissions$'), self.list_student_submissions),
+            ('GET', re.compile(r'/progress/(\d+)$'), self.get_progress),
+            ('GET', re.compile(r'/files/(\d+)/download$'), self.download_file),
+        ]
+
+    @property
+    def base_url(self) -> str:
+        host, port = self._server.server_address[:2]
+        return f'http://{host}:{port}{API_PREFIX}'
+
+    def start(self, host: str = '127.0.0.1', port: int = 0) -> 'MockCanvas':
+        mock = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = 'HTTP/1.1'
+            disable_nagle_algorithm = True
+
+            def _handle(self) -> None:
+                length = int(self.headers.get('Content-Length') or 0)
+                body = self.rfile.read(length) if length else b''
+                status, headers, payload = mock.dispatch(self.command, self.path, body, dict(self.headers))
+                data = payload if isinstance(payload, bytes) else json.dumps(payload).encode('utf-8')
+                self.send_response(status)
+                if not isinstance(payload, bytes):
+                    self.send_header('Content-Type', 'application/json')
+                for key, value in headers.items():
+                    self.send_header(key, value)
+                self.send_header('Content-Length', str(len(data)))
+                self.end_headers()
+                self.wfile.write(data)
+
+            do_GET = do_POST = do_PUT = _handle
+
+            def log_message(self, *args: tp.Any) -> None:
+                pass
+
+        self._server = ThreadingHTTPServer((host, port), Handler)
+        self._server.daemon_threads = True
+        threading.Thread(target=self._server.serve_forever, daemon=True).start()
+        return self
+
+    def stop(self) -> None:
+        if self._server is not None:
+            self._server.shutdown()
+            self._server.server_close()
+            self._server = None
+
+    def __enter__(self) -> 'MockCanvas':
+        return self.start() if self._server is None else self
+
+    def __exit__(self, *exc_info: tp.Any) -> None:
+        self.stop()
+
+    def _charge(self) -> tp.Optional[float]:
+        """
+        Add the request cost to the rate limit bucket, returning the remaining capacity or None if it is exceeded.
+        """
+
+        with self._lock:
+            now = time.monotonic()
+            self._bucket_level = max(0.0, self._bucket_level - (now - self._bucket_time) * self.leak_rate)
+            self._bucket_time = now
+            if self._bucket_level + self.request_cost > self.bucket_size:
+                return None
+            self._bucket_level += self.request_cost
+            return self.bucket_size - self._bucket_level
+
+    def dispatch(
+            self,
+            method: str,
+            raw_path: str,
+            body: bytes,
+            request_headers: tp.Optional[tp.Dict[str, str]] = None
+    ) -> Reply:
+        url = urlparse(raw_path)
+        path = url.path[len(API_PREFIX):] if url.path.startswith(API_PREFIX) else url.path
+        query = parse_qs(url.query)
+        with self._lock:
+            self.stats[method] += 1
+
+        if self.latency:
+            time.sleep(self.latency)
+
+        remaining = self._charge()
+        if remaining is None:
+            with self._lock:
+                self.stats['throttled'] += 1
+            return 403, {'X-Rate-Limit-Remaining': '0.0'}, b'403 Forbidden (Rate Limit Exceeded)'
+        headers = {'X-Rate-Limit-Remaining': f'{remaining:.1f}', 'X-Request-Cost': f'{self.request_cost:.1f}'}
+
+        with self._lock:
+            failed = self.error_rate and self._random.random() < self.error_rate
+        if failed:
+            with self._lock:
+                self.stats['errors'] += 1
+            return 500, headers, {'errors': [{'message': 'Injected error'}]}
+
+        for route_method, pattern, handler in self._routes:
+            match = pattern.match(path)
+            if match and route_method == method:
+                status, extra_headers, payload = handler(
+                    *(int(group) for group in match.groups()), query=query, body=body, headers=request_headers or {})
+                headers.update(extra_headers)
+                with self._lock:
+                    dropped = self.drop_rate and self._random.random() < self.drop_rate
+                if dropped:
+                    with self._lock:
+                        self.stats['dropped'] += 1
+                    return 502, headers, b'502 Bad Gateway'
+                if method == 'GET' and status == 200 and not isinstance(payload, bytes):
+                    # Conditional GET like Rails: the ETag is a digest of the body
+                    etag = '"' + hashlib.md5(json.dumps(payload).encode('utf-8')).hexdigest() + '"'
+                    headers['ETag'] = etag
+                    if (request_headers or {}).get('If-None-Match') == etag:
+                        with self._lock:
+                            self.stats['not_modified'] += 1
+                        return 304, headers, b''
+                return status, headers, payload
+
+        return 404, headers, {'errors': [{'message': 'The specified resource does not exist.'}]}
+
+    def update_grades(
+            self,
+            cid: int,
+            aid: int,
+            query: tp.Dict[str, tp.List[str]],
+            body: bytes,
+            headers: tp.Dict[str, str]
+    ) -> Reply:
+        grade_data = json.loads(body)['grade_data']
+        with self._lock:
+            for uid, values in grade_data.items():
+                self._grade(cid, aid, int(uid), values.get('posted_grade'), values.get('text_comment'))
+            progress_id = len(self.progress) + 1
+            self.progress[progress_id] = time.monotonic()
+        return 200, {}, self._progress_body(progress_id)
+
+    def get_progress(
+            self,
+            progress_id: int,
+            query: tp.Dict[str, tp.List[str]],
+            body: bytes,
+            headers: tp.Dict[str, str]
+    ) -> Reply:
+        if progress_id not in self.progress:
+            return 404, {}, {'errors': [{'message': 'The specified resource does not exist.'}]}
+        return 200, {}, self._progress_body(progress_id)
+
+    def _progress_body(self, progress_id: int) -> tp.Dict[str, tp.Any]:
+        elapsed = time.monotonic() - self.progress[progress_id]
+        if elapsed >= self.progress_time:
+            state, completion = 'completed', 100.0
+        elif elapsed >= self.progress_time / 2:
+            state, completion = 'running', 50.0
+        else:
+            state, completion = 'queued', 0.0
+        return {
+            'id': progress_id,
+            'context_type': 'Course',
+            'tag': 'submissions_update',
+            'completion': completion,
+            'workflow_state': state,
+            'url': f'{self.base_url}/progress/{progress_id}'
+        }
+
+    def put_submission(
+            self,
+            cid: int,
+            aid: int,
+            uid: int,
+            query: tp.Dict[str, tp.List[str]],
+            body: bytes,
+            headers: tp.Dict[str, str]
+    ) -> Reply:
+        params = json.loads(body)
+        with self._lock:
+            self._grade(
+                cid, aid, uid,
+                params.get('submission', {}).get('posted_grade'),
+                params.get('comment', {}).get('text_comment')
+            )
+            return 200, {}, self._submission(cid, aid, uid, include_comments=True)
+
+    def get_submission(
+            self,
+            cid: int,
+            aid: int,
+            uid: int,
+            query: tp.Dict[str, tp.List[str]],
+            body: bytes,
+            headers: tp.Dict[str, str]
+    ) -> Reply:
+        include = query.get('include[]', []) + query.get('include', [])
+        with self._lock:
+            return 200, {}, self._submission(cid, aid, uid, 'user' in include, 'submission_comments' in include)
+
+    def get_assignment(
+            self,
+            cid: int,
+            aid: int,
+            query: tp.Dict[str, tp.List[str]],
+            body: bytes,
+            headers: tp.Dict[str, str]
+    ) -> Reply:
+        return 200, {}, {
+            'id': aid,
+            'course_id': cid,
+            'name': f'Assignment {aid}',
+            'points_possible': self.points_possible,
+            'grading_type': 'points'
+        }
+
+    def list_submissions(
+            self,
+            cid: int,
+            aid: int,
+            query: tp.Dict[str, tp.List[str]],
+            body: bytes,
+            headers: tp.Dict[str, str]
+    ) -> Reply:
+        per_page = min(int(query.get('per_page', ['10'])[0]), 100)
+        page = int(query.get('page', ['1'])[0])
+        include = query.get('include[]', []) + query.get('include', [])
+        last_page = max(1, -(-self.n_students // per_page))
+        first_uid = (page - 1) * per_page + 1
+        uids = range(first_uid, min(first_uid + per_page, self.n_students + 1))
+        with self._lock:
+            body = [
+                self._submission(cid, aid, uid, 'user' in include, 'submission_comments' in include) for uid in uids
+            ]
+
+        base = f'{self.base_url}/courses/{cid}/assignments/{aid}/submissions'
+        return 200, {'Link': self._link(base, query, page, last_page)}, body
+
+    def list_student_submissions(
+            self,
+            cid: int,
+            query: tp.Dict[str, tp.List[str]],
+            body: bytes,
+            headers: tp.Dict[str, str]
+    ) -> Reply:
+        if query.get('student_ids[]') != ['all']:
+            # Canvas only lists the submissions of the current user without student_ids[]=all
+            return 200, {}, []
+        per_page = min(int(query.get('per_page', ['10'])[0]), 100)
+        page = int(query.get('page', ['1'])[0])
+        include = query.get('include[]', []) + query.get('include', [])
+        aids = [int(aid) for aid in query.get('assignment_ids[]', [])]
+        n_items = len(aids) * self.n_students
+        last_page = max(1, -(-n_items // per_page))
+        items = range((page - 1) * per_page, min(page * per_page, n_items))
+        with self._lock:
+            body = [
+                self._submission(
+                    cid,
+                    aids[item // self.n_students],
+                    item % self.n_students + 1,
+                    'user' in include,
+                    'submission_comments' in include
+                )
+                for item in items
+            ]
+
+        base = f'{self.base_url}/courses/{cid}/students/submissions'
+        return 200, {'Link': self._link(base, query, page, last_page)}, body
+
+    def _link(self, base: str, query: tp.Dict[str, tp.List[str]], page: int, last_page: int) -> str:
+        links = {'current': page, 'first': 1}
+        if page < last_page:
+            links['next'] = page + 1
+        if page > 1:
+            links['prev'] = page - 1
+        if not self.omit_last_link:
+            links['last'] = last_page
+        params = {key: value for key, value in query.items() if key != 'page'}
+        return ','.join(
+            f'<{base}?{urlencode(dict(params, page=[str(nr)]), doseq=True)}>; rel="{rel}"'
+            for rel, nr in links.items()
+        )
+
+    def download_file(
+            self,
+            file_id: int,
+            query: tp.Dict[str, tp.List[str]],
+            body: bytes,
+            headers: tp.Dict[str, str]
+    ) -> Reply:
+        content = file_content(file_id, self.file_size)
+        match = re.fullmatch(r'bytes=(\d+)-', headers.get('Range', ''))
+        if match is None:
+            return 200, {'Accept-Ranges': 'bytes', 'Content-Type': 'application/pdf'}, content
+        start = int(match.group(1))
+        if start >= len(content):
+            return 416, {'Content-Range': f'bytes */{len(content)}'}, b''
+        return 206, {
+            'Accept-Ranges': 'bytes',
+            'Content-Type': 'application/pdf',
+            'Content-Range': f'bytes {start}-{len(content) - 1}/{len(content)}'
+        }, content[start:]
+
+    def _grade(self, cid: int, aid: int, uid: int, grade: tp.Any, comment: tp.Optional[str]) -> None:
+        if grade is not None:
+            self.grades[cid, aid, uid] = grade
+        if comment:
+            self.comments.setdefault((cid, aid, uid), []).append(comment)
+
+    def _submission(
+            self,
+            cid: int,
+            aid: int,
+            uid: int,
+            include_user: bool = False,
+            include_comments: bool = False
+    ) -> tp.Dict[str, tp.Any]:
+        grade = self.grades.get((cid, aid, uid))
+        submission = {
+            'id': aid * 1000000 + uid,
+            'assignment_id': aid,
+            'user_id': uid,
+            'grade': None if grade is None else str(grade),
+            'score': _score(grade),
+            'submitted_at': '2021-09-01T12:00:00Z' if uid % 10 else None,
+            'workflow_state': 'graded' if grade is not None else 'submitted',
+            'preview_url': f'{self.base_url}/courses/{cid}/assignments/{aid}/submissions/{uid}?preview=1',
+            'attachments': [{
+                'id': aid * 1000000 + uid,
+                'filename': f'report_{uid}.pdf',
+                'display_name': f'report_{uid}.pdf',
+                'url': f'{self.base_url}/files/{aid * 1000000 + uid}/download',
+                'size': self.file_size,
+                'updated_at': '2021-09-01T12:00:00Z'
+            }] if uid % 10 else []
+        }
+        if include_user:
+            submission['user'] = {'id': uid, 'name': f'Student {uid}', 'sortable_name': f'{uid:06d}, Student'}
+        if include_comments:
+            submission['submission_comments'] = [
+                {'id': nr, 'comment': comment} for nr, comment in enumerate(self.comments.get((cid, aid, uid), []))
+            ]
+        return submission
+
+
+def file_content(file_id: int, size: int) -> bytes:
+    """
+    Deterministic content of a file, so downloads can be checked.
+    """
+
+    block = hashlib.sha256(str(file_id).encode('ascii')).digest()
+    return (block * (size // len(block) + 1))[:size]
+
+
+def _score(grade: tp.Any) -> tp.Optional[float]:
+    try:
+        return float(grade)
+    except (TypeError, ValueError):
+        return None
+
+
+if __name__ == '__main__':
+    import argparse
+
+    parser = argparse.ArgumentParser(description='Serve a local stand-in for the Canvas API.')
+    parser.add_argument('--port', type=int, default=8000)
+    parser.add_argument('--students', type=int, default=1000)
+    parser.add_argument('--progress-time', type=float, default=0.5)
+    parser.add_argument('--latency', type=float, default=0.0)
+    parser.add_argument('--error-rate', type=float, default=0.0)
+    arguments = parser.parse_args()
+
+    with MockCanvas(
+            n_students=arguments.students,
+            progress_time=arguments.progress_time,
+            latency=arguments.latency,
+            error_rate=arguments.error_rate
+    ).start(port=arguments.port) as canvas:
+        print(f'Serving {canvas.base_url}, press Ctrl+C to stop')
+        try:
+            threading.Event().wait()
+        except KeyboardInterrupt:
+            pass
@@ -0,0 +1,107 @@
+# -*- coding: utf-8 -*-
+"""
+End-to-end throughput benchmarks against the local Canvas stand-in.
+
+Run from the repository root, e.g.:
+
+    $ python -m benchmarks.run --sizes 1000 10000 100000
+"""
+
+import argparse
+import json
+import os
+import tempfile
+import time
+import typing as tp
+
+from benchmarks.data import grade_rows
+from benchmarks.data import write_workbook
+from benchmarks.mock_canvas import MockCanvas
+from uppraisal import uppraisal
+from uppraisal.client import CanvasClient
+from uppraisal.helpers import get_excel
+from uppraisal.helpers import list_submissions
+from uppraisal.helpers import put_excel
+from uppraisal.throttle import RateLimiter
+
+COURSE_ID = 1
+ASSIGNMENT_ID = 2
+
+Result = tp.Dict[str, tp.Any]
+
+
+def timed(name: str, n_rows: int, function: tp.Callable[[], tp.Any]) -> Result:
+    start = time.perf_counter()
+    function()
+    seconds = time.perf_counter() - start
+    return {'benchmark': name, 'rows': n_rows, 'seconds': seconds, 'rows_per_second': n_rows / seconds}
+
+
+def run(
+        sizes: tp.Sequence[int],
+        benchmarks: tp.Sequence[str],
+        progress_time: float,
+        latency: float,
+        error_rate: float,
+        poll_interval: float,
+        workdir: str
+) -> tp.List[Result]:
+    results = []
+    for n_rows in sizes:
+        workbook = write_workbook(os.path.join(workdir, f'grades_{n_rows}.xlsx'), n_rows)
+        with MockCanvas(
+                n_students=n_rows,
+                progress_time=progress_time,
+                latency=latency,
+                error_rate=error_rate
+        ) as canvas, CanvasClient('token', base_url=canvas.base_url, rate_limiter=RateLimiter()) as client:
+            if 'get_excel' in benchmarks:
+                results.append(timed('get_excel', n_rows, lambda: get_excel(workbook, 'Sheet1')))
+            if 'put_excel' in benchmarks:
+                out_filepath = os.path.join(workdir, f'put_{n_rows}.xlsx')
+                results.append(timed('put_excel', n_rows, lambda: put_excel(out_filepath, list(grade_rows(n_rows)))))
+            if 'upload_appraisals' in benchmarks:
+                results.append(timed('upload_appraisals', n_rows, lambda: uppraisal.upload_appraisals(
+                    workbook, None, COURSE_ID, ASSIGNMENT_ID, html_format=True, client=client, journal=False,
+                    validate=False, poll_interval=poll_interval)))
+            if 'upload_appraisal' in benchmarks:
+                results.append(timed('upload_appraisal', n_rows, lambda: uppraisal.upload_appraisal(
+                    None, workbook, COURSE_ID, ASSIGNMENT_ID, html_format=True, client=client, validate=False)))
+            if 'list_submissions' in benchmarks:
+                results.append(timed('list_submissions', n_rows, lambda: list_submissions(
+                    None, COURSE_ID, ASSIGNMENT_ID, out_filepath=None, client=client, submitted_only=False)))
+    return results
+
+
+BENCHMARKS = ('get_excel', 'put_excel', 'upload_appraisals', 'upload_appraisal', 'list_submissions')
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Benchmark uppraisal against a local Canvas stand-in.')
+    parser.add_argument('--sizes', type=int, nargs='+', default=[1000, 10000], help="Number of rows per run")
+    parser.add_argument('--benchmarks', nargs='+', default=list(BENCHMARKS), choices=BENCHMARKS)
+    parser.add_argument('--progress-time', type=float, default=0.5, help="Seconds before a Progress job completes")
+    parser.add_argument('--latency', type=float, default=0.0, help="Seconds every request is delayed")
+    parser.add_argument('--error-rate', type=float, default=0.0, help="Fraction of requests that fail with a 500")
+    parser.add_argument('--poll-interval', type=float, default=0.1, help="Initial Progress poll interval in seconds")
+    parser.add_argument('--json', help="Write the results to this JSON file")
+    arguments = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as workdir:
+        results = run(
+            arguments.sizes,
+            arguments.benchmarks,
+            arguments.progress_time,
+            arguments.latency,
+            arguments.error_rate,
+            arguments.poll_interval,
+            workdir
+        )
+
+    print(f"{'benchmark':<20}{'rows':>10}{'seconds':>12}{'rows/s':>14}")
+    for result in results:
+        print(f"{result['benchmark']:<20}{result['rows']:>10}{result['seconds']:>12.3f}"
+              f"{result['rows_per_second']:>14.0f}")
+
+    if arguments.json:
+        with open(arguments.json, 'w') as f:
+            json.dump(results, f, indent=2)
@@ -0,0 +1,70 @@
+# -*- coding: utf-8 -*-
+"""
+Benchmark of the start up time of the command line interface.
+
+Every command is run in a fresh interpreter a number of times and the median wall clock time is reported, next to the
+time of an interpreter that does nothing. Run from the repository root:
+
+$ python -m benchmarks.startup --repeat 20
+"""
+
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+import typing as tp
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def timed(argv: tp.List[str], repeat: int) -> float:
+    """
+    Median seconds to run a command to completion.
+    """
+
+    seconds = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        subprocess.run(argv, cwd=ROOT, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+        seconds.append(time.perf_counter() - start)
+    return statistics.median(seconds)
+
+
+def run(repeat: int, workdir: str) -> tp.List[tp.Dict[str, tp.Any]]:
+    main = os.path.join(ROOT, 'main.py')
+    commands = {
+        'python': [sys.executable, '-c', 'pass'],
+        '--help': [sys.executable, main, '--help'],
+        'upload --help': [sys.executable, main, 'upload', '--help'],
+        'status': [sys.executable, main, 'status', os.path.join(workdir, 'grades.xlsx')],
+        'import uppraisal': [sys.executable, '-c', 'import uppraisal.uppraisal'],
+    }
+
+    results = []
+    for name, argv in commands.items():
+        seconds = timed(argv, repeat)
+        results.append({'command': name, 'milliseconds': seconds * 1000})
+    return results
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Benchmark the start up time of the uppraisal command line.')
+    parser.add_argument('--repeat', type=int, default=10, help="Number of runs per command")
+    parser.add_argument('--json', help="Write the results to this JSON file")
+    arguments = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as workdir:
+        results = run(arguments.repeat, workdir)
+
+    baseline = results[0]['milliseconds']
+    print(f"{'command':<20}{'ms':>10}{'over python':>14}")
+    for result in results:
+        print(f"{result['command']:<20}{result['milliseconds']:>10.1f}{result['milliseconds'] - baseline:>14.1f}")
+
+    if arguments.json:
+        with open(arguments.json, 'w') as f:
+            json.dump(results, f, indent=2)
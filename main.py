@@ -1,50 +1,9 @@
 #!/usr/bin/env python3
 # -*- coding: utf-8 -*-
 
-import argparse
+import sys
 
-from uppraisal.uppraisal import upload_appraisals
+from uppraisal.cli import main
 
 if __name__ == '__main__':
-    parser = argparse.ArgumentParser()
-    parser.add_argument(
-        '-t', '--token',
-        help="Specify the Canvas access token",
-        type=str,
-        required=True
-    )
-    parser.add_argument(
-        '-c', '--course',
-        help="Specify the Canvas course ID",
-        type=int,
-        required=True
-    )
-    parser.add_argument(
-        '-a', '--assignment',
-        help="Specify the Canvas assignment ID",
-        type=int,
-        required=True
-    )
-    parser.add_argument(
-        '-l', '--html',
-        help="Indicate whether the submission comments are in HTML",
-        type=bool,
-        required=False
-    )
-    parser.add_argument(
-        'filepath',
-        help="Specify an Excel file with the results",
-        type=str,
-    )
-
-    arguments = parser.parse_args()
-
-    result = upload_appraisals(
-        arguments.filepath,
-        cv_access_token=arguments.token,
-        cv_course_id=arguments.course,
-        cv_assignment_id=arguments.assignment,
-        html_format=arguments.html
-    )
-
-    print(result)
+    sys.exit(main())
@@ -20,4 +20,6 @@ setup(
     ],
     python_requires='~=3.6',
     install_requires=['requests', 'urllib3', 'tqdm', 'openpyxl', 'et-xmlfile', 'bs4'],
+    extras_require={'parquet': ['pyarrow']},
+    entry_points={'console_scripts': ['uppraisal=uppraisal.cli:main']},
 )
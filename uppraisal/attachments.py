@@ -0,0 +1,313 @@
+# -*- coding: utf-8 -*-
+
+import glob
+import os
+import re
+import time
+import typing as tp
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+
+import requests
+
+from .constants import *
+from .client import CanvasClient
+from .client import ensure_client
+from .errors import CanvasError
+from .errors import check_response
+from .helpers import iter_pages
+from .throttle import BandwidthLimiter
+from .throttle import backoff
+
+_UNSAFE_CHARACTERS = re.compile(r'[\\/:*?"<>|\x00-\x1f]')
+_OFFSET_COLON = re.compile(r'([+-]\d\d):(\d\d)$')
+
+
+class Attachment(tp.NamedTuple):
+    """
+    File attached to a submission, with what is needed to download it and to tell whether a download is current.
+    """
+
+    course: int
+    assignment: int
+    user_id: int
+    id: int
+    filename: str
+    url: str
+    size: tp.Optional[int]
+    updated_at: tp.Optional[str]
+
+
+def iter_attachments(
+        client: CanvasClient,
+        cv_course_id: int,
+        cv_assignment_id: int,
+        submitted_only: bool = True,
+        max_workers: int = DEFAULT_MAX_WORKERS,
+        refresh: bool = False
+) -> tp.Iterator[Attachment]:
+    """
+    Generator retrieving the attachments of all submissions of an assignment, see `helpers.iter_pages`.
+
+    Unlike `helpers.list_submissions`, which reduces the attachments to their file names, the download URL, size and
+    time of the last update of every attachment are kept.
+
+    :param client: Client to send the requests with.
+    :type client: CanvasClient
+    :param cv_course_id: Course identifier (see Canvas course URL).
+    :type cv_course_id: int
+    :param cv_assignment_id: Assignment identifier (see Canvas assignment URL).
+    :type cv_assignment_id: int
+    :param submitted_only: Boolean indicating whether only submissions with a submission date are included.
+    :type submitted_only: bool
+    :param max_workers: Maximum number of pages retrieved at the same time.
+    :type max_workers: int
+    :param refresh: Boolean indicating whether cached pages are revalidated with Canvas even if they are still fresh.
+    :type refresh: bool
+    :return: Iterator over the attachments
+    :rtype: iterator
+    """
+
+    url = client.url(CANVAS_SUBMISSIONS_PATH, cid=cv_course_id, aid=cv_assignment_id)
+    for page in iter_pages(client, url, {'per_page': 100}, max_workers, refresh):
+        for submission in page:
+            if submitted_only and not submission.get('submitted_at'):
+                continue
+            for attachment in submission.get('attachments') or []:
+                yield Attachment(
+                    course=cv_course_id,
+                    assignment=cv_assignment_id,
+                    user_id=int(submission['user_id']),
+                    id=int(attachment['id']),
+                    filename=attachment.get('filename') or attachment.get('display_name') or str(attachment['id']),
+                    url=attachment['url'],
+                    size=attachment.get('size'),
+                    updated_at=attachment.get('updated_at') or attachment.get('modified_at')
+                )
+
+
+def attachment_filepath(directory: str, attachment: Attachment) -> str:
+    """
+    Location of a downloaded attachment: a folder per course, assignment and user under `directory`.
+    """
+
+    filename = _UNSAFE_CHARACTERS.sub('_', attachment.filename).strip(' .') or str(attachment.id)
+    return os.path.join(
+        directory, str(attachment.course), str(attachment.assignment), str(attachment.user_id), filename)
+
+
+def timestamp(updated_at: tp.Optional[str]) -> tp.Optional[float]:
+    """
+    POSIX timestamp of an ISO 8601 time as used by Canvas, None if absent or not understood.
+
+    :Examples:
+    >>> timestamp('2021-09-01T12:00:00Z')
+    1630497600.0
+    """
+
+    if not updated_at:
+        return None
+    # strptime only understands offsets without a colon before Python 3.7
+    text = _OFFSET_COLON.sub(r'\1\2', updated_at.replace('Z', '+0000'))
+    for time_format in ('%Y-%m-%dT%H:%M:%S%z', '%Y-%m-%dT%H:%M:%S.%f%z'):
+        try:
+            return datetime.strptime(text, time_format).timestamp()
+        except ValueError:
+            continue
+    return None
+
+
+def is_current(filepath: str, attachment: Attachment) -> bool:
+    """
+    Check whether a downloaded file matches the size and time of the last update of the attachment.
+    """
+
+    try:
+        stat = os.stat(filepath)
+    except FileNotFoundError:
+        return False
+    updated_at = timestamp(attachment.updated_at)
+    return (attachment.size is None or stat.st_size == attachment.size) and \
+        (updated_at is None or stat.st_mtime == updated_at)
+
+
+def download_attachment(
+        client: CanvasClient,
+        attachment: Attachment,
+        filepath: str,
+        limiter: tp.Optional[BandwidthLimiter] = None,
+        chunk_size: int = DOWNLOAD_CHUNK_SIZE
+) -> tp.Dict[str, tp.Any]:
+    """
+    Download an attachment to a file, unless the file is already current (see `is_current`).
+
+    The download is streamed to a part file next to `filepath` in chunks of `chunk_size` bytes. If the connection
+    breaks, or a part file was left by an earlier run, the download continues where it stopped with a Range request.
+    Part files are specific to the time of the last update of the attachment, so a part of an older version is never
+    continued. Once complete, the part file replaces `filepath` and gets the time of the last update as modification
+    time.
+
+    :param client: Client to send the requests with.
+    :type client: CanvasClient
+    :param attachment: The attachment to download.
+    :type attachment: Attachment
+    :param filepath: Location to download the attachment to.
+    :type filepath: str
+    :param limiter: Limiter of the bytes per second shared by all downloads.
+    :type limiter: BandwidthLimiter or None
+    :param chunk_size: Number of bytes read from the connection at a time.
+    :type chunk_size: int
+    :return: Dictionary with the "status" ("unchanged", "downloaded", "resumed" or "failed"), the number of "bytes"
+    received and the "error", if any
+    :rtype: dict
+    """
+
+    if is_current(filepath, attachment):
+        return {'status': 'unchanged', 'bytes': 0, 'error': None}
+
+    updated_at = timestamp(attachment.updated_at)
+    part_filepath = f'{filepath}.{int(updated_at or 0)}{DOWNLOAD_PART_SUFFIX}'
+    for stale in glob.glob(glob.escape(filepath) + '.*' + DOWNLOAD_PART_SUFFIX):
+        if stale != part_filepath:
+            os.remove(stale)
+    os.makedirs(os.path.dirname(filepath), exist_ok=True)
+
+    resumed = os.path.exists(part_filepath)
+    received = 0
+    start = time.perf_counter()
+    retry = 0
+    while True:
+        offset = os.path.getsize(part_filepath) if os.path.exists(part_filepath) else 0
+        if attachment.size is not None and 0 < attachment.size <= offset:
+            break
+        try:
+            with client.get(attachment.url, headers={'Range': f'bytes={offset}-'} if offset else None,
+                            stream=True) as response:
+                check_response(response, attachment.url)
+                if offset and response.status_code != 206:
+                    # The server ignored the range, start over
+                    offset = 0
+                with open(part_filepath, 'ab' if offset else 'wb') as f:
+                    for block in response.iter_content(chunk_size):
+                        f.write(block)
+                        received += len(block)
+                        if limiter is not None:
+                            limiter.consume(len(block))
+            break
+        except (requests.ConnectionError, requests.Timeout, requests.exceptions.ChunkedEncodingError) as e:
+            if retry >= RETRY_MAX_ATTEMPTS:
+                return {'status': 'failed', 'bytes': received, 'error': str(e)}
+            resumed = True
+            time.sleep(backoff(retry))
+            retry += 1
+        except CanvasError as e:
+            return {'status': 'failed', 'bytes': received, 'error': str(e)}
+
+    size = os.path.getsize(part_filepath)
+    if attachment.size is not None and size != attachment.size:
+        os.remove(part_filepath)
+        return {'status': 'failed', 'bytes': received, 'error': f'Expected {attachment.size} bytes, got {size}'}
+    os.replace(part_filepath, filepath)
+    if updated_at is not None:
+        os.utime(filepath, (updated_at, updated_at))
+    client.metrics.emit(
+        'download',
+        url=attachment.url,
+        bytes=received,
+        seconds=time.perf_counter() - start,
+        resumed=resumed
+    )
+    return {'status': 'resumed' if resumed else 'downloaded', 'bytes': received, 'error': None}
+
+
+def download_attachments(
+        cv_access_token: tp.Optional[str],
+        cv_course_id: int,
+        cv_assignment_id: int,
+        directory: str = DEFAULT_ATTACHMENTS_DIR,
+        client: tp.Optional[CanvasClient] = None,
+        max_workers: int = DEFAULT_DOWNLOAD_WORKERS,
+        max_bytes_per_second: tp.Optional[float] = None,
+        submitted_only: bool = True,
+        refresh: bool = False
+) -> tp.List[tp.Dict[str, tp.Any]]:
+    """
+    Download the attachments of all submissions of an assignment to a folder per course, assignment and user.
+
+    Downloads run concurrently on at most `max_workers` threads, together transferring at most
+    `max_bytes_per_second`. Files that are already present and match the attachment are skipped, and interrupted
+    downloads are continued, see `download_attachment`. A failed download does not stop the others.
+
+    :param cv_access_token: Canvas access token (generally 70 characters in length; see
+    https://canvas.instructure.com/courses/785215/pages/getting-started-with-the-api).
+    :type cv_access_token: str
+    :param cv_course_id: Course identifier (see Canvas course URL).
+    :type cv_course_id: int
+    :param cv_assignment_id: Assignment identifier (see Canvas assignment URL).
+    :type cv_assignment_id: int
+    :param directory: Folder to download the attachments to.
+    :type directory: str
+    :param client: Client to share between calls. Default is a new client for `cv_access_token`.
+    :type client: CanvasClient or None
+    :param max_workers: Maximum number of downloads at the same time.
+    :type max_workers: int
+    :param max_bytes_per_second: Maximum bytes per second of all downloads together. Default is no limit.
+    :type max_bytes_per_second: float or None
+    :param submitted_only: Boolean indicating whether only submissions with a submission date are included.
+    :type submitted_only: bool
+    :param refresh: Boolean indicating whether cached pages of the submission listing are revalidated with Canvas even
+    if they are still fresh.
+    :type refresh: bool
+    :return: List with the attachment metadata, "path", "status", "bytes" and "error" of every attachment, see
+    `format_downloads`
+    :rtype: list
+    """
+
+    if max_workers < 1:
+        raise ValueError(f'max_workers should be at least 1, got {max_workers}')
+
+    with ensure_client(client, cv_access_token) as client:
+        attachments = list(iter_attachments(
+            client, cv_course_id, cv_assignment_id, submitted_only=submitted_only, refresh=refresh))
+
+        filepaths = []
+        seen: tp.Set[str] = set()
+        for attachment in attachments:
+            filepath = attachment_filepath(directory, attachment)
+            if filepath in seen:
+                # Two attachments of a user with the same name
+                head, tail = os.path.split(filepath)
+                filepath = os.path.join(head, f'{attachment.id}_{tail}')
+            seen.add(filepath)
+            filepaths.append(filepath)
+
+        limiter = BandwidthLimiter(max_bytes_per_second) if max_bytes_per_second else None
+
+        def download(attachment: Attachment, filepath: str) -> tp.Dict[str, tp.Any]:
+            try:
+                result = download_attachment(client, attachment, filepath, limiter)
+            except (CanvasError, requests.RequestException, OSError) as e:
+                result = {'status': 'failed', 'bytes': 0, 'error': str(e)}
+            return dict(attachment._asdict(), path=filepath, **result)
+
+        with ThreadPoolExecutor(max_workers=max_workers) as executor:
+            return list(executor.map(download, attachments, filepaths))
+
+
+def format_downloads(results: tp.Sequence[tp.Dict[str, tp.Any]], limit: int = 10) -> str:
+    """
+    Format the results of `download_attachments` as a summary line followed by a line per failed download.
+    """
+
+    states = Counter(result['status'] for result in results)
+    received = sum(result['bytes'] for result in results)
+    lines = [
+        f"{len(results)} attachments: {states['downloaded']} downloaded, {states['resumed']} resumed, "
+        f"{states['unchanged']} unchanged, {states['failed']} failed ({received / 1e6:.1f} MB received)"
+    ]
+    failed = [result for result in results if result['status'] == 'failed']
+    lines += [f"user id {result['user_id']}, {result['filename']}: {result['error']}" for result in failed[:limit]]
+    if len(failed) > limit:
+        lines.append(f'... and {len(failed) - limit} more')
+    return '\n'.join(lines)
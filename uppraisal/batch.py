@@ -0,0 +1,319 @@
+# -*- coding: utf-8 -*-
+
+import json
+import os
+import typing as tp
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial
+
+from .constants import *
+from .client import CanvasClient
+from .client import ensure_client
+from .diff import SubmissionState
+from .diff import changed_rows
+from .diff import fetch_course_submission_state
+from .diff import format_summary
+from .journal import Journal
+from .journal import journal_filepath
+from .readers import detect_format
+from .readers import iter_rows
+from .readers import iter_workbook
+from .records import GradeBatch
+from .uppraisal import coerce_user_ids
+from .uppraisal import convert_comments
+from .uppraisal import format_grades
+from .uppraisal import upload_rows
+from .validate import Issue
+from .validate import Roster
+from .validate import cached_roster
+from .validate import check_rows
+from .validate import format_issues
+from .validate import has_errors
+
+
+def load_manifest(manifest_filepath: str) -> tp.List[tp.Dict[str, tp.Any]]:
+    """
+    Read a batch manifest mapping workbook tabs to Canvas assignments.
+
+    The manifest is a JSON file with a list of uploads, each with at least a "filepath", a "course" and an
+    "assignment", and optionally any of "workbook_tab", "grade_header", "submission_comment_header", "html_format",
+    "changed_only", "input_format", "grade_decimals" and "blank_grades". Options under "defaults" apply to every upload
+    that does not set them itself.
+    Relative file paths are relative to the manifest.
+
+    :Examples:
+    >>> with open('manifest.json') as f:
+    ...     print(f.read())
+    {
+        "defaults": {"html_format": true},
+        "uploads": [
+            {"filepath": "week1.xlsx", "workbook_tab": "Section A", "course": 1001, "assignment": 5001},
+            {"filepath": "week1.xlsx", "workbook_tab": "Section B", "course": 1002, "assignment": 5002}
+        ]
+    }
+
+    :param manifest_filepath: File path to the manifest.
+    :type manifest_filepath: str
+    :return: List with the options of every upload, defaults applied
+    :rtype: list
+    """
+
+    with open(manifest_filepath, encoding='utf-8') as f:
+        manifest = json.load(f)
+
+    if isinstance(manifest, list):
+        manifest = {'uploads': manifest}
+
+    base_dir = os.path.dirname(os.path.abspath(manifest_filepath))
+    entries = []
+    for entry in manifest.get('uploads', []):
+        entry = dict(manifest.get('defaults', {}), **entry)
+        missing = [key for key in ('filepath', 'course', 'assignment') if key not in entry]
+        if missing:
+            raise IOError(f"Upload {len(entries) + 1} in {manifest_filepath} is missing: {', '.join(missing)}")
+        unknown = set(entry) - {'filepath', 'course', 'assignment'} - set(MANIFEST_OPTIONS)
+        if unknown:
+            raise IOError(f"Upload {len(entries) + 1} in {manifest_filepath} has unknown options: {', '.join(unknown)}")
+        entry['filepath'] = os.path.join(base_dir, entry['filepath'])
+        entries.append(entry)
+
+    return entries
+
+
+def read_manifest_rows(
+        entries: tp.Sequence[tp.Dict[str, tp.Any]],
+        comment_processes: tp.Optional[int] = None,
+        rosters: tp.Optional[tp.Sequence[Roster]] = None,
+        issues: tp.Optional[tp.Sequence[tp.List[Issue]]] = None,
+        client: tp.Optional[CanvasClient] = None
+) -> tp.List[tp.Union[GradeBatch, tp.List[tp.List[tp.Any]]]]:
+    """
+    Read and prepare the rows of every upload in a manifest as a `records.GradeBatch`, loading every Excel workbook
+    only once.
+
+    With `rosters` and `issues`, the rows of every upload are validated against its roster as they are read, and the
+    problems found are appended to the list in `issues` at the same position. The rows of an upload with problems
+    other than warnings are returned as read, as lists. With `client`, a roster that lacks a user id is retrieved
+    again once before the user id is reported, see `validate.check_rows`.
+
+    :param entries: Uploads as returned by `load_manifest`.
+    :type entries: list
+    :param comment_processes: Number of worker processes converting HTML comments.
+    :type comment_processes: int or None
+    :param rosters: Roster of every upload, in manifest order.
+    :type rosters: list or None
+    :param issues: Lists to append the problems of every upload to, in manifest order.
+    :type issues: list or None
+    :param client: Client to retrieve rosters again with.
+    :type client: CanvasClient or None
+    :return: List with the prepared records of every upload, in manifest order
+    :rtype: list
+    """
+
+    data: tp.List[tp.Optional[tp.Union[GradeBatch, tp.List[tp.List[tp.Any]]]]] = [None] * len(entries)
+    by_file: tp.Dict[tp.Tuple[str, str], tp.List[int]] = {}
+    for index, entry in enumerate(entries):
+        input_format = entry.get('input_format') or detect_format(entry['filepath'])
+        by_file.setdefault((entry['filepath'], input_format), []).append(index)
+
+    for (filepath, input_format), indexes in by_file.items():
+        if input_format == 'xlsx':
+            import openpyxl
+
+            workbook = openpyxl.load_workbook(filepath, read_only=True)
+        else:
+            workbook = None
+        try:
+            for index in indexes:
+                entry = entries[index]
+                fields = [
+                    'user_id',
+                    entry.get('grade_header', DEFAULT_GRADE_HEADER),
+                    entry.get('submission_comment_header', DEFAULT_SUBMISSION_COMMENT_HEADER)
+                ]
+                if workbook is not None:
+                    rows = iter_workbook(workbook, fields, worksheet=entry.get('workbook_tab', DEFAULT_WORKBOOK_TAB))
+                else:
+                    rows = iter_rows(filepath, fields, input_format=input_format)
+                if issues is not None:
+                    refetch = partial(
+                        cached_roster, client, entry['course'], entry['assignment'], refresh=True
+                    ) if client is not None else None
+                    rows = list(check_rows(
+                        rows,
+                        issues[index],
+                        rosters[index],
+                        entry.get('grade_decimals', GRADE_DECIMALS),
+                        refetch,
+                        entry.get('blank_grades', DEFAULT_BLANK_GRADES)
+                    ))
+                    if has_errors(issues[index]):
+                        data[index] = rows
+                        continue
+                rows = convert_comments(
+                    format_grades(
+                        coerce_user_ids(rows),
+                        entry.get('grade_decimals', GRADE_DECIMALS),
+                        entry.get('blank_grades', DEFAULT_BLANK_GRADES)
+                    ),
+                    entry.get('html_format', DEFAULT_HTML_FORMAT),
+                    comment_processes
+                )
+                data[index] = GradeBatch(rows)
+        finally:
+            if workbook is not None:
+                workbook.close()
+
+    return data
+
+
+def upload_manifest(
+        manifest_filepath: str,
+        cv_access_token: tp.Optional[str],
+        max_concurrent: int = DEFAULT_MAX_CONCURRENT_UPLOADS,
+        max_in_flight: int = DEFAULT_MAX_IN_FLIGHT,
+        client: tp.Optional[CanvasClient] = None,
+        journal: bool = True,
+        resume: bool = False,
+        comment_processes: tp.Optional[int] = None,
+        validate: bool = True
+) -> tp.List[tp.Dict[str, tp.Any]]:
+    """
+    Upload assignment comments and grades for every upload in a batch manifest.
+
+    All workbooks are read first and, with `validate`, checked against the cached roster of their assignment (see
+    `validate.check_rows`). For uploads with "changed_only", the Canvas state of all assignments of a course is
+    retrieved with a single listing (see `diff.fetch_course_submission_state`). The uploads then run concurrently, at
+    most `max_concurrent` at a time, sharing one client and therefore one connection pool and rate limiter. A failing
+    upload, or one whose rows failed validation, does not stop the others; its error is included in the report.
+
+    :param manifest_filepath: File path to the manifest, see `load_manifest`.
+    :type manifest_filepath: str
+    :param cv_access_token: Canvas access token (generally 70 characters in length; see
+    https://canvas.instructure.com/courses/785215/pages/getting-started-with-the-api).
+    :type cv_access_token: str
+    :param max_concurrent: Maximum number of assignments uploaded at the same time.
+    :type max_concurrent: int
+    :param max_in_flight: Maximum number of unfinished Progress jobs per assignment.
+    :type max_in_flight: int
+    :param client: Client to share between calls. Default is a new client for `cv_access_token`.
+    :type client: CanvasClient or None
+    :param journal: Boolean indicating whether uploaded chunks are recorded in the journal next to each workbook.
+    :type journal: bool
+    :param resume: Boolean indicating whether to continue from the state recorded in the journals.
+    :type resume: bool
+    :param comment_processes: Number of worker processes converting HTML comments.
+    :type comment_processes: int or None
+    :param validate: Boolean indicating whether to check all rows before uploading.
+    :type validate: bool
+    :return: List with a report per upload, in manifest order, see `format_report`
+    :rtype: list
+    """
+
+    if resume and not journal:
+        raise ValueError('Cannot resume an upload without a journal.')
+
+    entries = load_manifest(manifest_filepath)
+    journals = {
+        entry['filepath']: Journal(journal_filepath(entry['filepath'])) for entry in entries
+    } if journal else {}
+
+    def upload(
+            entry: tp.Dict[str, tp.Any],
+            rows: tp.Union[GradeBatch, tp.List[tp.List[tp.Any]]],
+            entry_issues: tp.Optional[tp.List[Issue]]
+    ) -> tp.Dict[str, tp.Any]:
+        report = {
+            'filepath': entry['filepath'],
+            'workbook_tab': entry.get('workbook_tab', DEFAULT_WORKBOOK_TAB),
+            'course': entry['course'],
+            'assignment': entry['assignment'],
+            'rows': len(rows),
+            'chunks': 0,
+            'completed': 0,
+            'failed': 0,
+            'summary': None,
+            'warnings': len(entry_issues) if entry_issues else 0,
+            'error': None
+        }
+        if entry_issues and has_errors(entry_issues):
+            report['error'] = format_issues(entry_issues, limit=3)
+            return report
+        try:
+            if entry.get('changed_only'):
+                summary = Counter()
+                state = canvas_states[entry['course'], entry['assignment']]
+                if isinstance(state, Exception):
+                    raise state
+                rows = changed_rows(rows, state, summary)
+            responses = upload_rows(
+                client,
+                entry['course'],
+                entry['assignment'],
+                rows,
+                max_in_flight,
+                journal=journals.get(entry['filepath']),
+                resume=resume
+            )
+            if entry.get('changed_only'):
+                report['summary'] = format_summary(summary)
+        except Exception as e:
+            report['error'] = str(e)
+            return report
+
+        states = Counter(response['workflow_state'] for response in responses)
+        report.update(chunks=len(responses), completed=states['completed'], failed=states['failed'])
+        return report
+
+    with ensure_client(client, cv_access_token) as client:
+        rosters = issues = None
+        if validate:
+            cached = {}
+            for entry in entries:
+                key = (entry['course'], entry['assignment'])
+                if key not in cached:
+                    cached[key] = cached_roster(client, *key)
+            rosters = [cached[entry['course'], entry['assignment']] for entry in entries]
+            issues = [[] for _ in entries]
+        with client.metrics.stage('read'):
+            data = read_manifest_rows(entries, comment_processes, rosters, issues, client)
+
+        # The Canvas state of all assignments of a course is retrieved at once
+        canvas_states: tp.Dict[tp.Tuple[int, int], tp.Union[SubmissionState, Exception]] = {}
+        changed_only: tp.Dict[int, tp.Set[int]] = {}
+        for entry in entries:
+            if entry.get('changed_only'):
+                changed_only.setdefault(entry['course'], set()).add(entry['assignment'])
+        for course, assignments in changed_only.items():
+            try:
+                course_states = fetch_course_submission_state(client, course, sorted(assignments))
+            except Exception as e:
+                course_states = dict.fromkeys(assignments, e)
+            canvas_states.update(((course, assignment), state) for assignment, state in course_states.items())
+
+        with ThreadPoolExecutor(max_workers=max_concurrent) as executor:
+            return list(executor.map(upload, entries, data, issues or [None] * len(entries)))
+
+
+def format_report(report: tp.Iterable[tp.Dict[str, tp.Any]]) -> str:
+    """
+    Format the report of `upload_manifest` as one line per upload.
+    """
+
+    lines = []
+    for upload in report:
+        line = (f"course {upload['course']}, assignment {upload['assignment']} "
+                f"({os.path.basename(upload['filepath'])}, {upload['workbook_tab']}): ")
+        if upload['error']:
+            line += f"error: {upload['error']}"
+        else:
+            line += f"{upload['rows']} rows, {upload['completed']}/{upload['chunks']} chunks completed"
+            if upload['failed']:
+                line += f", {upload['failed']} failed"
+            if upload['summary']:
+                line += f" ({upload['summary']})"
+            if upload.get('warnings'):
+                line += f", {upload['warnings']} validation warnings"
+        lines.append(line)
+    return '\n'.join(lines)
@@ -0,0 +1,179 @@
+# -*- coding: utf-8 -*-
+
+import hashlib
+import json
+import os
+import threading
+import time
+import typing as tp
+
+import requests
+from requests.structures import CaseInsensitiveDict
+
+from .constants import *
+
+CachedPage = tp.Dict[str, tp.Any]
+
+# Response headers kept with a cached page; Link is needed for pagination, the others for revalidation
+CACHED_HEADERS: tp.Tuple[str, ...] = ('Content-Type', 'ETag', 'Last-Modified', 'Link')
+
+
+class PageCache(object):
+    """
+    Persistent cache of Canvas listing pages, one JSON file per page.
+
+    Pages are stored with their `ETag` and `Last-Modified` headers. A page younger than `ttl` seconds is served
+    without contacting Canvas; an older page is revalidated with `If-None-Match`/`If-Modified-Since`, so that an
+    unchanged page costs a 304 response without a body. Pages older than `max_age` seconds are evicted, and the least
+    recently used pages are evicted when the cache grows beyond `max_bytes`. The cache is thread safe.
+
+    :param directory: Directory to store the pages in.
+    :type directory: str
+    :param ttl: Seconds a page is served without revalidation.
+    :type ttl: float
+    :param max_age: Seconds after which an unused page is evicted.
+    :type max_age: float
+    :param max_bytes: Maximum total size of the cached pages.
+    :type max_bytes: int
+    """
+
+    def __init__(
+            self,
+            directory: str = PAGE_CACHE_DIR,
+            ttl: float = PAGE_CACHE_TTL,
+            max_age: float = PAGE_CACHE_MAX_AGE,
+            max_bytes: int = PAGE_CACHE_MAX_BYTES
+    ):
+        self.directory = directory
+        self.ttl = ttl
+        self.max_age = max_age
+        self.max_bytes = max_bytes
+        self._size: tp.Optional[int] = None
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def key(url: str, params: tp.Optional[tp.Dict[str, tp.Any]] = None, scope: str = '') -> str:
+        """
+        Cache key of a GET request. `scope` separates the pages seen by different access tokens.
+        """
+
+        full_url = requests.Request('GET', url, params=params).prepare().url
+        return hashlib.sha1(f'{scope}\n{full_url}'.encode('utf-8')).hexdigest()
+
+    def _filepath(self, key: str) -> str:
+        return os.path.join(self.directory, key + '.json')
+
+    def load(self, key: str) -> tp.Optional[CachedPage]:
+        """
+        The cached page for a key, None if it is not cached or its file is unreadable.
+        """
+
+        try:
+            with open(self._filepath(key), encoding='utf-8') as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return None
+
+    def is_fresh(self, page: CachedPage) -> bool:
+        return time.time() - page['stored'] < self.ttl
+
+    def validators(self, page: CachedPage) -> tp.Dict[str, str]:
+        """
+        Conditional request headers to revalidate a cached page with.
+        """
+
+        headers = {}
+        if page['headers'].get('ETag'):
+            headers['If-None-Match'] = page['headers']['ETag']
+        if page['headers'].get('Last-Modified'):
+            headers['If-Modified-Since'] = page['headers']['Last-Modified']
+        return headers
+
+    def store(self, key: str, response: requests.Response) -> CachedPage:
+        """
+        Cache the page of a successful response, evicting old pages if needed.
+        """
+
+        page = {
+            'url': response.url,
+            'stored': time.time(),
+            'headers': {header: response.headers[header] for header in CACHED_HEADERS if header in response.headers},
+            'body': response.text
+        }
+        self._write(key, page)
+        return page
+
+    def touch(self, key: str, page: CachedPage, revalidated: bool = False) -> None:
+        """
+        Mark a cached page as used, restarting its `ttl` if Canvas confirmed it is still valid.
+        """
+
+        if revalidated:
+            page['stored'] = time.time()
+            self._write(key, page)
+        else:
+            try:
+                os.utime(self._filepath(key))
+            except OSError:
+                pass
+
+    def _write(self, key: str, page: CachedPage) -> None:
+        filepath = self._filepath(key)
+        data = json.dumps(page).encode('utf-8')
+        with self._lock:
+            os.makedirs(self.directory, exist_ok=True)
+            old_size = os.path.getsize(filepath) if os.path.exists(filepath) else 0
+            temp_filepath = f'{filepath}.{threading.get_ident()}.tmp'
+            with open(temp_filepath, 'wb') as f:
+                f.write(data)
+            os.replace(temp_filepath, filepath)
+            if self._size is not None:
+                self._size += len(data) - old_size
+            if self._size is None or self._size > self.max_bytes:
+                self._evict()
+
+    def _evict(self) -> None:
+        """
+        Remove expired pages, then the least recently used pages until the cache fits in `max_bytes`.
+        """
+
+        entries = []
+        for entry in os.scandir(self.directory):
+            if entry.name.endswith('.json'):
+                stat = entry.stat()
+                entries.append((stat.st_mtime, stat.st_size, entry.path))
+        entries.sort()
+
+        now = time.time()
+        size = sum(entry_size for _, entry_size, _ in entries)
+        for mtime, entry_size, path in entries:
+            if now - mtime < self.max_age and size <= self.max_bytes:
+                break
+            try:
+                os.remove(path)
+            except OSError:
+                continue
+            size -= entry_size
+        self._size = size
+
+    def clear(self) -> None:
+        with self._lock:
+            if os.path.isdir(self.directory):
+                for entry in os.scandir(self.directory):
+                    if entry.name.endswith('.json'):
+                        os.remove(entry.path)
+            self._size = 0
+
+
+def cached_response(page: CachedPage) -> requests.Response:
+    """
+    Rebuild a `requests.Response` from a cached page, so that callers can use `json()` and `links` as usual.
+    """
+
+    response = requests.Response()
+    response.status_code = 200
+    response.url = page['url']
+    response.headers = CaseInsensitiveDict(page['headers'])
+    response.encoding = 'utf-8'
+    response._content = page['body'].encode('utf-8')
+    return response
@@ -0,0 +1,102 @@
+# -*- coding: utf-8 -*-
+
+import typing as tp
+
+from .constants import *
+from .encoding import EncodedChunk
+from .encoding import encode_chunk
+from .encoding import encode_record
+from .records import GradeRecord
+
+
+def row_size(row: GradeRecord) -> int:
+    """
+    Number of bytes a record adds to the JSON body of an update_grades request, including the separating comma.
+    """
+
+    return len(encode_record(row)) + 1
+
+
+class ChunkSizer(object):
+    """
+    Adaptive chunking policy for update_grades uploads.
+
+    Chunks are closed at `rows` rows or before they would exceed `max_bytes` of request body, whichever comes first,
+    so chunks with long comments are smaller than chunks with grades only. The row limit starts at `initial` and is
+    adjusted with every Progress job that reaches a final state: it grows by `growth` while jobs complete within half
+    of `target_seconds`, shrinks proportionally when they take longer than `target_seconds` and is halved when a job
+    fails. The row limit always stays between `min_rows` and `max_rows`.
+
+    Chunks are taken lazily from `chunks`, so feedback from finished jobs applies to the chunks that are built after
+    them.
+
+    :param initial: Row limit of the first chunks.
+    :type initial: int
+    :param min_rows: Lower bound of the row limit.
+    :type min_rows: int
+    :param max_rows: Upper bound of the row limit.
+    :type max_rows: int
+    :param max_bytes: Maximum request body of a chunk in bytes. A single row that is larger is sent on its own.
+    :type max_bytes: int
+    :param target_seconds: Progress job duration to aim for, in seconds.
+    :type target_seconds: float
+    :param growth: Factor by which the row limit grows while jobs finish quickly.
+    :type growth: float
+    """
+
+    def __init__(
+            self,
+            initial: int = DEFAULT_CHUNK_SIZE,
+            min_rows: int = CHUNK_SIZE_MIN,
+            max_rows: int = CHUNK_SIZE_MAX,
+            max_bytes: int = CHUNK_MAX_BYTES,
+            target_seconds: float = CHUNK_TARGET_SECONDS,
+            growth: float = CHUNK_GROWTH_FACTOR
+    ):
+        if not 1 <= min_rows <= max_rows:
+            raise ValueError(f'Expected 1 <= min_rows <= max_rows, got {min_rows} and {max_rows}')
+        self.min_rows = min_rows
+        self.max_rows = max_rows
+        self.max_bytes = max_bytes
+        self.target_seconds = target_seconds
+        self.growth = growth
+        self.rows = self._bound(initial)
+
+    def _bound(self, rows: float) -> int:
+        return max(self.min_rows, min(self.max_rows, int(rows)))
+
+    def observe(self, n_rows: int, seconds: float, state: str) -> None:
+        """
+        Adjust the row limit after the Progress job of a chunk of `n_rows` rows reached `state` in `seconds`.
+        """
+
+        if state == 'failed':
+            self.rows = self._bound(self.rows / 2)
+        elif seconds > self.target_seconds:
+            # Scale the chunk that took too long to the size that would have met the target
+            self.rows = self._bound(min(self.rows, n_rows * self.target_seconds / seconds))
+        elif seconds < self.target_seconds / 2 and n_rows >= self.rows:
+            # Only grow on chunks that were full, small trailing chunks say little about larger ones
+            self.rows = self._bound(max(self.rows + 1, self.rows * self.growth))
+
+    def chunks(self, rows: tp.Iterable[GradeRecord]) -> tp.Iterator[EncodedChunk]:
+        """
+        Generator chunking `rows` lazily by the current row limit and `max_bytes`.
+
+        Every record is encoded once, to measure it and as part of the request body of its chunk (see
+        `encoding.encode_chunk`), so chunks come out ready to be sent.
+        """
+
+        chunk: tp.List[GradeRecord] = []
+        entries: tp.List[bytes] = []
+        size = 0
+        for row in rows:
+            entry = encode_record(row)
+            if chunk and (len(chunk) >= self.rows or size + len(entry) + 1 > self.max_bytes):
+                yield encode_chunk(chunk, entries)
+                chunk, entries, size = [], [], 0
+            chunk.append(row)
+            entries.append(entry)
+            size += len(entry) + 1
+        if chunk:
+            yield encode_chunk(chunk, entries)
@@ -0,0 +1,533 @@
+# -*- coding: utf-8 -*-
+"""
+Command line interface of uppraisal, see `main`.
+
+Only argparse and the constants are imported up front. Every command imports what it needs when it runs, so that
+`--help` and local commands such as `status` do not pay for importing requests, openpyxl or bs4.
+"""
+
+import argparse
+import os
+import sys
+import typing as tp
+
+from .constants import *
+
+COMMANDS: tp.Tuple[str, ...] = ('upload', 'upload-each', 'batch', 'watch', 'export', 'attachments', 'status')
+
+TOKEN_ENVIRONMENT_VARIABLE = 'CANVAS_ACCESS_TOKEN'
+
+
+def open_client(arguments: argparse.Namespace) -> tp.Any:
+    """
+    Create the client for a command from the common options, with metrics and a page cache as requested.
+    """
+
+    from .cache import PageCache
+    from .client import CanvasClient
+    from .metrics import JsonLinesSink
+    from .metrics import Metrics
+    from .metrics import Summary
+
+    if not arguments.token:
+        raise SystemExit(f'A Canvas access token is required, pass -t or set {TOKEN_ENVIRONMENT_VARIABLE}')
+
+    metrics = Metrics()
+    arguments.summary = metrics.subscribe(Summary()) if arguments.metrics else None
+    arguments.sink = metrics.subscribe(JsonLinesSink(arguments.metrics)) if arguments.metrics else None
+    return CanvasClient(
+        arguments.token,
+        base_url=arguments.base_url or CANVAS_BASE_URL,
+        metrics=metrics,
+        cache=None if arguments.no_cache else PageCache()
+    )
+
+
+def upload(arguments: argparse.Namespace) -> int:
+    from .uppraisal import format_failures
+    from .uppraisal import upload_appraisals
+    from .validate import ValidationError
+
+    client = open_client(arguments)
+    try:
+        responses = upload_appraisals(
+            arguments.filepath,
+            None,
+            arguments.course,
+            arguments.assignment,
+            html_format=arguments.html,
+            submission_comment_header=arguments.comment_header,
+            grade_header=arguments.grade_header,
+            workbook_tab=arguments.tab,
+            max_in_flight=arguments.max_in_flight,
+            client=client,
+            changed_only=arguments.changed_only,
+            journal=not arguments.no_journal,
+            resume=arguments.resume,
+            input_format=arguments.format,
+            validate=not arguments.no_validate,
+            grade_decimals=arguments.decimals,
+            blank_grades=arguments.blank_grades
+        )
+    except ValidationError as e:
+        print(e, file=sys.stderr)
+        return 2
+    finally:
+        client.close()
+
+    completed = sum(response['workflow_state'] == 'completed' for response in responses)
+    print(f'{completed}/{len(responses)} chunks completed')
+    if completed < len(responses):
+        print(format_failures(responses))
+        return 1
+    return 0
+
+
+def upload_each(arguments: argparse.Namespace) -> int:
+    from .uppraisal import upload_appraisal
+    from .validate import ValidationError
+
+    client = open_client(arguments)
+    try:
+        responses = upload_appraisal(
+            None,
+            arguments.filepath,
+            arguments.course,
+            arguments.assignment,
+            html_format=arguments.html,
+            submission_comment_header=arguments.comment_header,
+            grade_header=arguments.grade_header,
+            workbook_tab=arguments.tab,
+            max_workers=arguments.max_workers,
+            client=client,
+            input_format=arguments.format,
+            validate=not arguments.no_validate,
+            grade_decimals=arguments.decimals,
+            blank_grades=arguments.blank_grades
+        )
+    except ValidationError as e:
+        print(e, file=sys.stderr)
+        return 2
+    finally:
+        client.close()
+
+    errors = {user_id: response for user_id, response in responses.items() if 'error' in response}
+    print(f'{len(responses) - len(errors)}/{len(responses)} students uploaded')
+    for user_id, response in errors.items():
+        print(f"user id {user_id}: {response['status_code']}, {response['error']}")
+    return 1 if errors else 0
+
+
+def batch(arguments: argparse.Namespace) -> int:
+    from .batch import format_report
+    from .batch import upload_manifest
+
+    client = open_client(arguments)
+    try:
+        report = upload_manifest(
+            arguments.manifest,
+            None,
+            max_concurrent=arguments.max_concurrent,
+            client=client,
+            resume=arguments.resume,
+            validate=not arguments.no_validate
+        )
+    finally:
+        client.close()
+
+    print(format_report(report))
+    return 1 if any(upload['error'] or upload['failed'] for upload in report) else 0
+
+
+def watch(arguments: argparse.Namespace) -> int:
+    from .batch import load_manifest
+    from .watch import watch as watch_files
+
+    if arguments.manifest:
+        entries = load_manifest(arguments.manifest)
+    elif arguments.filepath and arguments.course and arguments.assignment:
+        entries = [{
+            'filepath': arguments.filepath,
+            'course': arguments.course,
+            'assignment': arguments.assignment,
+            'workbook_tab': arguments.tab,
+            'grade_header': arguments.grade_header,
+            'submission_comment_header': arguments.comment_header,
+            'html_format': arguments.html,
+            'input_format': arguments.format,
+            'grade_decimals': arguments.decimals,
+            'blank_grades': arguments.blank_grades
+        }]
+    else:
+        raise SystemExit('Specify a file with -c and -a, or a manifest with -m')
+
+    client = open_client(arguments)
+    try:
+        print(f"Watching {', '.join(sorted({entry['filepath'] for entry in entries}))}, press Ctrl+C to stop")
+        watch_files(
+            entries,
+            client,
+            interval=arguments.interval,
+            debounce=arguments.debounce,
+            journal=not arguments.no_journal,
+            validate=not arguments.no_validate
+        )
+    except KeyboardInterrupt:
+        pass
+    finally:
+        client.close()
+    return 0
+
+
+def export(arguments: argparse.Namespace) -> int:
+    from .helpers import list_course_submissions
+    from .helpers import list_submissions
+
+    client = open_client(arguments)
+    try:
+        if len(arguments.assignment) == 1:
+            submissions = list_submissions(
+                None,
+                arguments.course,
+                arguments.assignment[0],
+                select_columns=arguments.columns,
+                out_filepath=arguments.output,
+                client=client,
+                submitted_only=not arguments.all,
+                refresh=arguments.refresh
+            )
+        else:
+            grouped = list_course_submissions(
+                None,
+                arguments.course,
+                arguments.assignment,
+                select_columns=arguments.columns,
+                out_filepath=arguments.output,
+                client=client,
+                submitted_only=not arguments.all,
+                refresh=arguments.refresh
+            )
+            submissions = [submission for assignments in grouped.values() for submission in assignments]
+    finally:
+        client.close()
+
+    print(f'{len(submissions)} submissions written to {arguments.output}')
+    return 0
+
+
+def attachments(arguments: argparse.Namespace) -> int:
+    from .attachments import download_attachments
+    from .attachments import format_downloads
+    from .helpers import put_excel
+
+    client = open_client(arguments)
+    try:
+        results = download_attachments(
+            None,
+            arguments.course,
+            arguments.assignment,
+            directory=arguments.directory,
+            client=client,
+            max_workers=arguments.max_workers,
+            max_bytes_per_second=arguments.max_rate * 1e6 if arguments.max_rate else None,
+            submitted_only=not arguments.all,
+            refresh=arguments.refresh
+        )
+    finally:
+        client.close()
+
+    if arguments.output:
+        headers = ['user_id', 'filename', 'size', 'updated_at', 'url', 'path', 'status', 'error']
+        put_excel(arguments.output, [headers] + [[result[header] for header in headers] for result in results])
+    print(format_downloads(results))
+    return 1 if any(result['status'] == 'failed' for result in results) else 0
+
+
+def status(arguments: argparse.Namespace) -> int:
+    from .journal import Journal
+    from .journal import journal_filepath
+
+    filepath = journal_filepath(arguments.filepath)
+    if not os.path.exists(filepath):
+        print(f'No uploads recorded for {arguments.filepath}')
+        return 0
+
+    uploads: tp.Dict[tp.Tuple[int, int], tp.Dict[str, int]] = {}
+    for record in Journal(filepath).chunks.values():
+        counts = uploads.setdefault((record['course'], record['assignment']), {
+            'completed': 0, 'failed': 0, 'pending': 0, 'rows': 0
+        })
+        state = record['state'] if record['state'] in PROGRESS_FINAL_STATES else 'pending'
+        counts[state] += 1
+        if state == 'completed':
+            counts['rows'] += len(record['rows'])
+
+    for (course, assignment), counts in sorted(uploads.items()):
+        print(f"course {course}, assignment {assignment}: {counts['completed']} chunks completed "
+              f"({counts['rows']} rows), {counts['failed']} failed, {counts['pending']} pending")
+    return 1 if any(counts['failed'] or counts['pending'] for counts in uploads.values()) else 0
+
+
+def build_parser() -> argparse.ArgumentParser:
+    canvas = argparse.ArgumentParser(add_help=False)
+    canvas.add_argument(
+        '-t', '--token',
+        help=f"Specify the Canvas access token, default is the {TOKEN_ENVIRONMENT_VARIABLE} environment variable",
+        default=os.environ.get(TOKEN_ENVIRONMENT_VARIABLE)
+    )
+    canvas.add_argument('--base-url', help=f"Specify the Canvas API URL, default is {CANVAS_BASE_URL}")
+    canvas.add_argument(
+        '--no-cache',
+        help="Do not cache the pages of submission listings under ~/.cache/uppraisal",
+        action='store_true'
+    )
+    canvas.add_argument(
+        '--metrics',
+        help="Write an event per Canvas request and pipeline stage to this JSON Lines file and print a summary"
+    )
+
+    assignment = argparse.ArgumentParser(add_help=False)
+    assignment.add_argument('-c', '--course', help="Specify the Canvas course ID", type=int, required=True)
+    assignment.add_argument('-a', '--assignment', help="Specify the Canvas assignment ID", type=int, required=True)
+
+    columns = argparse.ArgumentParser(add_help=False)
+    columns.add_argument(
+        '-l', '--html',
+        help="Indicate that the submission comments are in HTML",
+        action='store_true'
+    )
+    columns.add_argument(
+        '-f', '--format',
+        help="Specify the format of the file with the results, detected from the file extension by default",
+        choices=['xlsx', 'csv', 'jsonl', 'parquet']
+    )
+    columns.add_argument('--tab', help="Specify the worksheet with the results", default=DEFAULT_WORKBOOK_TAB)
+    columns.add_argument('--grade-header', help="Specify the grade column", default=DEFAULT_GRADE_HEADER)
+    columns.add_argument(
+        '--comment-header',
+        help="Specify the submission comment column",
+        default=DEFAULT_SUBMISSION_COMMENT_HEADER
+    )
+    columns.add_argument(
+        '--decimals',
+        help=f"Round numeric grades to this number of decimals, default is {GRADE_DECIMALS}",
+        type=int,
+        default=GRADE_DECIMALS
+    )
+    columns.add_argument(
+        '--blank-grades',
+        help="Keep the grade in Canvas for rows without a grade (default), or clear it",
+        choices=BLANK_GRADES,
+        default=DEFAULT_BLANK_GRADES
+    )
+    columns.add_argument(
+        '--no-validate',
+        help="Skip checking the rows against the course roster before uploading",
+        action='store_true'
+    )
+
+    grades = argparse.ArgumentParser(add_help=False, parents=[columns])
+    grades.add_argument('filepath', help="Specify an Excel (or CSV, JSON Lines or Parquet) file with the results")
+
+    parser = argparse.ArgumentParser(
+        prog='uppraisal',
+        description="Bulk upload assignment comments and grades to Canvas LMS"
+    )
+    commands = parser.add_subparsers(dest='command', metavar='command')
+    commands.required = True
+
+    command = commands.add_parser(
+        'upload',
+        parents=[canvas, assignment, grades],
+        help="Upload all grades and comments of an assignment in chunks"
+    )
+    command.add_argument(
+        '-r', '--resume',
+        help="Continue an interrupted upload from the journal next to the file with the results",
+        action='store_true'
+    )
+    command.add_argument(
+        '--changed-only',
+        help="Only upload rows whose grade or comment differs from Canvas",
+        action='store_true'
+    )
+    command.add_argument('--no-journal', help="Do not record the uploaded chunks", action='store_true')
+    command.add_argument(
+        '--max-in-flight',
+        help="Maximum number of chunks processed by Canvas at the same time",
+        type=int,
+        default=DEFAULT_MAX_IN_FLIGHT
+    )
+    command.set_defaults(handler=upload)
+
+    command = commands.add_parser(
+        'upload-each',
+        parents=[canvas, assignment, grades],
+        help="Upload the grade and comment of every student with a separate request"
+    )
+    command.add_argument(
+        '--max-workers',
+        help="Maximum number of requests at the same time",
+        type=int,
+        default=DEFAULT_MAX_WORKERS
+    )
+    command.set_defaults(handler=upload_each)
+
+    command = commands.add_parser(
+        'batch',
+        parents=[canvas],
+        help="Upload the assignments listed in a JSON manifest"
+    )
+    command.add_argument('manifest', help="Specify a JSON manifest mapping files and tabs to courses and assignments")
+    command.add_argument(
+        '-r', '--resume',
+        help="Continue interrupted uploads from the journals next to the files with the results",
+        action='store_true'
+    )
+    command.add_argument(
+        '--no-validate',
+        help="Skip checking the rows against the course rosters before uploading",
+        action='store_true'
+    )
+    command.add_argument(
+        '--max-concurrent',
+        help="Maximum number of assignments uploaded at the same time",
+        type=int,
+        default=DEFAULT_MAX_CONCURRENT_UPLOADS
+    )
+    command.set_defaults(handler=batch)
+
+    command = commands.add_parser(
+        'watch',
+        parents=[canvas, columns],
+        help="Upload the rows that changed whenever a file with results is saved, until interrupted"
+    )
+    command.add_argument('filepath', help="Specify the file with the results", nargs='?')
+    command.add_argument('-c', '--course', help="Specify the Canvas course ID", type=int)
+    command.add_argument('-a', '--assignment', help="Specify the Canvas assignment ID", type=int)
+    command.add_argument('-m', '--manifest', help="Watch the files of the uploads listed in a JSON manifest instead")
+    command.add_argument(
+        '--interval',
+        help="Seconds between checks of the files",
+        type=float,
+        default=WATCH_INTERVAL
+    )
+    command.add_argument(
+        '--debounce',
+        help="Seconds a file should be left alone after a save before it is uploaded",
+        type=float,
+        default=WATCH_DEBOUNCE
+    )
+    command.add_argument('--no-journal', help="Do not record the uploaded chunks", action='store_true')
+    command.set_defaults(handler=watch)
+
+    command = commands.add_parser(
+        'export',
+        parents=[canvas],
+        help="Write the submissions of one or more assignments to an Excel file"
+    )
+    command.add_argument('-c', '--course', help="Specify the Canvas course ID", type=int, required=True)
+    command.add_argument(
+        '-a', '--assignment',
+        help="Specify the Canvas assignment IDs; several assignments are retrieved at once, with a worksheet each",
+        type=int,
+        nargs='+',
+        required=True
+    )
+    command.add_argument('-o', '--output', help="Specify the Excel file", default=DEFAULT_OUT_FILEPATH)
+    command.add_argument(
+        '--columns',
+        help="Specify the submission fields to export",
+        nargs='+',
+        default=list(DEFAULT_SELECT_COLUMNS)
+    )
+    command.add_argument('--all', help="Include students who did not submit", action='store_true')
+    command.add_argument(
+        '--refresh',
+        help="Check cached pages with Canvas even if they are still fresh",
+        action='store_true'
+    )
+    command.set_defaults(handler=export)
+
+    command = commands.add_parser(
+        'attachments',
+        parents=[canvas, assignment],
+        help="Download the files attached to the submissions of an assignment"
+    )
+    command.add_argument(
+        '-d', '--directory',
+        help="Specify the folder to download to, with a subfolder per course, assignment and user",
+        default=DEFAULT_ATTACHMENTS_DIR
+    )
+    command.add_argument('-o', '--output', help="Write the attachments and their download status to this Excel file")
+    command.add_argument(
+        '--max-workers',
+        help="Maximum number of downloads at the same time",
+        type=int,
+        default=DEFAULT_DOWNLOAD_WORKERS
+    )
+    command.add_argument('--max-rate', help="Maximum download rate of all downloads together in MB/s", type=float)
+    command.add_argument('--all', help="Include students who did not submit", action='store_true')
+    command.add_argument(
+        '--refresh',
+        help="Check cached pages with Canvas even if they are still fresh",
+        action='store_true'
+    )
+    command.set_defaults(handler=attachments)
+
+    command = commands.add_parser(
+        'status',
+        help="Show the uploads recorded in the journal of a file with results, without contacting Canvas"
+    )
+    command.add_argument('filepath', help="Specify the file with the results")
+    command.set_defaults(handler=status)
+
+    return parser
+
+
+def legacy_arguments(argv: tp.List[str]) -> tp.List[str]:
+    """
+    Translate the arguments of the command line interface before subcommands to the `upload` or `batch` command.
+    """
+
+    if not argv or argv[0] in COMMANDS or argv[0] in ('-h', '--help'):
+        return argv
+
+    argv = list(argv)
+    for flag in ('-l', '--html'):
+        # "-l True" used to be the way to indicate HTML comments
+        if flag in argv:
+            index = argv.index(flag)
+            if index + 1 < len(argv) and argv[index + 1].lower() in ('true', 'false', '1', '0'):
+                if argv.pop(index + 1).lower() in ('false', '0'):
+                    argv.pop(index)
+    for flag in ('-m', '--manifest'):
+        if flag in argv:
+            argv.remove(flag)
+            return ['batch'] + argv
+    return ['upload'] + argv
+
+
+def main(argv: tp.Optional[tp.List[str]] = None) -> int:
+    """
+    Run the command line interface, returning the exit status: 0 on success, 1 if some uploads failed and 2 if the
+    rows failed validation.
+
+    :Examples:
+    $ uppraisal upload -t [access_token] -c [course_id] -a [assignment_id] grades.xlsx
+    $ uppraisal watch -t [access_token] -c [course_id] -a [assignment_id] grades.xlsx
+    $ uppraisal export -t [access_token] -c [course_id] -a [assignment_id] -o submissions.xlsx
+    $ uppraisal status grades.xlsx
+    """
+
+    arguments = build_parser().parse_args(legacy_arguments(sys.argv[1:] if argv is None else argv))
+    try:
+        return arguments.handler(arguments)
+    finally:
+        if getattr(arguments, 'sink', None) is not None:
+            arguments.sink.close()
+            print(arguments.summary.format())
+
+
+if __name__ == '__main__':
+    sys.exit(main())
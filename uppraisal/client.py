@@ -0,0 +1,163 @@
+# -*- coding: utf-8 -*-
+
+import contextlib
+import hashlib
+import typing as tp
+
+import requests
+from requests.adapters import HTTPAdapter
+
+from .constants import *
+from .cache import PageCache
+from .cache import cached_response
+from .metrics import Metrics
+from .throttle import RateLimiter
+from .throttle import default_rate_limiter
+from .throttle import request
+
+
+class CanvasClient(object):
+    """
+    Connection to the Canvas API that can be shared by all calls of a batch run.
+
+    The client owns a `requests.Session` whose connection pool keeps connections to Canvas alive between requests, so
+    that only the first request to a host pays for the TCP and TLS handshakes. Every request is scheduled by the
+    client's rate limiter.
+
+    :param cv_access_token: Canvas access token (generally 70 characters in length; see
+    https://canvas.instructure.com/courses/785215/pages/getting-started-with-the-api).
+    :type cv_access_token: str
+    :param base_url: Base URL of the Canvas API. Default is `CANVAS_BASE_URL`.
+    :type base_url: str
+    :param pool_size: Maximum number of connections kept alive, should be at least the number of concurrent requests.
+    :type pool_size: int
+    :param rate_limiter: Rate limiter for all requests of this client. Default is the limiter shared by all calls.
+    :type rate_limiter: RateLimiter or None
+    :param metrics: Metrics to emit request events and pipeline stage timings to, see `metrics.Metrics`.
+    :type metrics: Metrics or None
+    :param cache: Cache for the pages of listings retrieved with `get_page`, see `cache.PageCache`. Default is not to
+    cache pages.
+    :type cache: PageCache or None
+    """
+
+    def __init__(
+            self,
+            cv_access_token: str,
+            base_url: str = CANVAS_BASE_URL,
+            pool_size: int = DEFAULT_POOL_SIZE,
+            rate_limiter: tp.Optional[RateLimiter] = None,
+            metrics: tp.Optional[Metrics] = None,
+            cache: tp.Optional[PageCache] = None
+    ):
+        self.base_url = base_url.rstrip('/')
+        self.rate_limiter = rate_limiter or default_rate_limiter
+        self.metrics = metrics or Metrics()
+        self.cache = cache
+        # Pages are cached per access token, as tokens may see different data
+        self._cache_scope = hashlib.sha1(cv_access_token.encode('utf-8')).hexdigest()
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size)
+        self.session.mount('https://', adapter)
+        self.session.mount('http://', adapter)
+        self.session.headers.update({
+            'Authorization': 'Bearer ' + cv_access_token,
+            'Content-type': 'application/json'
+        })
+
+    def url(self, path: str, **kwargs: tp.Any) -> str:
+        """
+        Build an absolute URL from one of the `CANVAS_*_PATH` templates.
+
+        :Examples:
+        >>> CanvasClient('token').url(CANVAS_SUBMISSIONS_PATH, cid=1, aid=2)
+        'https://canvas.eur.nl/api/v1/courses/1/assignments/2/submissions'
+        """
+
+        return self.base_url + path.format(**kwargs)
+
+    def request(self, method: str, url: str, **kwargs: tp.Any) -> requests.Response:
+        """
+        Send a request over the pooled session, see `throttle.request`.
+        """
+
+        return request(
+            method, url, rate_limiter=self.rate_limiter, session=self.session, metrics=self.metrics, **kwargs)
+
+    def get(self, url: str, **kwargs: tp.Any) -> requests.Response:
+        return self.request('GET', url, **kwargs)
+
+    def get_page(
+            self,
+            url: str,
+            params: tp.Optional[tp.Dict[str, tp.Any]] = None,
+            refresh: bool = False
+    ) -> requests.Response:
+        """
+        Retrieve a page of a listing through the client's cache, if any.
+
+        A cached page within its time to live is returned without a request, unless `refresh` is True. Otherwise the
+        page is requested conditionally and the cached page is returned if Canvas answers 304 Not Modified.
+
+        :param url: The URL of the page.
+        :type url: str
+        :param params: Query parameters.
+        :type params: dict or None
+        :param refresh: Boolean indicating whether to check with Canvas even if the cached page is still fresh.
+        :type refresh: bool
+        :return: The response from Canvas, or a response rebuilt from the cache
+        :rtype: requests.Response
+        """
+
+        if self.cache is None:
+            return self.get(url, params=params)
+
+        key = self.cache.key(url, params, self._cache_scope)
+        page = self.cache.load(key)
+        if page is not None and not refresh and self.cache.is_fresh(page):
+            self.cache.touch(key, page)
+            self.metrics.emit('cache', url=url, result='fresh')
+            return cached_response(page)
+
+        response = self.get(url, params=params, headers=self.cache.validators(page) if page is not None else None)
+        if response.status_code == 304 and page is not None:
+            self.cache.touch(key, page, revalidated=True)
+            self.metrics.emit('cache', url=url, result='not_modified')
+            return cached_response(page)
+        if response.status_code // 100 == 2:
+            self.cache.store(key, response)
+        self.metrics.emit('cache', url=url, result='miss')
+        return response
+
+    def post(self, url: str, **kwargs: tp.Any) -> requests.Response:
+        return self.request('POST', url, **kwargs)
+
+    def put(self, url: str, **kwargs: tp.Any) -> requests.Response:
+        return self.request('PUT', url, **kwargs)
+
+    def close(self) -> None:
+        self.session.close()
+
+    def __enter__(self) -> 'CanvasClient':
+        return self
+
+    def __exit__(self, *exc_info: tp.Any) -> None:
+        self.close()
+
+
+@contextlib.contextmanager
+def ensure_client(
+        client: tp.Optional[CanvasClient],
+        cv_access_token: tp.Optional[str]
+) -> tp.Iterator[CanvasClient]:
+    """
+    Use the given client, or open a client for the access token that is closed afterwards.
+    """
+
+    if client is not None:
+        yield client
+        return
+
+    if not cv_access_token:
+        raise ValueError('Either a Canvas access token or a CanvasClient should be provided.')
+    with CanvasClient(cv_access_token) as client:
+        yield client
@@ -0,0 +1,97 @@
+# -*- coding: utf-8 -*-
+
+import re
+import typing as tp
+from concurrent.futures import ProcessPoolExecutor
+from functools import lru_cache
+
+from .constants import *
+from .helpers import chunker
+from .records import GradeRecord
+
+_BLANK_LINES = re.compile(r'[ \t]*\n[ \t]*\n\s*')
+
+
+@lru_cache(maxsize=COMMENT_CACHE_SIZE)
+def html_to_text(html: str) -> str:
+    """
+    Convert an HTML submission comment to plain text.
+
+    Line breaks and list items end a line, and block elements such as paragraphs are separated by a blank line.
+    Conversions are cached by comment content, so comments built from the same template are parsed only once.
+
+    :Examples:
+    >>> html_to_text('<p>Well done.</p><p>Points:<br>8/10</p>')
+    'Well done.\\n\\nPoints:\\n8/10'
+
+    :param html: The submission comment in HTML.
+    :type html: str
+    :return: The submission comment in plain text
+    :rtype: str
+    """
+
+    # Imported here, so that uppraisal starts quickly when no comments are converted
+    from bs4 import BeautifulSoup
+
+    soup = BeautifulSoup(html, features="html.parser")
+    for br in soup.find_all('br'):
+        br.replace_with('\n')
+    for block in soup.find_all(COMMENT_BLOCK_TAGS):
+        block.insert_before('\n\n')
+        block.insert_after('\n\n')
+    for line in soup.find_all(COMMENT_LINE_TAGS):
+        line.insert_after('\n')
+    return _BLANK_LINES.sub('\n\n', soup.get_text()).strip()
+
+
+def convert_batch(
+        comments: tp.Sequence[tp.Optional[str]],
+        executor: tp.Optional[ProcessPoolExecutor] = None
+) -> tp.List[tp.Optional[str]]:
+    """
+    Convert a batch of HTML submission comments to plain text, converting every distinct comment once.
+
+    :param comments: The submission comments in HTML; values that are not strings (e.g., None) are passed on as is.
+    :type comments: list
+    :param executor: Process pool to convert the distinct comments on. Default is to convert them in this process.
+    :type executor: ProcessPoolExecutor or None
+    :return: The submission comments in plain text, in the same order
+    :rtype: list
+    """
+
+    distinct = list(dict.fromkeys(comment for comment in comments if isinstance(comment, str)))
+    if executor is None:
+        converted = dict(zip(distinct, map(html_to_text, distinct)))
+    else:
+        converted = dict(zip(distinct, executor.map(html_to_text, distinct, chunksize=64)))
+    return [converted.get(comment, comment) if isinstance(comment, str) else comment for comment in comments]
+
+
+def convert_records(
+        records: tp.Iterable[GradeRecord],
+        processes: tp.Optional[int] = None,
+        batch_size: int = COMMENT_BATCH_SIZE
+) -> tp.Iterator[GradeRecord]:
+    """
+    Pipeline stage converting the HTML comments of grade records to plain text, a batch of records at a time.
+
+    :param records: Iterable of grade records.
+    :type records: iterable
+    :param processes: Number of worker processes for batches with many distinct comments. Default is to convert in
+    this process, which is faster unless the batches are large and the comments long.
+    :type processes: int or None
+    :param batch_size: Number of records converted at a time.
+    :type batch_size: int
+    :return: Iterator over the converted records
+    :rtype: iterator
+    """
+
+    executor = ProcessPoolExecutor(processes) if processes else None
+    try:
+        for batch in chunker(records, batch_size):
+            converted = convert_batch([record.comment for record in batch], executor)
+            for (user_id, grade, _), comment in zip(batch, converted):
+                yield GradeRecord(user_id, grade, comment)
+    finally:
+        if executor is not None:
+            executor.shutdown()
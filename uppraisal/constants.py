@@ -2,13 +2,23 @@ import typing as _tp
 from pathlib import Path
 
 CANVAS_BASE_URL: str = 'https://canvas.eur.nl/api/v1'
-CANVAS_COURSES_URL: str = CANVAS_BASE_URL + '/courses'
-CANVAS_COURSE_URL: str = CANVAS_COURSES_URL + '/{cid}'
-CANVAS_ASSIGNMENTS_URL: str = CANVAS_COURSE_URL + '/assignments'
-CANVAS_ASSIGNMENT_URL: str = CANVAS_ASSIGNMENTS_URL + '/{aid}'
-CANVAS_SUBMISSIONS_URL: str = CANVAS_ASSIGNMENT_URL + '/submissions'
-CANVAS_SUBMISSION_URL: str = CANVAS_SUBMISSIONS_URL + '/{uid}'
-CANVAS_UPDATE_GRADES_URL: str = CANVAS_SUBMISSIONS_URL + '/update_grades'
+CANVAS_COURSES_PATH: str = '/courses'
+CANVAS_COURSE_PATH: str = CANVAS_COURSES_PATH + '/{cid}'
+CANVAS_ASSIGNMENTS_PATH: str = CANVAS_COURSE_PATH + '/assignments'
+CANVAS_ASSIGNMENT_PATH: str = CANVAS_ASSIGNMENTS_PATH + '/{aid}'
+CANVAS_SUBMISSIONS_PATH: str = CANVAS_ASSIGNMENT_PATH + '/submissions'
+CANVAS_SUBMISSION_PATH: str = CANVAS_SUBMISSIONS_PATH + '/{uid}'
+CANVAS_UPDATE_GRADES_PATH: str = CANVAS_SUBMISSIONS_PATH + '/update_grades'
+CANVAS_STUDENT_SUBMISSIONS_PATH: str = CANVAS_COURSE_PATH + '/students/submissions'
+
+CANVAS_COURSES_URL: str = CANVAS_BASE_URL + CANVAS_COURSES_PATH
+CANVAS_COURSE_URL: str = CANVAS_BASE_URL + CANVAS_COURSE_PATH
+CANVAS_ASSIGNMENTS_URL: str = CANVAS_BASE_URL + CANVAS_ASSIGNMENTS_PATH
+CANVAS_ASSIGNMENT_URL: str = CANVAS_BASE_URL + CANVAS_ASSIGNMENT_PATH
+CANVAS_SUBMISSIONS_URL: str = CANVAS_BASE_URL + CANVAS_SUBMISSIONS_PATH
+CANVAS_SUBMISSION_URL: str = CANVAS_BASE_URL + CANVAS_SUBMISSION_PATH
+CANVAS_UPDATE_GRADES_URL: str = CANVAS_BASE_URL + CANVAS_UPDATE_GRADES_PATH
+CANVAS_STUDENT_SUBMISSIONS_URL: str = CANVAS_BASE_URL + CANVAS_STUDENT_SUBMISSIONS_PATH
 
 DEFAULT_SORT_BY: str = 'user_sortable_name'
 DEFAULT_SELECT_COLUMNS: _tp.Tuple[str, ...] = (
@@ -20,18 +30,85 @@ DEFAULT_SELECT_COLUMNS: _tp.Tuple[str, ...] = (
     'preview_url',
     'attachments'
 )
+DEFAULT_SUBMISSION_INCLUDE: _tp.Tuple[str, ...] = ('user',)
 
 BASE_DIR: Path = Path(__file__).absolute().parents[1]
 DEFAULT_OUT_FILEPATH: str = str((BASE_DIR / 'assignment_data.xlsx'))
 
+DEFAULT_ATTACHMENTS_DIR: str = str((BASE_DIR / 'attachments'))
+DEFAULT_DOWNLOAD_WORKERS: int = 4
+DOWNLOAD_CHUNK_SIZE: int = 64 * 1024
+DOWNLOAD_PART_SUFFIX: str = '.part'
+
 DEFAULT_HTML_FORMAT: bool = False
 DEFAULT_SUBMISSION_COMMENT_HEADER: str = 'submission_comment'
 DEFAULT_GRADE_HEADER: str = 'grade'
 DEFAULT_WORKBOOK_TAB: str = 'Sheet1'
 
 DEFAULT_CHUNK_SIZE = 100
+CHUNK_SIZE_MIN: int = 10
+CHUNK_SIZE_MAX: int = 1000
+CHUNK_MAX_BYTES: int = 1000000
+CHUNK_TARGET_SECONDS: float = 10.0
+CHUNK_GROWTH_FACTOR: float = 1.5
+
+DEFAULT_MAX_IN_FLIGHT: int = 4
+POLL_INTERVAL_MIN: float = 1.0
+POLL_INTERVAL_MAX: float = 30.0
+POLL_BACKOFF_FACTOR: float = 1.5
+DEFAULT_MAX_WORKERS: int = 8
+DEFAULT_POOL_SIZE: int = 16
+DEFAULT_MAX_CONCURRENT_UPLOADS: int = 4
+
+MANIFEST_OPTIONS: _tp.Tuple[str, ...] = (
+    'workbook_tab',
+    'grade_header',
+    'submission_comment_header',
+    'html_format',
+    'changed_only',
+    'input_format',
+    'grade_decimals',
+    'blank_grades'
+)
+
+PROGRESS_FINAL_STATES: _tp.Tuple[str, ...] = ('completed', 'failed')
+
+COMMENT_CACHE_SIZE: int = 4096
+COMMENT_BATCH_SIZE: int = 1000
+COMMENT_BLOCK_TAGS: _tp.Tuple[str, ...] = ('p', 'div', 'h1', 'h2', 'h3', 'h4', 'h5', 'h6', 'ul', 'ol', 'table')
+COMMENT_LINE_TAGS: _tp.Tuple[str, ...] = ('li', 'tr')
+
+JOURNAL_SUFFIX: str = '.journal.jsonl'
+
+WATCH_INTERVAL: float = 1.0
+WATCH_DEBOUNCE: float = 2.0
+
+CACHE_DIR: str = str(Path.home() / '.cache' / 'uppraisal')
+ROSTER_CACHE_TTL: float = 3600.0
+PAGE_CACHE_DIR: str = str(Path(CACHE_DIR) / 'pages')
+PAGE_CACHE_TTL: float = 300.0
+PAGE_CACHE_MAX_AGE: float = 7 * 24 * 3600.0
+PAGE_CACHE_MAX_BYTES: int = 256 * 1024 * 1024
+GRADE_DECIMALS: int = 2
+DEFAULT_BLANK_GRADES: str = 'keep'
+BLANK_GRADES: _tp.Tuple[str, ...] = ('keep', 'clear')
+VALIDATION_REPORT_LIMIT: int = 20
+VALIDATION_WARNINGS: _tp.Tuple[str, ...] = ('above_points_possible', 'blank_comment')
+
+# Canvas throttles every access token with a leaky bucket of 700 units, see
+# https://canvas.instructure.com/doc/api/file.throttling.html
+RATE_LIMIT_HEADROOM: float = 300.0
+RATE_LIMIT_MAX_DELAY: float = 2.0
+RATE_LIMIT_RETRY_WAIT: float = 1.0
+RATE_LIMIT_MAX_RETRIES: int = 6
 
-SLEEP_UPLOAD_APPRAISAL: float = .02  # TODO Is this needed?
-SLEEP_UPLOAD_APPRAISALS: float = 30.0  # TODO Seems high
+CONNECT_TIMEOUT: float = 10.0
+READ_TIMEOUT: float = 60.0
+RETRY_MAX_ATTEMPTS: int = 5
+RETRY_BACKOFF: float = 0.5
+RETRY_BACKOFF_MAX: float = 30.0
+RETRY_STATUSES: _tp.Tuple[int, ...] = (500, 502, 503, 504)
+IDEMPOTENT_METHODS: _tp.Tuple[str, ...] = ('GET', 'HEAD', 'OPTIONS', 'DELETE')
+POLL_MAX_ERRORS: int = 5
 
 del _tp
@@ -0,0 +1,172 @@
+# -*- coding: utf-8 -*-
+
+import json
+import typing as tp
+from collections import Counter
+
+from .client import CanvasClient
+from .helpers import list_course_submissions
+from .helpers import list_submissions
+from .records import GradeRecord
+
+SubmissionState = tp.Dict[int, tp.Tuple[tp.Optional[str], tp.Optional[str]]]
+
+
+def submission_state(submissions: tp.Iterable[tp.Dict[str, tp.Any]]) -> SubmissionState:
+    """
+    Reduce Canvas submissions to the current grade and latest submission comment per user id.
+
+    :param submissions: Submissions as returned by `list_submissions` with 'submission_comments' included.
+    :type submissions: list
+    :return: Mapping of user id to a tuple of grade and latest comment text, both None if absent
+    :rtype: dict
+    """
+
+    state = {}
+    for submission in submissions:
+        comments = submission.get('submission_comments') or []
+        state[int(submission['user_id'])] = (
+            submission.get('grade'),
+            comments[-1]['comment'] if comments else None
+        )
+    return state
+
+
+def fetch_submission_state(
+        client: CanvasClient,
+        cv_course_id: int,
+        cv_assignment_id: int
+) -> SubmissionState:
+    """
+    Retrieve the current grade and latest submission comment of every student of an assignment.
+
+    :param client: Client to send the requests with.
+    :type client: CanvasClient
+    :param cv_course_id: Course identifier (see Canvas course URL).
+    :type cv_course_id: int
+    :param cv_assignment_id: Assignment identifier (see Canvas assignment URL).
+    :type cv_assignment_id: int
+    :return: Mapping of user id to a tuple of grade and latest comment text
+    :rtype: dict
+    """
+
+    submissions = list_submissions(
+        None,
+        cv_course_id,
+        cv_assignment_id,
+        sort_by=None,
+        select_columns=('user_id', 'grade', 'submission_comments'),
+        out_filepath=None,
+        client=client,
+        include=('submission_comments',),
+        submitted_only=False,
+        # Uploads are skipped based on this state, so cached pages must be confirmed by Canvas
+        refresh=True
+    )
+    return submission_state(submissions)
+
+
+def fetch_course_submission_state(
+        client: CanvasClient,
+        cv_course_id: int,
+        cv_assignment_ids: tp.Sequence[int]
+) -> tp.Dict[int, SubmissionState]:
+    """
+    Retrieve the current grade and latest submission comment of every student for several assignments of a course
+    from a single listing, see `helpers.list_course_submissions`.
+
+    :param client: Client to send the requests with.
+    :type client: CanvasClient
+    :param cv_course_id: Course identifier (see Canvas course URL).
+    :type cv_course_id: int
+    :param cv_assignment_ids: Assignment identifiers (see Canvas assignment URL).
+    :type cv_assignment_ids: list
+    :return: Mapping of assignment id to the state of its submissions, see `fetch_submission_state`
+    :rtype: dict
+    """
+
+    submissions = list_course_submissions(
+        None,
+        cv_course_id,
+        cv_assignment_ids,
+        sort_by=None,
+        select_columns=('user_id', 'grade', 'submission_comments'),
+        out_filepath=None,
+        client=client,
+        include=('submission_comments',),
+        submitted_only=False,
+        refresh=True
+    )
+    return {aid: submission_state(assignment_submissions) for aid, assignment_submissions in submissions.items()}
+
+
+def save_submission_state(filepath: str, state: SubmissionState) -> None:
+    """
+    Save a submission state snapshot to a JSON file, see `load_submission_state`.
+    """
+
+    with open(filepath, 'w', encoding='utf-8') as f:
+        json.dump({str(user_id): list(values) for user_id, values in state.items()}, f)
+
+
+def load_submission_state(filepath: str) -> SubmissionState:
+    """
+    Load a submission state snapshot saved with `save_submission_state`.
+    """
+
+    with open(filepath, encoding='utf-8') as f:
+        return {int(user_id): tuple(values) for user_id, values in json.load(f).items()}
+
+
+def same_grade(posted_grade: tp.Any, current_grade: tp.Optional[str]) -> bool:
+    """
+    Compare a grade from the workbook with the grade in Canvas, treating numeric grades such as "8.0" and "8" as equal.
+    """
+
+    if current_grade is None:
+        return posted_grade is None or posted_grade in ('', 'None')
+    try:
+        return float(posted_grade) == float(current_grade)
+    except (TypeError, ValueError):
+        return str(posted_grade).strip() == str(current_grade).strip()
+
+
+def changed_rows(
+        rows: tp.Iterable[GradeRecord],
+        state: SubmissionState,
+        summary: tp.Optional[Counter] = None
+) -> tp.Iterator[GradeRecord]:
+    """
+    Pipeline stage passing on only the rows whose grade or comment differs from the current Canvas state.
+
+    Every row is counted in `summary` as 'new' (nothing graded or commented in Canvas yet), 'changed' or 'skipped'.
+    A blank comment in the workbook never counts as a change, because uploading it would not replace the comment in
+    Canvas, and neither does a grade of None, which leaves the grade in Canvas as is (see `encoding.normalize_grade`).
+
+    :param rows: Iterable of grade records with the formatted grade and plain text submission comment.
+    :type rows: iterable
+    :param state: Current Canvas state, see `fetch_submission_state`.
+    :type state: dict
+    :param summary: Counter updated with the status of every row.
+    :type summary: collections.Counter
+    :return: Iterator over the new and changed rows
+    :rtype: iterator
+    """
+
+    summary = summary if summary is not None else Counter()
+    for row in rows:
+        cv_user_id, grade, submission_comment = row
+        current_grade, current_comment = state.get(cv_user_id, (None, None))
+        if current_grade is None and current_comment is None:
+            summary['new'] += 1
+            yield row
+        elif (grade is not None and not same_grade(grade, current_grade)) or (
+                submission_comment and submission_comment.strip() != (current_comment or '').strip()):
+            summary['changed'] += 1
+            yield row
+        else:
+            summary['skipped'] += 1
+
+
+def format_summary(summary: Counter) -> str:
+    return f"{summary['skipped']} rows skipped, {summary['changed']} rows changed, {summary['new']} rows new"
@@ -0,0 +1,134 @@
+# -*- coding: utf-8 -*-
+
+import hashlib
+import json
+import re
+import typing as tp
+from decimal import ROUND_HALF_UP
+from decimal import Decimal
+from decimal import InvalidOperation
+
+from .constants import *
+from .records import GradeRecord
+
+_NUMBER = re.compile(r'[-+]?(\d+\.?\d*|\.\d+)')
+_NOT_FINITE = re.compile(r'[-+]?(nan|snan|inf|infinity)', re.IGNORECASE)
+
+
+def _format_number(value: tp.Union[int, float, str, Decimal], decimals: int) -> str:
+    # repr gives the shortest string that round-trips, so 7.8999999999 rounds as written instead of as stored
+    number = Decimal(repr(value) if isinstance(value, float) else str(value))
+    if not number.is_finite():
+        raise ValueError(f'grade {value!r} is not a number')
+    try:
+        number = number.quantize(Decimal(1).scaleb(-decimals), rounding=ROUND_HALF_UP)
+    except InvalidOperation:
+        raise ValueError(f'grade {value!r} has too many digits')
+    text = format(number.normalize(), 'f')
+    return '0' if text in ('-0', '+0') else text
+
+
+def normalize_grade(
+        grade: tp.Any,
+        decimals: int = GRADE_DECIMALS,
+        blank: str = DEFAULT_BLANK_GRADES
+) -> tp.Optional[str]:
+    """
+    Format a grade as the string posted to Canvas, the same way for the same grade whatever its type in the file.
+
+    Numbers, including numbers in text and percentages, are rounded half up to `decimals` decimals without trailing
+    zeros, so 8, 8.0 and "8.00" all become "8" and 7.8999999999 becomes "7.9". Other text, such as letter grades,
+    "pass" or "complete", is passed on with surrounding white space removed. A blank grade (None or empty text)
+    becomes None with `blank` "keep", meaning that no grade is posted and the grade in Canvas is left as is, and an
+    empty string with `blank` "clear", which removes the grade in Canvas.
+
+    :Examples:
+    >>> normalize_grade(7.8999999999)
+    '7.9'
+    >>> normalize_grade(' 85.125% ')
+    '85.13%'
+    >>> normalize_grade('A-')
+    'A-'
+
+    :param grade: The grade as read from the file.
+    :type grade: str or int or float or None
+    :param decimals: Number of decimals to round numbers to.
+    :type decimals: int
+    :param blank: What to do with blank grades, one of `BLANK_GRADES`.
+    :type blank: str
+    :return: The grade to post, or None if no grade should be posted
+    :rtype: str or None
+    """
+
+    if blank not in BLANK_GRADES:
+        raise ValueError(f"Unknown option for blank grades {blank}, specify one of: {', '.join(BLANK_GRADES)}")
+
+    if isinstance(grade, bool):
+        raise ValueError(f'grade {grade!r} is not a number or text')
+    if isinstance(grade, (int, float, Decimal)):
+        return _format_number(grade, decimals)
+    if grade is not None and not isinstance(grade, str):
+        raise ValueError(f'grade {grade!r} is not a number or text')
+
+    text = (grade or '').strip()
+    if not text:
+        return None if blank == 'keep' else ''
+    number, percent = (text[:-1].rstrip(), '%') if text.endswith('%') else (text, '')
+    if _NOT_FINITE.fullmatch(number):
+        raise ValueError(f'grade {grade!r} is not a number')
+    if _NUMBER.fullmatch(number):
+        return _format_number(number, decimals) + percent
+    return text
+
+
+def encode_record(record: GradeRecord) -> bytes:
+    """
+    JSON encoding of a record as an entry of the "grade_data" object of an update_grades request.
+
+    Fields that are None are left out, so a record without a grade only adds its comment.
+
+    :Examples:
+    >>> encode_record(GradeRecord(42, '8', None))
+    b'"42":{"posted_grade":"8"}'
+    """
+
+    values = {}
+    if record.grade is not None:
+        values['posted_grade'] = record.grade
+    if record.comment is not None:
+        values['text_comment'] = record.comment
+    return (json.dumps(str(record.user_id)) + ':' + json.dumps(values, ensure_ascii=False, separators=(',', ':'))
+            ).encode('utf-8')
+
+
+class EncodedChunk(tp.NamedTuple):
+    """
+    Chunk of records with the body of its update_grades request, see `encode_chunk`.
+    """
+
+    records: tp.Sequence[GradeRecord]
+    body: bytes
+    digest: str
+
+
+def encode_chunk(
+        records: tp.Sequence[GradeRecord],
+        entries: tp.Optional[tp.Sequence[bytes]] = None
+) -> EncodedChunk:
+    """
+    Encode the body of the update_grades request of a chunk once, so that it can be sent (and sent again) as is.
+
+    The digest is a content hash of the body: equal digests mean identical requests.
+
+    :param records: The records of the chunk.
+    :type records: list
+    :param entries: The records already encoded with `encode_record`. Default is to encode them.
+    :type entries: list or None
+    :return: The records, body and digest of the chunk
+    :rtype: EncodedChunk
+    """
+
+    if entries is None:
+        entries = [encode_record(record) for record in records]
+    body = b'{"grade_data":{' + b','.join(entries) + b'}}'
+    return EncodedChunk(records, body, hashlib.sha256(body).hexdigest())
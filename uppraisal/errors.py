@@ -0,0 +1,55 @@
+# -*- coding: utf-8 -*-
+
+import requests
+from urllib3.exceptions import NewConnectionError
+
+
+class CanvasError(Exception):
+    """
+    Raised for an error response from Canvas. The response is available as `response`.
+    """
+
+    def __init__(self, response: requests.Response, url: str = None):
+        self.response = response
+        self.status_code = response.status_code
+        self.url = url or response.url
+        super().__init__(f'Got an error {response.status_code} from {self.url}: {response.text}')
+
+
+def check_response(response: requests.Response, url: str = None) -> requests.Response:
+    """
+    Return the response if it is successful, raise a `CanvasError` otherwise.
+    """
+
+    if response.status_code // 100 != 2:
+        raise CanvasError(response, url)
+    return response
+
+
+def is_unsent(error: Exception) -> bool:
+    """
+    Check whether a request failed before any of it was sent: the connection timed out, was refused or the host could
+    not be resolved. A connection that broke after it was established, e.g. a reused keep-alive connection that the
+    server had closed, may have carried the request and does not count.
+    """
+
+    if isinstance(error, requests.ConnectTimeout):
+        return True
+    if isinstance(error, requests.ConnectionError):
+        reason = error.args[0] if error.args else None
+        # requests wraps the urllib3 error in a MaxRetryError with the cause as reason
+        return isinstance(getattr(reason, 'reason', reason), NewConnectionError)
+    return False
+
+
+def is_ambiguous(error: Exception) -> bool:
+    """
+    Check whether Canvas may have processed a request that failed with `error`.
+
+    A request that was never sent (see `is_unsent`), or that Canvas answered with a 4xx error, was not processed.
+    Server errors, timeouts while waiting for the response and broken connections leave the outcome unknown.
+    """
+
+    if isinstance(error, CanvasError):
+        return error.status_code >= 500
+    return not is_unsent(error)
@@ -2,12 +2,115 @@
 
 import typing as tp
 import warnings
-from copy import deepcopy
+from concurrent.futures import ThreadPoolExecutor
+from itertools import chain
+from itertools import islice
+from urllib.parse import parse_qs
+from urllib.parse import urlencode
+from urllib.parse import urlparse
+from urllib.parse import urlunparse
 
-import openpyxl
 import requests
 
-from constants import *
+from .constants import *
+from .client import CanvasClient
+from .client import ensure_client
+from .errors import check_response
+
+
+def iter_excel(
+        in_filepath: tp.Union[str, 'openpyxl.Workbook'],
+        worksheet: tp.Optional[tp.Union[str, int]],
+        include_fieldnames: tp.Optional[tp.Iterable[str]] = None,
+        exclude_fieldnames: tp.Optional[tp.Iterable[str]] = None,
+        has_headers: bool = True,
+        return_headers: bool = True,
+        case_sensitive: bool = False,
+        ignore_missing_headers: bool = False
+) -> tp.Iterator[tp.List[tp.Any]]:
+    """
+    Generator reading data from Excel files one row at a time.
+
+    The worksheet is streamed once with `iter_rows`, and the columns to return are determined once from the header
+    row, so reading time grows linearly with the number of rows. See `get_excel` for the parameters. `in_filepath`
+    can also be a workbook that is already open, to read several worksheets without loading the file again; such a
+    workbook is left open.
+
+    :return: An iterator over lists containing the data of every row of the worksheet.
+    :rtype: iterator
+    """
+
+    # TODO: Check fieldnames
+
+    if (include_fieldnames or exclude_fieldnames) and not has_headers:
+        raise Exception("Cannot include or exclude data from Excel file by column names when there are no headers.")
+
+    if include_fieldnames and exclude_fieldnames:
+        raise Exception("Cannot import data based on inclusion and exclusion simultaneously.")
+
+    if return_headers and not has_headers:
+        raise Exception("Cannot return headers from Excel file when there are no headers.")
+
+    if case_sensitive or ignore_missing_headers and not has_headers:
+        warnings.warn(
+            "Arguments \"capital_sensitive\" and \"ignore_missing_headers\" have no effect when there are no headers.")
+
+    if worksheet is None:
+        raise IOError("The name or index number of the worksheet has not been specified.")
+
+    def strip_case(s: tp.Any) -> str:
+        s = '' if s is None else str(s)
+        return (s.lower() if not case_sensitive else s).strip()
+
+    # Imported here, as openpyxl takes longer to import than the rest of uppraisal
+    import openpyxl
+
+    if isinstance(in_filepath, openpyxl.Workbook):
+        workbook = in_filepath
+    else:
+        workbook = openpyxl.load_workbook(in_filepath, read_only=True)
+    try:
+        if isinstance(worksheet, int):
+            worksheet = workbook.worksheets[worksheet]
+        elif isinstance(worksheet, str):
+            worksheet = workbook[worksheet]
+
+        rows = worksheet.iter_rows(values_only=True)
+        columns: tp.Optional[tp.List[tp.Optional[int]]] = None
+        if has_headers:
+            header_row = next(rows, ())
+            fieldnames = [strip_case(cell) for cell in header_row]
+            if include_fieldnames:
+                include_fieldnames = list(include_fieldnames)
+                positions = {fieldname: col for col, fieldname in enumerate(fieldnames)}
+                columns = [positions.get(strip_case(field)) for field in include_fieldnames]
+                missing = [field for field, col in zip(include_fieldnames, columns) if col is None]
+                headers = include_fieldnames
+            elif exclude_fieldnames:
+                exclude_fieldnames = [strip_case(field) for field in exclude_fieldnames]
+                columns = [col for col, fieldname in enumerate(fieldnames) if fieldname not in exclude_fieldnames]
+                missing = [field for field in exclude_fieldnames if field not in fieldnames]
+                headers = [header_row[col] for col in columns]
+            else:
+                missing = []
+                headers = list(header_row)
+
+            if missing and ignore_missing_headers is False:
+                raise IOError(f"The following fieldnames could not be found: {', '.join(missing)}")
+
+            if return_headers:
+                yield headers
+
+        if columns is None:
+            for row in rows:
+                yield list(row)
+        else:
+            for row in rows:
+                width = len(row)
+                yield [row[col] if col is not None and col < width else None for col in columns]
+    finally:
+        if workbook is not in_filepath:
+            workbook.close()
 
 
 def get_excel(
@@ -43,118 +146,175 @@ def get_excel(
     :rtype: list
     """
 
-    # TODO: Check fieldnames
-    # TODO: Check for duplicate headers
+    return list(iter_excel(
+        in_filepath,
+        worksheet,
+        include_fieldnames=include_fieldnames,
+        exclude_fieldnames=exclude_fieldnames,
+        has_headers=has_headers,
+        return_headers=return_headers,
+        case_sensitive=case_sensitive,
+        ignore_missing_headers=ignore_missing_headers
+    ))
 
-    if (include_fieldnames or exclude_fieldnames) and not has_headers:
-        raise Exception("Cannot include or exclude data from Excel file by column names when there are no headers.")
 
-    if include_fieldnames and exclude_fieldnames:
-        raise Exception("Cannot import data based on inclusion and exclusion simultaneously.")
+def filter_submissions(
+        submissions: tp.Iterable[tp.Dict[str, tp.Any]],
+        select_columns: tp.Optional[tp.Iterable[str]] = DEFAULT_SELECT_COLUMNS,
+        submitted_only: bool = True
+) -> tp.Iterator[tp.Dict[str, tp.Any]]:
+    """
+    Flatten the user data and attachments of Canvas submissions and select the requested columns.
 
-    if return_headers and not has_headers:
-        raise Exception("Cannot return headers from Excel file when there are no headers.")
+    :param submissions: Submissions as returned by the Canvas API.
+    :type submissions: list
+    :param select_columns: Iterable with column names to return, empty or None if all meta data should be returned.
+    :type select_columns: None or list
+    :param submitted_only: Boolean indicating whether only submissions with a submission date should be returned.
+    :type submitted_only: bool
+    :return: Iterator over the flattened submissions
+    :rtype: iterator
+    """
 
-    if case_sensitive or ignore_missing_headers and not has_headers:
-        warnings.warn(
-            "Arguments \"capital_sensitive\" and \"ignore_missing_headers\" have no effect when there are no headers.")
+    for assignment in submissions:
+        if assignment['submitted_at'] or not submitted_only:
 
-    workbook = openpyxl.load_workbook(in_filepath, read_only=True)
-    if worksheet is None:
-        raise IOError("The name or index number of the worksheet has not been specified.")
-    elif isinstance(worksheet, int):
-        worksheet = workbook.worksheets[worksheet]
-    elif isinstance(worksheet, str):
-        worksheet = workbook.get_sheet_by_name(worksheet)
+            if 'user' in assignment:
+                for key in assignment['user'].keys():
+                    assignment['user_' + key] = assignment['user'][key]
+                del assignment['user']
 
-    def strip_case(s: str) -> str:
-        return (s.lower() if not case_sensitive else s).strip()
+            if 'attachments' in assignment:
+                attachments = []
+                for attachment in assignment['attachments']:
+                    attachments.append(attachment['filename'])
+                assignment['attachments'] = '; '.join(attachments)
 
-    num_rows: int = worksheet.max_row
-    num_cols: int = worksheet.max_column
-    curr_row: int = 0
-    fieldmap: tp.List[tp.Optional[int]]
+            if select_columns:
+                remove_columns = []
+                for col in assignment:
+                    if col not in select_columns:
+                        remove_columns.append(col)
+                for col in remove_columns:
+                    del assignment[col]
 
-    if include_fieldnames:
-        org_fieldnames = include_fieldnames
-        include_fieldnames = [strip_case(field) for field in include_fieldnames]
-        data_template = [None] * len(include_fieldnames)
-        fieldmap = [None] * (num_cols + 1)
+            yield assignment
 
-    elif exclude_fieldnames:
-        exclude_fieldnames = [strip_case(field) for field in exclude_fieldnames]
-        data_template = [None] * (num_cols + 1 - len(exclude_fieldnames))
-        fieldmap = [None] * (num_cols + 1)
 
-    else:
-        data_template = [None] * (num_cols + 1)
-        fieldmap = [i for i in range(0, num_cols + 1)]
+def page_urls(response: requests.Response) -> tp.Optional[tp.List[str]]:
+    """
+    URLs of all pages after the first, derived from the "last" link of the first page.
+
+    :param response: Response with the first page of a paginated Canvas listing.
+    :type response: requests.Response
+    :return: List of page URLs, or None if the pages cannot be numbered (e.g., Canvas omitted the "last" link or
+    paginates with opaque bookmarks)
+    :rtype: list or None
+    """
 
-    data = []
-    fieldnames_found = []
-    while curr_row < num_rows:
-        curr_row += 1
+    if 'last' not in response.links:
+        return None
+
+    last_url = urlparse(response.links['last']['url'])
+    query = parse_qs(last_url.query)
+    page = query.get('page', [''])[0]
+    if not page.isdigit():
+        return None
+
+    urls = []
+    for page_nr in range(2, int(page) + 1):
+        query['page'] = [str(page_nr)]
+        urls.append(urlunparse(last_url._replace(query=urlencode(query, doseq=True))))
+    return urls
+
+
+def iter_pages(
+        client: CanvasClient,
+        url: str,
+        params: tp.Optional[tp.Dict[str, tp.Any]] = None,
+        max_workers: int = DEFAULT_MAX_WORKERS,
+        refresh: bool = False
+) -> tp.Iterator[tp.List[tp.Dict[str, tp.Any]]]:
+    """
+    Retrieve all pages of a paginated Canvas listing, in page order.
+
+    If the first page links to a numbered last page, the remaining pages are retrieved concurrently on at most
+    `max_workers` threads. Otherwise the "next" links are followed one page at a time. Pages are retrieved through the
+    client's page cache, if it has one (see `CanvasClient.get_page`).
+
+    :param client: Client to send the requests with.
+    :type client: CanvasClient
+    :param url: URL of the listing.
+    :type url: str
+    :param params: Query parameters of the first request; later pages carry them in their links.
+    :type params: dict or None
+    :param max_workers: Maximum number of pages retrieved at the same time.
+    :type max_workers: int
+    :param refresh: Boolean indicating whether cached pages are revalidated with Canvas even if they are still fresh.
+    :type refresh: bool
+    :return: Iterator over the JSON body of every page
+    :rtype: iterator
+    """
 
-        if curr_row == 1 and has_headers:
+    def get_page(page_url: str) -> requests.Response:
+        return check_response(client.get_page(page_url, refresh=refresh), page_url)
 
-            if include_fieldnames:
-                curr_col = 0
-                while curr_col < num_cols:
-                    curr_col += 1
-                    cell_value = worksheet.cell(curr_row, curr_col).value
-                    if cell_value in include_fieldnames:
-                        fieldmap[curr_col] = include_fieldnames.index(cell_value)
-                        fieldnames_found.append(cell_value)
+    response = check_response(client.get_page(url, params=params, refresh=refresh), url)
+    yield response.json()
 
-            elif exclude_fieldnames:
-                include_fieldnames = []
-                curr_col = 0
-                while curr_col < num_cols:
-                    curr_col += 1
-                    cell_value = strip_case(worksheet.cell(curr_row, curr_col).value)
-                    if cell_value not in exclude_fieldnames:
-                        include_fieldnames.append(cell_value)
-                        fieldnr = max(fieldmap) + 1 if 0 in fieldmap else 0
-                        fieldmap[curr_col] = fieldnr
-                        fieldnames_found.append(cell_value)
-            else:
-                # If not include or exclude fieldnames, include_fieldnames is set to all fieldnames
-                org_fieldnames = [c.value for c in worksheet[1]]
+    urls = page_urls(response)
+    if urls is not None:
+        with ThreadPoolExecutor(max_workers=max_workers) as executor:
+            for page in executor.map(get_page, urls):
+                yield page.json()
+    else:
+        while 'next' in response.links:
+            response = get_page(response.links['next']['url'])
+            yield response.json()
 
-            if has_headers and return_headers:
-                data.append(org_fieldnames)
 
-        else:
-            row_data = deepcopy(data_template)  # No need for deep, template is always flat?
-            # RESPONSE: Without deep it will copy the data from the last row only
-            curr_col = 0
-            while curr_col < num_cols:
-                curr_col += 1
-                fieldnr = fieldmap[curr_col]
-                if fieldnr is not None:
-                    row_data[fieldnr] = worksheet.cell(curr_row, curr_col).value
+def iter_submissions(
+        cv_access_token: tp.Optional[str],
+        cv_course_id: int,
+        cv_assignment_id: int,
+        select_columns: tp.Optional[tp.Iterable[str]] = DEFAULT_SELECT_COLUMNS,
+        client: tp.Optional[CanvasClient] = None,
+        include: tp.Iterable[str] = DEFAULT_SUBMISSION_INCLUDE,
+        submitted_only: bool = True,
+        max_workers: int = DEFAULT_MAX_WORKERS,
+        refresh: bool = False
+) -> tp.Iterator[tp.Dict[str, tp.Any]]:
+    """
+    Generator retrieving submission meta data for a Canvas assignment, unsorted and page by page as the pages arrive.
 
-            data.append(row_data)
+    See `list_submissions` for the parameters.
 
-    if ignore_missing_headers is False:
-        missing = None
-        if include_fieldnames:
-            missing = set(include_fieldnames) - set(fieldnames_found)
-        elif exclude_fieldnames:
-            missing = set(exclude_fieldnames) - set(fieldnames_found)
-        if missing:
-            raise IOError(f"The following fieldnames could not be found: {', '.join(missing)}")
+    :param max_workers: Maximum number of pages retrieved at the same time.
+    :type max_workers: int
+    :return: Iterator over dictionaries containing meta data for assignments submitted to assignment id
+    `cv_id_assignment`
+    :rtype: iterator
+    """
 
-    return data
+    params = {'grouped': True, 'per_page': 100, 'include[]': list(include)}
+    with ensure_client(client, cv_access_token) as client:
+        url = client.url(CANVAS_SUBMISSIONS_PATH, cid=cv_course_id, aid=cv_assignment_id)
+        for page in iter_pages(client, url, params, max_workers, refresh):
+            yield from filter_submissions(page, select_columns, submitted_only)
 
 
 def list_submissions(
-        cv_access_token: str,
+        cv_access_token: tp.Optional[str],
         cv_course_id: int,
         cv_assignment_id: int,
         sort_by: str = DEFAULT_SORT_BY,
         select_columns: tp.Optional[tp.Iterable[str]] = DEFAULT_SELECT_COLUMNS,
         out_filepath: tp.Optional[str] = DEFAULT_OUT_FILEPATH,
+        client: tp.Optional[CanvasClient] = None,
+        include: tp.Iterable[str] = DEFAULT_SUBMISSION_INCLUDE,
+        submitted_only: bool = True,
+        max_workers: int = DEFAULT_MAX_WORKERS,
+        refresh: bool = False
 ) -> tp.List[tp.Dict[str, tp.Any]]:
     """
     Retrieve submission meta data for a Canvas assignment
@@ -173,88 +333,222 @@ def list_submissions(
     :type select_columns: None or list
     :param out_filepath: If this is a string, save to the given path.
     :type out_filepath: str or None
+    :param client: Client to share between calls. Default is a new client for `cv_access_token`.
+    :type client: CanvasClient or None
+    :param include: Associations to include with every submission (e.g., 'submission_comments'). Default is 'user'.
+    :type include: list
+    :param submitted_only: Boolean indicating whether only submissions with a submission date should be returned.
+    :type submitted_only: bool
+    :param max_workers: Maximum number of pages retrieved at the same time.
+    :type max_workers: int
+    :param refresh: Boolean indicating whether pages in the client's cache are revalidated with Canvas even if they
+    are still fresh, see `CanvasClient.get_page`.
+    :type refresh: bool
     :return: List of dictionaries containing meta data for assignments submitted to assignment id `cv_id_assignment`
     :rtype: list
     """
 
-    def filter_assignments(rbuffer):
-        assignments = []
-        for assignment in rbuffer.json():
-            if assignment['submitted_at']:
+    if sort_by and select_columns and sort_by not in select_columns:
+        raise IOError('The column specified for sortby must be in the list of columns you would like to be returned')
 
-                if 'user' in assignment:
-                    for key in assignment['user'].keys():
-                        assignment['user_' + key] = assignment['user'][key]
-                    del assignment['user']
+    assignments = list(iter_submissions(
+        cv_access_token,
+        cv_course_id,
+        cv_assignment_id,
+        select_columns=select_columns,
+        client=client,
+        include=include,
+        submitted_only=submitted_only,
+        max_workers=max_workers,
+        refresh=refresh
+    ))
+    sort_submissions(assignments, sort_by)
 
-                if 'attachments' in assignment:
-                    attachments = []
-                    for attachment in assignment['attachments']:
-                        attachments.append(attachment['filename'])
-                    assignment['attachments'] = '; '.join(attachments)
+    if out_filepath:
+        put_excel(out_filepath, submission_rows(assignments, submission_headers(assignments, select_columns)))
 
-                if select_columns:
-                    remove_columns = []
-                    for col in assignment:
-                        if col not in select_columns:
-                            remove_columns.append(col)
-                    for col in remove_columns:
-                        del assignment[col]
+    return assignments
 
-                assignments.append(assignment)
 
-        return assignments
+def iter_course_submissions(
+        cv_access_token: tp.Optional[str],
+        cv_course_id: int,
+        cv_assignment_ids: tp.Iterable[int],
+        select_columns: tp.Optional[tp.Iterable[str]] = DEFAULT_SELECT_COLUMNS,
+        client: tp.Optional[CanvasClient] = None,
+        include: tp.Iterable[str] = DEFAULT_SUBMISSION_INCLUDE,
+        submitted_only: bool = True,
+        max_workers: int = DEFAULT_MAX_WORKERS,
+        refresh: bool = False
+) -> tp.Iterator[tp.Dict[str, tp.Any]]:
+    """
+    Generator retrieving submission meta data for several assignments of a course from a single listing.
+
+    The course level students/submissions endpoint returns the submissions of all students for all assignments in
+    `cv_assignment_ids` in one paginated listing, instead of one listing per assignment. Submissions are flattened like
+    `iter_submissions` does; see `list_course_submissions` for the parameters.
+
+    :return: Iterator over dictionaries containing meta data for the submissions, in no particular order
+    :rtype: iterator
+    """
+
+    params = {
+        'student_ids[]': 'all',
+        'assignment_ids[]': list(cv_assignment_ids),
+        'per_page': 100,
+        'include[]': list(include)
+    }
+    with ensure_client(client, cv_access_token) as client:
+        url = client.url(CANVAS_STUDENT_SUBMISSIONS_PATH, cid=cv_course_id)
+        for page in iter_pages(client, url, params, max_workers, refresh):
+            yield from filter_submissions(page, select_columns, submitted_only)
+
+
+def list_course_submissions(
+        cv_access_token: tp.Optional[str],
+        cv_course_id: int,
+        cv_assignment_ids: tp.Sequence[int],
+        sort_by: str = DEFAULT_SORT_BY,
+        select_columns: tp.Optional[tp.Iterable[str]] = DEFAULT_SELECT_COLUMNS,
+        out_filepath: tp.Optional[str] = DEFAULT_OUT_FILEPATH,
+        client: tp.Optional[CanvasClient] = None,
+        include: tp.Iterable[str] = DEFAULT_SUBMISSION_INCLUDE,
+        submitted_only: bool = True,
+        max_workers: int = DEFAULT_MAX_WORKERS,
+        refresh: bool = False
+) -> tp.Dict[int, tp.List[tp.Dict[str, tp.Any]]]:
+    """
+    Retrieve submission meta data for several assignments of a course at once.
+
+    The result for every assignment has the same columns and order as `list_submissions` would return for it, but all
+    assignments are retrieved from a single listing (see `iter_course_submissions`), so a course with dozens of
+    assignments takes the requests of one listing instead of dozens.
+
+    :param cv_access_token: Canvas access token (generally 70 characters in length; see
+    https://canvas.instructure.com/courses/785215/pages/getting-started-with-the-api).
+    :type cv_access_token: str
+    :param cv_course_id: Course identifier (see Canvas course URL).
+    :type cv_course_id: int
+    :param cv_assignment_ids: Assignment identifiers (see Canvas assignment URL).
+    :type cv_assignment_ids: list
+    :param sort_by: Assignment meta data column by which the return data should be sorted (e.g., 'submitted_at'). Default
+    is 'user_sortable_name'.
+    :type sort_by: str
+    :param select_columns: Iterable with column names to return, empty or None if all meta data should be returned.
+    :type select_columns: None or list
+    :param out_filepath: If this is a string, save to the given path, with a worksheet per assignment named after the
+    assignment identifier.
+    :type out_filepath: str or None
+    :param client: Client to share between calls. Default is a new client for `cv_access_token`.
+    :type client: CanvasClient or None
+    :param include: Associations to include with every submission (e.g., 'submission_comments'). Default is 'user'.
+    :type include: list
+    :param submitted_only: Boolean indicating whether only submissions with a submission date should be returned.
+    :type submitted_only: bool
+    :param max_workers: Maximum number of pages retrieved at the same time.
+    :type max_workers: int
+    :param refresh: Boolean indicating whether pages in the client's cache are revalidated with Canvas even if they
+    are still fresh, see `CanvasClient.get_page`.
+    :type refresh: bool
+    :return: Dictionary with a list of submissions per assignment identifier, in the order of `cv_assignment_ids`
+    :rtype: dict
+    """
 
     if sort_by and select_columns and sort_by not in select_columns:
         raise IOError('The column specified for sortby must be in the list of columns you would like to be returned')
+    if not cv_assignment_ids:
+        raise ValueError('At least one assignment identifier should be provided.')
+
+    # The assignment of every submission is needed to group them, even if it was not asked for
+    keep_assignment_id = not select_columns or 'assignment_id' in select_columns
+    columns = None if not select_columns else list(select_columns) + ([] if keep_assignment_id else ['assignment_id'])
+
+    grouped: tp.Dict[int, tp.List[tp.Dict[str, tp.Any]]] = {int(aid): [] for aid in cv_assignment_ids}
+    for submission in iter_course_submissions(
+            cv_access_token,
+            cv_course_id,
+            cv_assignment_ids,
+            select_columns=columns,
+            client=client,
+            include=include,
+            submitted_only=submitted_only,
+            max_workers=max_workers,
+            refresh=refresh
+    ):
+        aid = int(submission['assignment_id'] if keep_assignment_id else submission.pop('assignment_id'))
+        if aid in grouped:
+            grouped[aid].append(submission)
+
+    for assignments in grouped.values():
+        sort_submissions(assignments, sort_by)
 
-    params = {'grouped': True, 'per_page': 100, 'include': 'user'}
-    headers = {'Authorization': 'Bearer {}'.format(cv_access_token), 'Content-type': 'application/json'}
-    assignments = []
+    if out_filepath:
+        put_excel(
+            out_filepath,
+            [submission_rows(assignments, submission_headers(assignments, select_columns))
+             for assignments in grouped.values()],
+            worksheet_names=[str(aid) for aid in grouped]
+        )
 
-    url = CANVAS_SUBMISSIONS_URL.format(cid=cv_course_id, aid=cv_assignment_id)
-    response = requests.get(url, headers=headers, params=params)
-    if response.status_code // 100 != 2:
-        raise Exception(f'Got an error {response.status_code} from {url}: {response.text}')
+    return grouped
 
-    assignments += filter_assignments(response)
-    while response.links['current']['url'] != response.links['last']['url']:
-        url = response.links['next']['url']
-        response = requests.get(url, headers=headers, params=params)
-        if response.status_code // 100 != 2:
-            raise Exception(f'Got an error {response.status_code} from {url}: {response.text}')
 
-        assignments += filter_assignments(response)
+def sort_submissions(submissions: tp.List[tp.Dict[str, tp.Any]], sort_by: tp.Optional[str]) -> None:
+    """
+    Sort submissions in place by one of their columns, warning if the column is not present.
+    """
 
-    if sort_by in assignments[0]:
-        assignments.sort(key=lambda k: k[sort_by])
+    if not sort_by or not submissions:
+        pass
+    elif sort_by in submissions[0]:
+        submissions.sort(key=lambda k: k[sort_by])
     else:
         if type(sort_by) == str:
             warnings.warn(f'The specified sort key (i.e., {sort_by}) was not found')
         else:
             warnings.warn(f'The parameter sortby should be a string, got {sort_by}')
 
+
+def submission_headers(
+        submissions: tp.Iterable[tp.Dict[str, tp.Any]],
+        select_columns: tp.Optional[tp.Iterable[str]] = None
+) -> tp.List[str]:
+    """
+    Columns to write for submissions: the selected columns, or else every column found in order of appearance.
+    """
+
     if select_columns:
-        headers = list(select_columns)
-    else:
-        _headers: tp.Dict[str, bool] = dict()
-        for assignment in assignments:
-            for header in assignment.keys():
-                _headers[header] = True
-        headers = list(_headers.keys())
-        del _headers
-
-    assignment_list = [headers]
-    for assignment in assignments:
-        assignment_row = []
-        for header in headers:
-            assignment_row.append(assignment[header])
-        assignment_list.append(assignment_row)
+        return list(select_columns)
 
-    if out_filepath:
-        put_excel(out_filepath, assignment_list)
+    headers: tp.Dict[str, bool] = dict()
+    for submission in submissions:
+        for header in submission.keys():
+            headers[header] = True
+    return list(headers.keys())
 
-    return assignments
+
+def submission_rows(
+        submissions: tp.Iterable[tp.Dict[str, tp.Any]],
+        headers: tp.Sequence[str]
+) -> tp.Iterator[tp.List[tp.Any]]:
+    """
+    Generator turning submissions into a header row followed by one row per submission, e.g. for `put_excel`.
+
+    :Examples:
+    >>> columns = ['user_id', 'grade']
+    >>> put_excel("./submissions.xlsx", submission_rows(iter_submissions(token, 1, 2, columns), columns))
+
+    :param submissions: Submissions as returned by `list_submissions` or `iter_submissions`.
+    :type submissions: iterable
+    :param headers: Columns to write, in order.
+    :type headers: list
+    :return: Iterator over the rows
+    :rtype: iterator
+    """
+
+    yield list(headers)
+    for submission in submissions:
+        yield [submission.get(header) for header in headers]
 
 
 # TODO Not used?
@@ -263,20 +557,26 @@ _T = tp.TypeVar('_T')
 
 def put_excel(
         out_filepath: str,
-        data: tp.List[tp.List[tp.Any]],
+        data: tp.Iterable[tp.Any],
         worksheet_names: tp.Optional[tp.Union[str, tp.List[str]]] = None
 ) -> None:
     """
     Method for writing data from a list of lists to Excel
 
+    The workbook is written in openpyxl's write-only mode, so rows are streamed to the file as they are taken from
+    `data`. Rows (or the row lists per worksheet) can therefore be generators, which keeps memory use bounded for
+    large exports.
+
     :Examples:
     >>> dat = [["Header 1", "Header 2", "Header 3"], ["row 1 cell 1", "row 1 cell 2", "row 1 cell 3"], ["row 2 cell 1", "row 2 cell 2", "row 3 cell 3"], ["row 3 cell 1", "row 3 cell 2", "row 3 cell 3"]]
     >>> put_excel("./example1.xls", dat) # Example writing to a single worksheet
     >>> dat = [[["Header 1", "Header 2", "Header 3"], ["row 1 cell 1", "row 1 cell 2", "row 1 cell 3"], ["row 2 cell 1", "row 2 cell 2", "row 3 cell 3"], ["row 3 cell 1", "row 3 cell 2", "row 3 cell 3"]], [["Header 4", "Header 5", "Header 6"], ["row 4 cell 1", "row 4 cell 2", "row 4 cell 3"], ["row 5 cell 1", "row 5 cell 2", "row 5 cell 3"], ["row 6 cell 1", "row 6 cell 2", "row 6 cell 3"]], [["Header 7", "Header 8", "Header 9"], ["row 7 cell 1", "row 7 cell 2", "row 7 cell 3"], ["row 8 cell 1", "row 8 cell 2", "row 8 cell 3"], ["row 9 cell 1", "row 9 cell 2", "row 9 cell 3"]]]
     >>> put_excel("./example2.xls", dat, worksheet_names=["WS1", "WS2", "WS3"]) # Example writing to multiple worksheets
+    >>> put_excel("./example3.xls", ([i, i ** 2] for i in range(100000))) # Example streaming rows from a generator
 
-    :param data: List of lists containing the data that should be written to Excel.
-    :type data: list
+    :param data: List (or iterable) of rows, or list of such row iterables with one per worksheet, containing the
+    data that should be written to Excel.
+    :type data: list or iterable
     :param out_filepath: File path pointing to location and file name to which the data should be written.
     :type out_filepath: str
     :param worksheet_names: List of names of worksheets to which the data should be written or string name for the
@@ -285,54 +585,57 @@ def put_excel(
     :return: None
     """
 
-    wb = openpyxl.Workbook()
-    l = 3 if isinstance(data[0][0], list) else 2
-    if l == 2:
-        # If data is list of rows, structure as if it were a list containing lists of rows
-        if worksheet_names:
-            if isinstance(worksheet_names, str):
-                worksheet_names = [worksheet_names]
-        data = [data]
-        l = 3
-
-    if l == 3:
-        # If data is list containing lists of rows create a worksheet for every list of rows
-        # Check if there are names for every worksheet
-        if worksheet_names:
-            if len(data) != len(worksheet_names):
-                raise IOError("Data structure indicates {} worksheet, but {} worksheet name{} been provided".format(
-                    len(data), len(worksheet_names), "s have" if len(worksheet_names) > 1 else " has"
-                ))
-        else:
-            worksheet_names = [f'Sheet{i + 1}' for i in range(len(data))]
+    rows = iter(data)
+    first = next(rows, None)
+    if first is not None and (not isinstance(first, (list, tuple)) or (first and isinstance(first[0], (list, tuple)))):
+        # If data contains lists (or iterables) of rows, create a worksheet for every list of rows
+        data = [first] + list(rows)
+    else:
+        # If data is a list of rows, structure as if it were a list containing lists of rows
+        if isinstance(worksheet_names, str):
+            worksheet_names = [worksheet_names]
+        data = [chain([first], rows) if first is not None else rows]
+
+    # Check if there are names for every worksheet
+    if worksheet_names:
+        if len(data) != len(worksheet_names):
+            raise IOError("Data structure indicates {} worksheet, but {} worksheet name{} been provided".format(
+                len(data), len(worksheet_names), "s have" if len(worksheet_names) > 1 else " has"
+            ))
+    else:
+        worksheet_names = [f'Sheet{i + 1}' for i in range(len(data))]
 
-        for index, (wsname, wsdat) in enumerate(zip(worksheet_names, data)):
-            ws = wb.create_sheet(wsname, index)
-            for row_j, row in enumerate(wsdat, 1):
-                for cell_i, cell in enumerate(row, 1):
-                    ws.cell(row_j, cell_i, cell)
+    import openpyxl
 
-        wb.save(out_filepath)
+    wb = openpyxl.Workbook(write_only=True)
+    for wsname, wsdat in zip(worksheet_names, data):
+        ws = wb.create_sheet(wsname)
+        for row in wsdat:
+            ws.append(row)
 
-    return
+    wb.save(out_filepath)
 
 
-def chunker(seq: tp.Sequence[_T], size: int = DEFAULT_CHUNK_SIZE) -> tp.Iterator[tp.Sequence[_T]]:
+def chunker(seq: tp.Iterable[_T], size: int = DEFAULT_CHUNK_SIZE) -> tp.Iterator[tp.List[_T]]:
     """
-    Chunks a list of items to help reduce the API load
+    Chunks an iterable of items to help reduce the API load
 
-    :source: https://stackoverflow.com/a/434328
+    Items are taken from `seq` lazily, so it can be a generator that is still producing items while the first chunks
+    are being processed.
 
-    :param seq: array over which to loop
-    :rtype seq: list
+    :param seq: iterable over which to loop
+    :rtype seq: iterable
     :param size: size of chunks
     :rtype size: int
-    :return: chunked list
-    :rtype: list
+    :return: iterator over chunked lists
+    :rtype: iterator
     """
 
-    for pos in range(0, len(seq), size):
-        yield seq[pos:pos + size]
+    iterator = iter(seq)
+    chunk = list(islice(iterator, size))
+    while chunk:
+        yield chunk
+        chunk = list(islice(iterator, size))
 
 
 if __name__ == "__main__":
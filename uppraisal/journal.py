@@ -0,0 +1,118 @@
+# -*- coding: utf-8 -*-
+
+import hashlib
+import json
+import os
+import threading
+import time
+import typing as tp
+
+from .constants import *
+
+
+def row_digest(cv_course_id: int, cv_assignment_id: int, row: tp.Sequence[tp.Any]) -> str:
+    """
+    Content hash identifying a prepared row of an assignment, independent of the chunk it is uploaded in.
+    """
+
+    content = json.dumps([cv_course_id, cv_assignment_id] + list(row), ensure_ascii=False, default=str)
+    return hashlib.sha1(content.encode('utf-8')).hexdigest()[:16]
+
+
+def chunk_digest(row_digests: tp.Iterable[str]) -> str:
+    """
+    Content hash identifying a chunk of rows, see `row_digest`.
+    """
+
+    return hashlib.sha1(''.join(row_digests).encode('ascii')).hexdigest()
+
+
+def journal_filepath(in_filepath: str) -> str:
+    """
+    Location of the journal belonging to a workbook, next to the workbook itself.
+    """
+
+    return in_filepath + JOURNAL_SUFFIX
+
+
+class Journal(object):
+    """
+    Append-only JSON Lines record of the chunks uploaded to Canvas.
+
+    Every chunk is recorded before it is posted, again with the URL of its Progress job once Canvas accepted it, and
+    once more when the job reaches a final state. Records are flushed to disk immediately, so after a crash the
+    journal tells which rows were completed and which Progress jobs may still be running. Later records of a chunk
+    update the earlier ones when the journal is loaded.
+
+    :param filepath: Location of the journal file, created if it does not exist.
+    :type filepath: str
+    """
+
+    def __init__(self, filepath: str):
+        self.filepath = filepath
+        self.chunks: tp.Dict[str, tp.Dict[str, tp.Any]] = {}
+        self._lock = threading.Lock()
+        if os.path.exists(filepath):
+            with open(filepath, encoding='utf-8') as f:
+                for line in f:
+                    try:
+                        record = json.loads(line)
+                    except ValueError:
+                        # A record that was cut off by a crash
+                        continue
+                    self.chunks.setdefault(record['chunk'], {}).update(record)
+
+    def record(self, chunk: str, **fields: tp.Any) -> None:
+        """
+        Append a record for a chunk and update its state in memory.
+        """
+
+        record = dict(chunk=chunk, time=time.strftime('%Y-%m-%dT%H:%M:%S'), **fields)
+        line = json.dumps(record, ensure_ascii=False) + '\n'
+        with self._lock:
+            with open(self.filepath, 'a', encoding='utf-8') as f:
+                f.write(line)
+                f.flush()
+                os.fsync(f.fileno())
+            self.chunks.setdefault(chunk, {}).update(record)
+
+    def _select(self, cv_course_id: int, cv_assignment_id: int) -> tp.Iterator[tp.Dict[str, tp.Any]]:
+        # Uploads from different tabs of a workbook share the journal, take a snapshot while other threads record
+        with self._lock:
+            records = [dict(record) for record in self.chunks.values()]
+        for record in records:
+            if record.get('course') == cv_course_id and record.get('assignment') == cv_assignment_id:
+                yield record
+
+    def completed_rows(self, cv_course_id: int, cv_assignment_id: int) -> tp.Set[str]:
+        """
+        Digests of the rows in chunks whose Progress job completed.
+        """
+
+        return {
+            digest
+            for record in self._select(cv_course_id, cv_assignment_id) if record['state'] == 'completed'
+            for digest in record['rows']
+        }
+
+    def pending(self, cv_course_id: int, cv_assignment_id: int) -> tp.List[tp.Dict[str, tp.Any]]:
+        """
+        Records of the chunks that were accepted by Canvas but whose Progress job had not reached a final state yet.
+        """
+
+        return [
+            record for record in self._select(cv_course_id, cv_assignment_id)
+            if record.get('url') and record['state'] not in PROGRESS_FINAL_STATES
+        ]
+
+    def unconfirmed(self, cv_course_id: int, cv_assignment_id: int) -> tp.List[tp.Dict[str, tp.Any]]:
+        """
+        Records of the chunks that Canvas may or may not have applied: chunks that were being posted when the run
+        stopped, and chunks whose post failed with an unknown outcome (see `errors.is_ambiguous`).
+        """
+
+        return [
+            record for record in self._select(cv_course_id, cv_assignment_id)
+            if (record['state'] == 'submitting' and not record.get('url'))
+            or (record['state'] == 'failed' and record.get('unknown'))
+        ]
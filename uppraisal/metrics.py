@@ -0,0 +1,227 @@
+# -*- coding: utf-8 -*-
+
+import contextlib
+import json
+import math
+import threading
+import time
+import typing as tp
+from collections import Counter
+from collections import defaultdict
+
+Listener = tp.Callable[[tp.Dict[str, tp.Any]], None]
+
+_T = tp.TypeVar('_T')
+
+
+class Metrics(object):
+    """
+    Event emitter for instrumentation of Canvas requests and pipeline stages.
+
+    Events are dictionaries with an "event" name, a "time" stamp and event specific fields, passed to every
+    subscribed listener (e.g., a `JsonLinesSink` or a `Summary`). Without listeners, emitting and timing cost next to
+    nothing. The events emitted by uppraisal are:
+
+    - "request": one per HTTP attempt, with method, url, status, seconds, bytes_sent, rate_limit_remaining,
+      request_cost and attempt. Attempts that failed without a response have status None and the exception name as
+      error.
+    - "sleep": time spent waiting, with seconds and reason ("poll" between Progress polls, "rate_limit" in the rate
+      limiter, "retry" before retrying a failed request).
+    - "progress": one per update_grades chunk reaching a final state, with rows, state, seconds since it was posted
+      and polls.
+    - "cache": one per listing page retrieved through a page cache, with url and result ("fresh", "not_modified" or
+      "miss").
+    - "download": one per attachment downloaded, with url, bytes received, seconds and whether it was resumed.
+    - "stage": time spent in a pipeline stage, with stage ("read", "convert") and seconds, excluding the time spent in
+      nested stages.
+    """
+
+    def __init__(self):
+        self._listeners: tp.List[Listener] = []
+        self._local = threading.local()
+
+    def subscribe(self, listener: Listener) -> Listener:
+        self._listeners.append(listener)
+        return listener
+
+    @property
+    def enabled(self) -> bool:
+        return bool(self._listeners)
+
+    def emit(self, event: str, **fields: tp.Any) -> None:
+        if not self._listeners:
+            return
+        record = dict(event=event, time=time.time(), **fields)
+        for listener in self._listeners:
+            listener(record)
+
+    def _start(self) -> float:
+        frames = self._local.__dict__.setdefault('frames', [])
+        frames.append(0.0)
+        return time.perf_counter()
+
+    def _stop(self, start: float) -> float:
+        # Time spent in nested stages is attributed to those stages only
+        elapsed = time.perf_counter() - start
+        frames = self._local.frames
+        nested = frames.pop()
+        if frames:
+            frames[-1] += elapsed
+        return elapsed - nested
+
+    @contextlib.contextmanager
+    def stage(self, name: str, **fields: tp.Any) -> tp.Iterator[None]:
+        """
+        Context manager emitting the time spent in a stage.
+        """
+
+        if not self._listeners:
+            yield
+            return
+        start = self._start()
+        try:
+            yield
+        finally:
+            self.emit('stage', stage=name, seconds=self._stop(start), **fields)
+
+    def timed_iter(self, name: str, iterable: tp.Iterable[_T]) -> tp.Iterator[_T]:
+        """
+        Wrap a lazy pipeline stage, emitting the total time spent producing its items once it is exhausted or closed.
+        """
+
+        if not self._listeners:
+            return iter(iterable)
+        return self._timed_iter(name, iter(iterable))
+
+    def _timed_iter(self, name: str, iterator: tp.Iterator[_T]) -> tp.Iterator[_T]:
+        seconds = 0.0
+        try:
+            while True:
+                start = self._start()
+                try:
+                    item = next(iterator)
+                except StopIteration:
+                    return
+                finally:
+                    seconds += self._stop(start)
+                yield item
+        finally:
+            self.emit('stage', stage=name, seconds=seconds)
+
+
+class JsonLinesSink(object):
+    """
+    Listener appending every event as a line of JSON to a file.
+
+    :param filepath: Location of the metrics file.
+    :type filepath: str
+    """
+
+    def __init__(self, filepath: str):
+        self._file = open(filepath, 'a', encoding='utf-8')
+        self._lock = threading.Lock()
+
+    def __call__(self, record: tp.Dict[str, tp.Any]) -> None:
+        line = json.dumps(record, default=str) + '\n'
+        with self._lock:
+            self._file.write(line)
+
+    def close(self) -> None:
+        self._file.close()
+
+
+def percentile(values: tp.Sequence[float], fraction: float) -> tp.Optional[float]:
+    """
+    Nearest-rank percentile of sorted values, None if there are none.
+    """
+
+    if not values:
+        return None
+    return values[max(0, math.ceil(fraction * len(values)) - 1)]
+
+
+class Summary(object):
+    """
+    Listener aggregating events into an end-of-run summary, see `report` and `format`.
+    """
+
+    def __init__(self):
+        self.latencies: tp.List[float] = []
+        self.statuses: tp.Counter[tp.Union[int, str]] = Counter()
+        self.bytes_sent = 0
+        self.min_rate_limit_remaining: tp.Optional[float] = None
+        self.progress_waits: tp.List[float] = []
+        self.cache: tp.Counter[str] = Counter()
+        self.downloads = 0
+        self.bytes_received = 0
+        self.seconds: tp.DefaultDict[str, float] = defaultdict(float)
+        self._first: tp.Optional[float] = None
+        self._last: tp.Optional[float] = None
+        self._lock = threading.Lock()
+
+    def __call__(self, record: tp.Dict[str, tp.Any]) -> None:
+        with self._lock:
+            event = record['event']
+            if event == 'request':
+                self.latencies.append(record['seconds'])
+                self.statuses[record['status'] or record.get('error', 'error')] += 1
+                self.bytes_sent += record['bytes_sent']
+                self.seconds['request'] += record['seconds']
+                remaining = record['rate_limit_remaining']
+                if remaining is not None:
+                    self.min_rate_limit_remaining = remaining if self.min_rate_limit_remaining is None else min(
+                        remaining, self.min_rate_limit_remaining)
+                start = record['time'] - record['seconds']
+                self._first = start if self._first is None else min(self._first, start)
+                self._last = record['time'] if self._last is None else max(self._last, record['time'])
+            elif event == 'sleep':
+                self.seconds['sleep:' + record['reason']] += record['seconds']
+            elif event == 'progress':
+                self.progress_waits.append(record['seconds'])
+            elif event == 'cache':
+                self.cache[record['result']] += 1
+            elif event == 'download':
+                self.downloads += 1
+                self.bytes_received += record['bytes']
+            elif event == 'stage':
+                self.seconds[record['stage']] += record['seconds']
+
+    def report(self) -> tp.Dict[str, tp.Any]:
+        with self._lock:
+            latencies = sorted(self.latencies)
+            progress_waits = sorted(self.progress_waits)
+            span = (self._last - self._first) if latencies else 0.0
+            return {
+                'requests': len(latencies),
+                'statuses': dict(self.statuses),
+                'bytes_sent': self.bytes_sent,
+                'latency_p50': percentile(latencies, .5),
+                'latency_p95': percentile(latencies, .95),
+                'requests_per_second': len(latencies) / span if span > 0 else None,
+                'min_rate_limit_remaining': self.min_rate_limit_remaining,
+                'progress_wait_p50': percentile(progress_waits, .5),
+                'progress_wait_p95': percentile(progress_waits, .95),
+                'cache': dict(self.cache),
+                'downloads': self.downloads,
+                'bytes_received': self.bytes_received,
+                'seconds': dict(self.seconds),
+            }
+
+    def format(self) -> str:
+        report = self.report()
+
+        def fmt(value: tp.Optional[float], unit: str = 's') -> str:
+            return '-' if value is None else f'{value:.3f}{unit}'
+
+        statuses = ', '.join(f'{n}x {status}' for status, n in sorted(report['statuses'].items(), key=str))
+        lines = [
+            f"{report['requests']} requests ({statuses}), "
+            f"{report['bytes_sent']} bytes sent, {fmt(report['requests_per_second'], '/s')}",
+            f"latency p50 {fmt(report['latency_p50'])}, p95 {fmt(report['latency_p95'])}",
+            f"progress wait p50 {fmt(report['progress_wait_p50'])}, p95 {fmt(report['progress_wait_p95'])}",
+            f"lowest rate limit remaining {fmt(report['min_rate_limit_remaining'], '')}",
+            f"{report['downloads']} attachments downloaded, {report['bytes_received']} bytes received",
+            "cached pages: " + (', '.join(f'{n}x {result}' for result, n in sorted(report['cache'].items())) or '-'),
+            "time by stage: " + ', '.join(f'{stage} {seconds:.3f}s' for stage, seconds in report['seconds'].items()),
+        ]
+        return '\n'.join(lines)
@@ -0,0 +1,225 @@
+# -*- coding: utf-8 -*-
+
+import csv
+import json
+import os
+import typing as tp
+
+from .constants import *
+from .helpers import iter_excel
+
+Reader = tp.Callable[..., tp.Iterator[tp.List[tp.Any]]]
+
+
+def _fold(fieldname: tp.Any, case_sensitive: bool = False) -> str:
+    fieldname = '' if fieldname is None else str(fieldname)
+    return (fieldname.lower() if not case_sensitive else fieldname).strip()
+
+
+def _check_missing(include_fieldnames: tp.Sequence[str], found: tp.Sequence[bool]) -> None:
+    missing = [field for field, is_found in zip(include_fieldnames, found) if not is_found]
+    if missing:
+        raise IOError(f"The following fieldnames could not be found: {', '.join(missing)}")
+
+
+def header_columns(
+        fieldnames: tp.Sequence[tp.Any],
+        include_fieldnames: tp.Sequence[str],
+        case_sensitive: bool = False,
+        ignore_missing_headers: bool = False
+) -> tp.List[tp.Optional[int]]:
+    """
+    Position of every included field in a header row, None for fields that are missing.
+
+    :param fieldnames: The header row.
+    :type fieldnames: list
+    :param include_fieldnames: The fields to return, in order.
+    :type include_fieldnames: list
+    :param case_sensitive: Boolean indicating whether fieldnames should be sensitive to capitalization
+    :type case_sensitive: bool
+    :param ignore_missing_headers: Boolean indicating whether missing fields should be ignored (True) or not (False)
+    :type ignore_missing_headers: bool
+    :return: List of column indexes
+    :rtype: list
+    """
+
+    positions = {_fold(fieldname, case_sensitive): col for col, fieldname in enumerate(fieldnames)}
+    columns = [positions.get(_fold(field, case_sensitive)) for field in include_fieldnames]
+    if ignore_missing_headers is False:
+        _check_missing(include_fieldnames, [col is not None for col in columns])
+    return columns
+
+
+def iter_csv(
+        in_filepath: str,
+        include_fieldnames: tp.Sequence[str],
+        case_sensitive: bool = False,
+        ignore_missing_headers: bool = False
+) -> tp.Iterator[tp.List[tp.Any]]:
+    """
+    Generator reading the included fields from a CSV file with a header row. The delimiter is detected from the
+    header row; all values are returned as strings, with empty values as None.
+    """
+
+    with open(in_filepath, newline='', encoding='utf-8-sig') as f:
+        try:
+            dialect = csv.Sniffer().sniff(f.readline(), delimiters=',;\t')
+        except csv.Error:
+            dialect = csv.excel
+        f.seek(0)
+        reader = csv.reader(f, dialect)
+        columns = header_columns(next(reader, []), include_fieldnames, case_sensitive, ignore_missing_headers)
+        for row in reader:
+            if not row:
+                continue
+            width = len(row)
+            yield [(row[col] or None) if col is not None and col < width else None for col in columns]
+
+
+def iter_jsonl(
+        in_filepath: str,
+        include_fieldnames: tp.Sequence[str],
+        case_sensitive: bool = False,
+        ignore_missing_headers: bool = False
+) -> tp.Iterator[tp.List[tp.Any]]:
+    """
+    Generator reading the included fields from a JSON Lines file with one object per line.
+
+    Fields are looked up in every object by themselves, as objects may leave out keys, e.g. the comment of a student
+    without one; a missing key reads as None. A field that is missing from all objects is reported once the whole
+    file has been read, unless `ignore_missing_headers` is True.
+    """
+
+    fields = [_fold(field, case_sensitive) for field in include_fieldnames]
+    found = [False] * len(fields)
+    with open(in_filepath, encoding='utf-8') as f:
+        for line in f:
+            if not line.strip():
+                continue
+            record = {_fold(key, case_sensitive): value for key, value in json.loads(line).items()}
+            row = []
+            for index, field in enumerate(fields):
+                if field in record:
+                    found[index] = True
+                row.append(record.get(field))
+            yield row
+    if ignore_missing_headers is False:
+        _check_missing(include_fieldnames, found)
+
+
+def iter_parquet(
+        in_filepath: str,
+        include_fieldnames: tp.Sequence[str],
+        case_sensitive: bool = False,
+        ignore_missing_headers: bool = False
+) -> tp.Iterator[tp.List[tp.Any]]:
+    """
+    Generator reading the included fields from a Parquet file, one record batch at a time. Requires `pyarrow`.
+    """
+
+    try:
+        import pyarrow.parquet as pq
+    except ImportError:
+        raise ImportError("Reading Parquet files requires pyarrow, install it with \"pip install pyarrow\".")
+
+    parquet_file = pq.ParquetFile(in_filepath)
+    names = parquet_file.schema_arrow.names
+    columns = header_columns(names, include_fieldnames, case_sensitive, ignore_missing_headers)
+    selected = [names[col] for col in columns if col is not None]
+    for batch in parquet_file.iter_batches(columns=selected):
+        values = dict(zip(selected, (column.to_pylist() for column in batch.columns)))
+        empty = [None] * batch.num_rows
+        yield from (list(row) for row in zip(*(
+            values[names[col]] if col is not None else empty for col in columns
+        )))
+
+
+def iter_workbook(
+        in_filepath: tp.Union[str, 'openpyxl.Workbook'],
+        include_fieldnames: tp.Sequence[str],
+        case_sensitive: bool = False,
+        ignore_missing_headers: bool = False,
+        worksheet: tp.Union[str, int] = DEFAULT_WORKBOOK_TAB
+) -> tp.Iterator[tp.List[tp.Any]]:
+    """
+    Generator reading the included fields from a worksheet of an Excel workbook, see `helpers.iter_excel`.
+    """
+
+    return iter_excel(
+        in_filepath,
+        worksheet,
+        include_fieldnames=include_fieldnames,
+        return_headers=False,
+        case_sensitive=case_sensitive,
+        ignore_missing_headers=ignore_missing_headers
+    )
+
+
+READERS: tp.Dict[str, Reader] = {
+    'xlsx': iter_workbook,
+    'csv': iter_csv,
+    'jsonl': iter_jsonl,
+    'parquet': iter_parquet,
+}
+
+EXTENSIONS: tp.Dict[str, str] = {
+    '.xlsx': 'xlsx',
+    '.xlsm': 'xlsx',
+    '.csv': 'csv',
+    '.tsv': 'csv',
+    '.jsonl': 'jsonl',
+    '.ndjson': 'jsonl',
+    '.parquet': 'parquet',
+    '.pq': 'parquet',
+}
+
+
+def detect_format(in_filepath: str) -> str:
+    """
+    Input format of a file, based on its extension.
+
+    :Examples:
+    >>> detect_format('grades.ndjson')
+    'jsonl'
+    """
+
+    extension = os.path.splitext(in_filepath)[1].lower()
+    if extension not in EXTENSIONS:
+        raise IOError(f"Cannot detect the format of {in_filepath}, specify one of: {', '.join(READERS)}")
+    return EXTENSIONS[extension]
+
+
+def iter_rows(
+        in_filepath: str,
+        include_fieldnames: tp.Sequence[str],
+        worksheet: tp.Union[str, int] = DEFAULT_WORKBOOK_TAB,
+        input_format: tp.Optional[str] = None,
+        case_sensitive: bool = False,
+        ignore_missing_headers: bool = False
+) -> tp.Iterator[tp.List[tp.Any]]:
+    """
+    Generator reading the included fields from a file in any supported format, one row at a time.
+
+    :param in_filepath: File path to an Excel workbook, CSV file, JSON Lines file or Parquet file.
+    :type in_filepath: str
+    :param include_fieldnames: List of fieldnames that should be returned, in order.
+    :type include_fieldnames: list
+    :param worksheet: The name or index number of the worksheet, for Excel workbooks.
+    :type worksheet: str or int
+    :param input_format: One of the keys of `READERS`. Default is to detect the format from the file extension.
+    :type input_format: str or None
+    :param case_sensitive: Boolean indicating whether include_fieldnames should be sensitive to capitalization
+    :type case_sensitive: bool
+    :param ignore_missing_headers: Boolean indicating whether missing fields should be ignored (True) or not (False)
+    :type ignore_missing_headers: bool
+    :return: An iterator over lists containing the included fields of every row.
+    :rtype: iterator
+    """
+
+    input_format = input_format or detect_format(in_filepath)
+    if input_format not in READERS:
+        raise IOError(f"Unknown input format {input_format}, specify one of: {', '.join(READERS)}")
+
+    if input_format == 'xlsx':
+        return iter_workbook(in_filepath, include_fieldnames, case_sensitive, ignore_missing_headers, worksheet)
+    return READERS[input_format](in_filepath, include_fieldnames, case_sensitive, ignore_missing_headers)
@@ -0,0 +1,92 @@
+# -*- coding: utf-8 -*-
+
+import typing as tp
+from array import array
+
+
+class GradeRecord(tp.NamedTuple):
+    """
+    Grade and submission comment of one student, as uploaded to Canvas.
+
+    Records unpack like the rows they are built from, so `user_id, grade, comment = record` works, and
+    `journal.row_digest` of a record equals that of the same row as a list.
+    """
+
+    user_id: int
+    grade: tp.Any
+    comment: tp.Optional[str]
+
+
+def parse_user_id(value: tp.Any) -> tp.Optional[int]:
+    """
+    Canvas user id of a cell, None if it is not an integer.
+
+    Whole floats, as spreadsheets store numbers, and integer text are accepted. Fractional floats and booleans are
+    not, rather than being truncated to the id of another student.
+
+    :Examples:
+    >>> parse_user_id(42.0)
+    42
+    >>> parse_user_id(2.5) is None
+    True
+    """
+
+    if isinstance(value, bool):
+        return None
+    if isinstance(value, float):
+        return int(value) if value.is_integer() else None
+    try:
+        return int(value)
+    except (TypeError, ValueError):
+        return None
+
+
+class GradeBatch(object):
+    """
+    Columnar container of grade records.
+
+    User ids are stored in an array of 64-bit integers and grades and comments in parallel lists, in which equal
+    strings are stored once. Comments built from the same template and grades such as "8" therefore cost a pointer per
+    row instead of a string per row. Records are built on the fly when the batch is iterated or indexed; the columns
+    can be used directly to check or compare all rows at once.
+
+    :param records: Records to add to the batch.
+    :type records: iterable or None
+    """
+
+    __slots__ = ('user_ids', 'grades', 'comments', '_strings')
+
+    def __init__(self, records: tp.Optional[tp.Iterable[tp.Sequence[tp.Any]]] = None):
+        self.user_ids = array('q')
+        self.grades: tp.List[tp.Any] = []
+        self.comments: tp.List[tp.Optional[str]] = []
+        self._strings: tp.Dict[str, str] = {}
+        if records is not None:
+            self.extend(records)
+
+    def _intern(self, value: tp.Any) -> tp.Any:
+        if isinstance(value, str):
+            return self._strings.setdefault(value, value)
+        return value
+
+    def append(self, record: tp.Sequence[tp.Any]) -> None:
+        user_id, grade, comment = record
+        self.user_ids.append(user_id)
+        self.grades.append(self._intern(grade))
+        self.comments.append(self._intern(comment))
+
+    def extend(self, records: tp.Iterable[tp.Sequence[tp.Any]]) -> None:
+        for record in records:
+            self.append(record)
+
+    def __len__(self) -> int:
+        return len(self.user_ids)
+
+    def __getitem__(self, index: int) -> GradeRecord:
+        return GradeRecord(self.user_ids[index], self.grades[index], self.comments[index])
+
+    def __iter__(self) -> tp.Iterator[GradeRecord]:
+        return map(GradeRecord, self.user_ids, self.grades, self.comments)
+
+    def __repr__(self) -> str:
+        return f'GradeBatch({len(self)} records, {len(self._strings)} distinct strings)'
@@ -0,0 +1,276 @@
+# -*- coding: utf-8 -*-
+
+import random
+import threading
+import time
+import typing as tp
+
+import requests
+
+from .constants import *
+from .errors import is_unsent
+from .metrics import Metrics
+
+
+class RateLimiter(object):
+    """
+    Request scheduler that follows the Canvas rate limit headers.
+
+    Canvas reports the remaining capacity of the throttling bucket of an access token in the
+    `X-Rate-Limit-Remaining` header and the cost of the request in `X-Request-Cost`. As long as more than `headroom`
+    units remain, requests are sent without delay. Below that, requests are spaced out by `max_delay` divided by the
+    number of requests of the last reported cost that the remaining capacity still affords, so that expensive
+    requests slow down sooner than cheap ones and the delay reaches `max_delay` as the bucket runs empty. Until a cost
+    is reported, the delay grows linearly to `max_delay` instead. The limiter is thread safe, so one instance can be
+    shared by concurrent uploads.
+
+    :param headroom: Remaining capacity below which requests are slowed down.
+    :type headroom: float
+    :param max_delay: Delay in seconds between requests when the bucket is empty.
+    :type max_delay: float
+    :param retry_wait: Initial wait in seconds after Canvas refused a request because of the rate limit.
+    :type retry_wait: float
+    :param max_retries: Number of times a refused request is retried before the response is returned.
+    :type max_retries: int
+    """
+
+    def __init__(
+            self,
+            headroom: float = RATE_LIMIT_HEADROOM,
+            max_delay: float = RATE_LIMIT_MAX_DELAY,
+            retry_wait: float = RATE_LIMIT_RETRY_WAIT,
+            max_retries: int = RATE_LIMIT_MAX_RETRIES
+    ):
+        self.headroom = headroom
+        self.max_delay = max_delay
+        self.retry_wait = retry_wait
+        self.max_retries = max_retries
+        self.remaining: tp.Optional[float] = None
+        self.cost: tp.Optional[float] = None
+        self._next_start = 0.0
+        self._lock = threading.Lock()
+
+    def delay(self) -> float:
+        """
+        Delay in seconds between subsequent requests given the last known remaining capacity.
+        """
+
+        if self.remaining is None or self.remaining >= self.headroom:
+            return 0.0
+        remaining = max(self.remaining, 0.0)
+        if not self.cost:
+            return self.max_delay * (1.0 - remaining / self.headroom)
+        return self.max_delay / max(remaining / self.cost, 1.0)
+
+    def wait(self) -> float:
+        """
+        Block until the next request may be sent, returning the seconds waited.
+        """
+
+        with self._lock:
+            now = time.monotonic()
+            start = max(now, self._next_start)
+            self._next_start = start + self.delay()
+        if start > now:
+            time.sleep(start - now)
+        return start - now
+
+    def update(self, response: requests.Response) -> None:
+        """
+        Record the rate limit headers of a response.
+        """
+
+        remaining = response.headers.get('X-Rate-Limit-Remaining')
+        cost = response.headers.get('X-Request-Cost')
+        with self._lock:
+            if remaining is not None:
+                self.remaining = float(remaining)
+            if cost is not None:
+                self.cost = float(cost)
+
+    def penalize(self, attempt: int) -> float:
+        """
+        Wait after a refused request, doubling the wait for every subsequent attempt. Returns the seconds waited.
+        """
+
+        wait = self.retry_wait * 2 ** attempt
+        with self._lock:
+            self.remaining = 0.0
+            self._next_start = max(self._next_start, time.monotonic() + wait)
+        time.sleep(wait)
+        return wait
+
+
+def is_rate_limited(response: requests.Response) -> bool:
+    """
+    Check whether Canvas refused a request because the rate limit was exceeded.
+    """
+
+    return response.status_code == 429 or (
+            response.status_code == 403 and 'rate limit exceeded' in response.text.lower())
+
+
+default_rate_limiter = RateLimiter()
+
+
+class BandwidthLimiter(object):
+    """
+    Token bucket limiting the bytes per second transferred by all threads that share it.
+
+    Transfers may run ahead of the limit by up to `burst` bytes; beyond that, `consume` blocks until the average rate
+    is back at `bytes_per_second`.
+
+    :param bytes_per_second: Maximum average number of bytes per second.
+    :type bytes_per_second: float
+    :param burst: Number of bytes that may be transferred without waiting. Default is one second's worth.
+    :type burst: float or None
+    """
+
+    def __init__(self, bytes_per_second: float, burst: tp.Optional[float] = None):
+        if bytes_per_second <= 0:
+            raise ValueError(f'bytes_per_second should be positive, got {bytes_per_second}')
+        self.bytes_per_second = bytes_per_second
+        self.burst = burst or bytes_per_second
+        self._available = self.burst
+        self._time = time.monotonic()
+        self._lock = threading.Lock()
+
+    def consume(self, n_bytes: int) -> float:
+        """
+        Account for `n_bytes` transferred, blocking while the limit is exceeded. Returns the seconds waited.
+        """
+
+        with self._lock:
+            now = time.monotonic()
+            self._available = min(self.burst, self._available + (now - self._time) * self.bytes_per_second)
+            self._time = now
+            self._available -= n_bytes
+            wait = -self._available / self.bytes_per_second if self._available < 0 else 0.0
+        if wait:
+            time.sleep(wait)
+        return wait
+
+
+def backoff(retry: int) -> float:
+    """
+    Wait in seconds before the given retry of a failed request: exponential backoff with full jitter, so that clients
+    that failed at the same moment do not retry at the same moment.
+    """
+
+    return random.uniform(0.0, min(RETRY_BACKOFF_MAX, RETRY_BACKOFF * 2 ** retry))
+
+
+def retry_after(response: requests.Response) -> float:
+    """
+    Seconds to wait according to the `Retry-After` header of a response, 0 if absent or not a number of seconds.
+    """
+
+    try:
+        return max(0.0, float(response.headers.get('Retry-After', 0)))
+    except ValueError:
+        return 0.0
+
+
+def request(
+        method: str,
+        url: str,
+        rate_limiter: tp.Optional[RateLimiter] = None,
+        session: tp.Optional[requests.Session] = None,
+        metrics: tp.Optional[Metrics] = None,
+        idempotent: tp.Optional[bool] = None,
+        **kwargs: tp.Any
+) -> requests.Response:
+    """
+    Send a request through a rate limiter, retrying requests that failed in a way that is safe to retry.
+
+    Requests time out after `CONNECT_TIMEOUT` seconds connecting and `READ_TIMEOUT` seconds waiting for data, unless
+    a `timeout` is given. Requests that Canvas refused because of the rate limit are retried after the rate limiter's
+    penalty, and requests that were never sent because the connection failed (see `errors.is_unsent`) are retried
+    with `backoff`; Canvas did not process either. Server errors (`RETRY_STATUSES`), read timeouts and broken
+    connections leave the outcome unknown, so they are only retried for idempotent requests, at most
+    `RETRY_MAX_ATTEMPTS` times.
+
+    :param method: HTTP method, e.g. "GET".
+    :type method: str
+    :param url: The URL to send the request to.
+    :type url: str
+    :param rate_limiter: Rate limiter to schedule the request with. Default is the limiter shared by all calls.
+    :type rate_limiter: RateLimiter or None
+    :param session: Session to send the request with. Default is a new connection per request.
+    :type session: requests.Session or None
+    :param metrics: Metrics to emit a "request" event for every attempt and a "sleep" event for every wait to.
+    :type metrics: Metrics or None
+    :param idempotent: Boolean indicating whether sending the request twice has the same effect as sending it once.
+    Default is True for the `IDEMPOTENT_METHODS`. Note that a PUT with a submission comment is not idempotent, as
+    every request adds the comment again.
+    :type idempotent: bool or None
+    :param kwargs: Keyword arguments passed on to `requests.request`.
+    :return: The response of the last attempt
+    :rtype: requests.Response
+    """
+
+    rate_limiter = rate_limiter or default_rate_limiter
+    sender = session or requests
+    kwargs.setdefault('timeout', (CONNECT_TIMEOUT, READ_TIMEOUT))
+    if idempotent is None:
+        idempotent = method.upper() in IDEMPOTENT_METHODS
+    emit = metrics is not None and metrics.enabled
+    attempt = 0
+    retry = 0
+    while True:
+        waited = rate_limiter.wait()
+        if emit and waited:
+            metrics.emit('sleep', reason='rate_limit', seconds=waited)
+        start = time.perf_counter()
+        try:
+            response = sender.request(method, url, **kwargs)
+        except (requests.ConnectionError, requests.Timeout) as e:
+            if emit:
+                body = e.request.body if e.request is not None else None
+                metrics.emit(
+                    'request',
+                    method=method,
+                    url=url,
+                    status=None,
+                    error=type(e).__name__,
+                    seconds=time.perf_counter() - start,
+                    bytes_sent=len(body or b''),
+                    rate_limit_remaining=rate_limiter.remaining,
+                    request_cost=rate_limiter.cost,
+                    attempt=attempt + retry
+                )
+            if retry >= RETRY_MAX_ATTEMPTS or not (idempotent or is_unsent(e)):
+                raise
+            wait = backoff(retry)
+        else:
+            seconds = time.perf_counter() - start
+            rate_limiter.update(response)
+            if emit:
+                body = response.request.body if response.request is not None else None
+                metrics.emit(
+                    'request',
+                    method=method,
+                    url=url,
+                    status=response.status_code,
+                    seconds=seconds,
+                    bytes_sent=len(body or b''),
+                    rate_limit_remaining=rate_limiter.remaining,
+                    request_cost=rate_limiter.cost,
+                    attempt=attempt + retry
+                )
+            if is_rate_limited(response):
+                if attempt >= rate_limiter.max_retries:
+                    return response
+                waited = rate_limiter.penalize(attempt)
+                if emit:
+                    metrics.emit('sleep', reason='rate_limit', seconds=waited)
+                attempt += 1
+                continue
+            if response.status_code not in RETRY_STATUSES or not idempotent or retry >= RETRY_MAX_ATTEMPTS:
+                return response
+            wait = max(backoff(retry), retry_after(response))
+
+        time.sleep(wait)
+        if emit:
+            metrics.emit('sleep', reason='retry', seconds=wait)
+        retry += 1
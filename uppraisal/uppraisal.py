@@ -3,31 +3,469 @@
 import json
 import time
 import typing as tp
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial
 
 import requests
-from bs4 import BeautifulSoup
-from tqdm import tqdm
 
 from .constants import *
-from .helpers import chunker
-from .helpers import get_excel
+from .chunking import ChunkSizer
+from .client import CanvasClient
+from .client import ensure_client
+from .comments import convert_records
+from .diff import SubmissionState
+from .diff import changed_rows
+from .diff import fetch_submission_state
+from .diff import format_summary
+from .diff import same_grade
+from .encoding import EncodedChunk
+from .encoding import normalize_grade
+from .errors import CanvasError
+from .errors import check_response
+from .errors import is_ambiguous
+from .journal import Journal
+from .journal import chunk_digest
+from .journal import journal_filepath
+from .journal import row_digest
+from .readers import iter_rows
+from .records import GradeBatch
+from .records import GradeRecord
+from .records import parse_user_id
+from .validate import Roster
+from .validate import ValidationError
+from .validate import cached_roster
+from .validate import format_issues
+from .validate import has_errors
+from .validate import validate_rows
+
+
+def coerce_user_ids(rows: tp.Iterable[tp.Sequence[tp.Any]]) -> tp.Iterator[GradeRecord]:
+    """
+    Pipeline stage turning every row read from the file into a grade record, casting the Canvas user id to int.
+
+    A user id that is not an integer (see `records.parse_user_id`) raises a ValueError.
+    """
+
+    for user_id, grade, submission_comment in rows:
+        cv_user_id = parse_user_id(user_id)
+        if cv_user_id is None:
+            raise ValueError(f'user id {user_id!r} is not an integer')
+        yield GradeRecord(cv_user_id, grade, submission_comment)
+
+
+def format_grades(
+        records: tp.Iterable[GradeRecord],
+        decimals: int = GRADE_DECIMALS,
+        blank: str = DEFAULT_BLANK_GRADES
+) -> tp.Iterator[GradeRecord]:
+    """
+    Pipeline stage formatting the grade of every record as the string posted to Canvas, see
+    `encoding.normalize_grade`.
+    """
+
+    for user_id, grade, submission_comment in records:
+        yield GradeRecord(user_id, normalize_grade(grade, decimals, blank), submission_comment)
+
+
+def convert_comments(
+        records: tp.Iterable[GradeRecord],
+        html_format: bool = DEFAULT_HTML_FORMAT,
+        processes: tp.Optional[int] = None
+) -> tp.Iterator[GradeRecord]:
+    """
+    Pipeline stage converting the submission comment of every record from HTML to plain text. Records are passed on
+    unchanged if `html_format` is False, see `comments.convert_records` otherwise.
+    """
+
+    if not html_format:
+        return iter(records)
+    return convert_records(records, processes)
+
+
+def submit_grades(
+        client: CanvasClient,
+        url: str,
+        chunk: EncodedChunk
+) -> tp.Dict[str, tp.Any]:
+    """
+    Post a single chunk of grades and comments to the Canvas update_grades endpoint.
+
+    :param client: Client to send the request with.
+    :type client: CanvasClient
+    :param url: The update_grades URL of the assignment.
+    :type url: str
+    :param chunk: The chunk with its encoded request body, see `encoding.encode_chunk`.
+    :type chunk: EncodedChunk
+    :return: The Progress object returned by Canvas
+    :rtype: dict
+    """
+
+    response = check_response(client.post(url, data=chunk.body), url)
+    return json.loads(response.text)
+
+
+def poll_progress(
+        client: CanvasClient,
+        in_flight: tp.Dict[int, str],
+        errors: tp.Optional[tp.Dict[int, Exception]] = None
+) -> tp.Dict[int, tp.Dict[str, tp.Any]]:
+    """
+    Check the state of every outstanding Progress job once.
+
+    :param client: Client to send the requests with.
+    :type client: CanvasClient
+    :param in_flight: Mapping of chunk number to the URL of its Progress object.
+    :type in_flight: dict
+    :param errors: Mapping to record the error of every job that could not be checked in. Default is to raise the
+    first error.
+    :type errors: dict or None
+    :return: Mapping of chunk number to Progress object for the jobs that reached a final state
+    :rtype: dict
+    """
+
+    finished = {}
+    for chunk_nr, url in in_flight.items():
+        try:
+            response = check_response(client.get(url), url)
+        except (CanvasError, requests.RequestException) as e:
+            if errors is None:
+                raise
+            errors[chunk_nr] = e
+            continue
+
+        progress = json.loads(response.text)
+        if progress['workflow_state'] in PROGRESS_FINAL_STATES:
+            finished[chunk_nr] = progress
+
+    return finished
+
+
+def upload_rows(
+        client: CanvasClient,
+        cv_course_id: int,
+        cv_assignment_id: int,
+        rows: tp.Iterable[GradeRecord],
+        max_in_flight: int = DEFAULT_MAX_IN_FLIGHT,
+        journal: tp.Optional[Journal] = None,
+        resume: bool = False,
+        chunk_sizer: tp.Optional[ChunkSizer] = None,
+        verify: bool = True,
+        poll_interval: float = POLL_INTERVAL_MIN
+) -> tp.List[tp.Dict[str, tp.Any]]:
+    """
+    Upload prepared rows to the Canvas update_grades endpoint, one chunk per Progress job.
+
+    Rows are consumed lazily: a chunk is only taken from `rows` when fewer than `max_in_flight` Progress jobs are
+    outstanding. All outstanding jobs are polled together, starting at `poll_interval` seconds and backing off to
+    `POLL_INTERVAL_MAX` seconds while none of them finishes. Chunks are sized by `chunk_sizer`, which is told how
+    long every Progress job took and whether it failed. The request body of every chunk is encoded once, when the chunk
+    is built (see `encoding.encode_chunk`), and its hash is recorded in the journal as "body".
+
+    Every chunk is recorded in the `journal`, if given. With `resume`, rows of chunks that the journal shows as
+    completed are skipped, and Progress jobs that were still running when the journal was last written are polled
+    again instead of being uploaded twice. Rows of chunks that Canvas may have applied without the journal knowing
+    (see `journal.Journal.unconfirmed`) are compared with the submissions in Canvas first, like `recover_chunks`
+    does, and only posted again if Canvas did not apply them.
+
+    A chunk that cannot be uploaded does not stop the upload: it is reported as failed, with the error as "message".
+    Posting a chunk is not retried blindly, as every post adds its comments again. Instead, with `verify`, the chunks
+    whose outcome is unknown (a server error or broken connection after posting, or a Progress job that could not be
+    checked in `POLL_MAX_ERRORS` times in a row) are compared with the submissions in Canvas once all other jobs
+    finished, and only their rows that were not applied are posted again. See `format_failures` for a report.
+
+    :param client: Client to send the requests with.
+    :type client: CanvasClient
+    :param cv_course_id: Course identifier (see Canvas course URL).
+    :type cv_course_id: int
+    :param cv_assignment_id: Assignment identifier (see Canvas assignment URL).
+    :type cv_assignment_id: int
+    :param rows: Iterable of grade records with the formatted grade and plain text submission comment.
+    :type rows: iterable
+    :param max_in_flight: Maximum number of chunks whose Progress job has not reached a final state yet.
+    :type max_in_flight: int
+    :param journal: Journal to record the state of every chunk in.
+    :type journal: Journal or None
+    :param resume: Boolean indicating whether to continue from the state recorded in the journal.
+    :type resume: bool
+    :param chunk_sizer: Chunking policy. Default is a new `ChunkSizer` with the default bounds.
+    :type chunk_sizer: ChunkSizer or None
+    :param verify: Boolean indicating whether chunks with an unknown outcome are checked and posted again if needed.
+    :type verify: bool
+    :param poll_interval: Seconds between polls of the Progress jobs while they are finishing.
+    :type poll_interval: float
+    :return: List with the final Progress object (state "completed" or "failed") of every chunk, in chunk order, with
+    the user ids of the chunk under "user_ids"
+    :rtype: list
+    """
+
+    if max_in_flight < 1:
+        raise ValueError(f'max_in_flight should be at least 1, got {max_in_flight}')
+
+    url = client.url(CANVAS_UPDATE_GRADES_PATH, cid=cv_course_id, aid=cv_assignment_id)
+    chunk_sizer = chunk_sizer or ChunkSizer()
+    chunks = chunk_sizer.chunks(rows)
+    responses: tp.List[tp.Dict[str, tp.Any]] = []
+    in_flight: tp.Dict[int, str] = {}
+    digests: tp.Dict[int, str] = {}
+    submitted: tp.Dict[int, float] = {}
+    sizes: tp.Dict[int, int] = {}
+    polls: tp.Counter[int] = Counter()
+    poll_errors: tp.Counter[int] = Counter()
+    chunk_rows: tp.Dict[int, tp.Sequence[GradeRecord]] = {}
+    user_ids: tp.Dict[int, tp.List[int]] = {}
+    unknown: tp.Dict[int, tp.Sequence[GradeRecord]] = {}
+    if journal is not None and resume:
+        skip = journal.completed_rows(cv_course_id, cv_assignment_id)
+        for record in journal.pending(cv_course_id, cv_assignment_id):
+            in_flight[len(responses)] = record['url']
+            digests[len(responses)] = record['chunk']
+            submitted[len(responses)] = time.perf_counter()
+            responses.append({'url': record['url'], 'workflow_state': record['state']})
+            skip.update(record['rows'])
+        outstanding = {
+            record['chunk']: set(record['rows']) - skip
+            for record in journal.unconfirmed(cv_course_id, cv_assignment_id)
+        }
+        unconfirmed = {digest: chunk for chunk, chunk_digests in outstanding.items() for digest in chunk_digests}
+        # Canvas may have applied these rows before the run stopped, posting them again would add their comments twice
+        state = fetch_submission_state(client, cv_course_id, cv_assignment_id) if unconfirmed else {}
+
+        def remaining_rows() -> tp.Iterator[GradeRecord]:
+            for row in rows:
+                digest = row_digest(cv_course_id, cv_assignment_id, row)
+                if digest in skip:
+                    continue
+                if digest in unconfirmed and next(changed_rows([row], state), None) is None:
+                    chunk = unconfirmed[digest]
+                    outstanding[chunk].discard(digest)
+                    if not outstanding[chunk]:
+                        journal.record(chunk, state='completed')
+                    continue
+                yield row
+
+        chunks = chunk_sizer.chunks(remaining_rows())
+
+    interval = poll_interval
+    exhausted = False
+    from tqdm import tqdm
+
+    with tqdm(unit='chunk') as progress_bar:
+        while True:
+            while not exhausted and len(in_flight) < max_in_flight:
+                chunk = next(chunks, None)
+                if chunk is None:
+                    exhausted = True
+                    break
+                data_chunk = chunk.records
+                if journal is not None:
+                    row_digests = [row_digest(cv_course_id, cv_assignment_id, row) for row in data_chunk]
+                    digests[len(responses)] = chunk_digest(row_digests)
+                    journal.record(
+                        digests[len(responses)],
+                        course=cv_course_id,
+                        assignment=cv_assignment_id,
+                        rows=row_digests,
+                        body=chunk.digest,
+                        url=None,
+                        state='submitting'
+                    )
+                chunk_rows[len(responses)] = data_chunk
+                user_ids[len(responses)] = [record.user_id for record in data_chunk]
+                try:
+                    body = submit_grades(client, url, chunk)
+                except (CanvasError, requests.RequestException, ValueError) as e:
+                    ambiguous = is_ambiguous(e)
+                    if ambiguous:
+                        unknown[len(responses)] = chunk_rows.pop(len(responses))
+                    else:
+                        del chunk_rows[len(responses)]
+                    if journal is not None:
+                        journal.record(digests[len(responses)], state='failed', error=str(e), unknown=ambiguous)
+                    chunk_sizer.observe(len(data_chunk), 0.0, 'failed')
+                    responses.append({'url': None, 'workflow_state': 'failed', 'message': str(e)})
+                    progress_bar.update(1)
+                    continue
+                if journal is not None:
+                    journal.record(digests[len(responses)], url=body['url'], state=body['workflow_state'])
+                in_flight[len(responses)] = body['url']
+                submitted[len(responses)] = time.perf_counter()
+                sizes[len(responses)] = len(data_chunk)
+                responses.append(body)
+
+            if not in_flight:
+                break
+
+            time.sleep(interval)
+            client.metrics.emit('sleep', seconds=interval, reason='poll')
+            polls.update(in_flight.keys())
+            errors: tp.Dict[int, Exception] = {}
+            finished = poll_progress(client, in_flight, errors)
+            for chunk_nr, error in errors.items():
+                poll_errors[chunk_nr] += 1
+                if poll_errors[chunk_nr] >= POLL_MAX_ERRORS:
+                    # Give up on the job, its state in the journal stays as it was so that a resumed run polls it again
+                    responses[chunk_nr] = {
+                        'url': in_flight.pop(chunk_nr),
+                        'workflow_state': 'failed',
+                        'message': f'Could not check the Progress job: {error}'
+                    }
+                    if chunk_nr in chunk_rows:
+                        unknown[chunk_nr] = chunk_rows.pop(chunk_nr)
+                    progress_bar.update(1)
+            for chunk_nr, progress in finished.items():
+                del in_flight[chunk_nr]
+                del poll_errors[chunk_nr]
+                chunk_rows.pop(chunk_nr, None)
+                responses[chunk_nr] = progress
+                seconds = time.perf_counter() - submitted.pop(chunk_nr)
+                n_rows = sizes.pop(chunk_nr, None)
+                client.metrics.emit(
+                    'progress',
+                    chunk=chunk_nr,
+                    rows=n_rows,
+                    state=progress['workflow_state'],
+                    seconds=seconds,
+                    polls=polls.pop(chunk_nr)
+                )
+                # Jobs picked up from the journal were submitted in an earlier run and say nothing about chunk sizes
+                if n_rows is not None:
+                    chunk_sizer.observe(n_rows, seconds, progress['workflow_state'])
+                if journal is not None:
+                    journal.record(digests[chunk_nr], state=progress['workflow_state'])
+            progress_bar.update(len(finished))
+
+            # Poll quickly while jobs are finishing, back off while Canvas is still working on them
+            interval = poll_interval if finished else min(interval * POLL_BACKOFF_FACTOR, POLL_INTERVAL_MAX)
+
+    if verify and unknown:
+        recover_chunks(client, cv_course_id, cv_assignment_id, unknown, responses, digests, journal, chunk_sizer)
+
+    for chunk_nr, chunk_user_ids in user_ids.items():
+        responses[chunk_nr]['user_ids'] = chunk_user_ids
+    return responses
+
+
+def recover_chunks(
+        client: CanvasClient,
+        cv_course_id: int,
+        cv_assignment_id: int,
+        unknown: tp.Dict[int, tp.Sequence[GradeRecord]],
+        responses: tp.List[tp.Dict[str, tp.Any]],
+        digests: tp.Dict[int, str],
+        journal: tp.Optional[Journal] = None,
+        chunk_sizer: tp.Optional[ChunkSizer] = None
+) -> None:
+    """
+    Find out which rows of chunks with an unknown outcome Canvas applied, and post the others again.
+
+    The submissions are compared like `diff.changed_rows` does; rows whose grade and latest comment already match
+    are not posted again, so no comment is added twice. The response of every chunk in `responses` is replaced by the
+    outcome: a completed Progress object if it is confirmed or posted again successfully, a failed one otherwise.
+    """
+
+    try:
+        state = fetch_submission_state(client, cv_course_id, cv_assignment_id)
+    except (CanvasError, requests.RequestException) as e:
+        for chunk_nr in unknown:
+            responses[chunk_nr]['message'] += f' (could not check the submissions: {e})'
+        return
+
+    for chunk_nr, data_chunk in unknown.items():
+        remaining = list(changed_rows(data_chunk, state))
+        if not remaining:
+            responses[chunk_nr] = {
+                'url': None,
+                'workflow_state': 'completed',
+                'message': 'Confirmed in Canvas after: ' + responses[chunk_nr]['message']
+            }
+        else:
+            # The remaining rows are a part of a chunk that fitted, so they are posted as one chunk again
+            retry_sizer = ChunkSizer(
+                initial=len(remaining),
+                min_rows=1,
+                max_rows=len(remaining),
+                max_bytes=chunk_sizer.max_bytes if chunk_sizer is not None else CHUNK_MAX_BYTES
+            )
+            retried = upload_rows(
+                client,
+                cv_course_id,
+                cv_assignment_id,
+                remaining,
+                journal=journal,
+                chunk_sizer=retry_sizer,
+                verify=False
+            )
+            responses[chunk_nr] = retried[0] if len(retried) == 1 else {
+                'url': None,
+                'workflow_state': 'completed' if all(
+                    response['workflow_state'] == 'completed' for response in retried) else 'failed',
+                'message': '; '.join(response['message'] for response in retried if response.get('message'))
+            }
+        if journal is not None and chunk_nr in digests and responses[chunk_nr]['workflow_state'] == 'completed':
+            journal.record(digests[chunk_nr], state='completed')
+
+
+def format_failures(responses: tp.Sequence[tp.Dict[str, tp.Any]], limit: int = 10) -> str:
+    """
+    Format the chunks of `upload_rows` that did not complete, one line per chunk with its user ids and error.
+    """
+
+    failed = [
+        (chunk_nr, response) for chunk_nr, response in enumerate(responses) if response['workflow_state'] != 'completed'
+    ]
+    lines = [f'{len(failed)} of {len(responses)} chunks did not complete']
+    for chunk_nr, response in failed:
+        user_ids = response.get('user_ids')
+        rows = ', '.join(map(str, user_ids[:limit])) + (', ...' if len(user_ids) > limit else '') if user_ids else '?'
+        lines.append(
+            f"chunk {chunk_nr + 1} (user ids {rows}): {response['workflow_state']}, {response.get('message') or ''}")
+    return '\n'.join(lines)
 
 
 def upload_appraisals(
         in_filepath: str,
-        cv_access_token: str,
+        cv_access_token: tp.Optional[str],
         cv_course_id: int,
         cv_assignment_id: int,
         html_format: bool = DEFAULT_HTML_FORMAT,
         submission_comment_header: str = DEFAULT_SUBMISSION_COMMENT_HEADER,
         grade_header: str = DEFAULT_GRADE_HEADER,
-        workbook_tab: str = DEFAULT_WORKBOOK_TAB
-) -> tp.List[tp.Any]:
+        workbook_tab: str = DEFAULT_WORKBOOK_TAB,
+        max_in_flight: int = DEFAULT_MAX_IN_FLIGHT,
+        client: tp.Optional[CanvasClient] = None,
+        changed_only: bool = False,
+        current_state: tp.Optional[SubmissionState] = None,
+        journal: bool = True,
+        resume: bool = False,
+        comment_processes: tp.Optional[int] = None,
+        input_format: tp.Optional[str] = None,
+        chunk_sizer: tp.Optional[ChunkSizer] = None,
+        validate: bool = True,
+        roster: tp.Optional[Roster] = None,
+        grade_decimals: int = GRADE_DECIMALS,
+        blank_grades: str = DEFAULT_BLANK_GRADES,
+        poll_interval: float = POLL_INTERVAL_MIN
+) -> tp.List[tp.Dict[str, tp.Any]]:
     """
     Upload assignment comments and grades from an excel workbook, with multiple assignments per post.
 
-    :param in_filepath: File path to workbook containing grade and comment data, with Canvas user_id's
-    included under the header "user_id".
+    The workbook is streamed through the pipeline stages into `upload_rows`, so the first chunk is uploaded while the
+    rest of the workbook is still being read and no more than a few chunks are held in memory. Chunks are sized by
+    request body and row count, adapting to how fast Canvas processes them (see `chunking.ChunkSizer`).
+
+    With `validate`, all rows are first checked against the roster of the assignment (see `validate.check_rows`) and
+    a `ValidationError` listing every problem is raised before anything is uploaded. Warnings, such as grades above
+    the points possible, are printed and do not stop the upload.
+
+    With `changed_only`, rows are compared with the current grades and latest comments in Canvas and only new and
+    changed rows are uploaded. A summary of skipped, changed and new rows is printed afterwards.
+
+    Uploaded chunks are recorded in a journal next to the workbook (see `journal.journal_filepath`), so that an
+    interrupted run can be continued with `resume` without uploading completed chunks and their comments again.
+
+    :param in_filepath: File path to workbook (or CSV, JSON Lines or Parquet file) containing grade and comment data,
+    with Canvas user_id's included under the header "user_id".
     :type in_filepath: str
     :param cv_access_token: Canvas access token (generally 70 characters in length; see
     https://canvas.instructure.com/courses/785215/pages/getting-started-with-the-api).
@@ -36,6 +474,8 @@ def upload_appraisals(
     :type cv_course_id: int
     :param cv_assignment_id: Assignment identifier (see Canvas assignment URL).
     :type cv_assignment_id: int
+    :param html_format: Indicate that submission comment is in HTML
+    :type html_format: bool
     :param submission_comment_header: Header of the submission comment column in the Excel workbook. Default is
     "submission_comment".
     :type submission_comment_header: str
@@ -43,86 +483,185 @@ def upload_appraisals(
     :type grade_header: str
     :param workbook_tab: The name of the worksheet from which data should be retrieved.
     :type workbook_tab: str
-    :return: Dictionary with updated assignment meta data or an error message
-    :rtype: dict
+    :param max_in_flight: Maximum number of chunks whose Progress job has not reached a final state yet.
+    :type max_in_flight: int
+    :param client: Client to share between calls. Default is a new client for `cv_access_token`.
+    :type client: CanvasClient or None
+    :param changed_only: Boolean indicating whether only rows that differ from the current Canvas state are uploaded.
+    :type changed_only: bool
+    :param current_state: Cached Canvas state to compare with, see `diff.fetch_submission_state`. Default is to
+    retrieve the state from Canvas.
+    :type current_state: dict or None
+    :param journal: Boolean indicating whether uploaded chunks are recorded in the journal next to the workbook.
+    :type journal: bool
+    :param resume: Boolean indicating whether to skip the chunks that the journal shows as completed and to poll the
+    Progress jobs that were still running.
+    :type resume: bool
+    :param comment_processes: Number of worker processes converting HTML comments. Default is to convert them in this
+    process.
+    :type comment_processes: int or None
+    :param input_format: Format of the input file, one of "xlsx", "csv", "jsonl" or "parquet". Default is to detect the
+    format from the file extension.
+    :type input_format: str or None
+    :param chunk_sizer: Chunking policy, see `chunking.ChunkSizer`. Default is to size chunks adaptively within the
+    default bounds.
+    :type chunk_sizer: ChunkSizer or None
+    :param validate: Boolean indicating whether to check all rows before uploading.
+    :type validate: bool
+    :param roster: Roster to validate against. Default is the cached roster of the assignment, see
+    `validate.cached_roster`.
+    :type roster: Roster or None
+    :param grade_decimals: Number of decimals to round numeric grades to, see `encoding.normalize_grade`.
+    :type grade_decimals: int
+    :param blank_grades: What to do with blank grades: "keep" the grade in Canvas or "clear" it.
+    :type blank_grades: str
+    :param poll_interval: Seconds between polls of the Progress jobs while they are finishing, see `upload_rows`.
+    :type poll_interval: float
+    :return: List with the final Progress object (state "completed" or "failed") of every chunk, in chunk order
+    :rtype: list
     """
 
-    fields = ['user_id', grade_header, submission_comment_header]
-    data = get_excel(
-        in_filepath,
-        workbook_tab,
-        include_fieldnames=fields,
-        return_headers=False
-    )
-
-    for i, row in enumerate(data):
-        data[i][0] = int(row[0])
-
-    responses = []
-    for data_chunk in tqdm(chunker(data)):
-        params = {'grade_data': {}}
-        for cv_id_user, grade, submission_comment in data_chunk:
-            params['grade_data'][int(cv_id_user)] = {
-                # TODO: Create a test to verify robustness against floating point imprecision errors
-                'posted_grade': str(grade),
-                # TODO: Check encoding and non-ASCII character issues
-                'text_comment': submission_comment if html_format is False else BeautifulSoup(
-                    submission_comment.replace("<br>", "\n"), features="html.parser").get_text()
-            }
-        url = CANVAS_UPDATE_GRADES_URL.format(cid=cv_course_id, aid=cv_assignment_id)
-        response = requests.post(
-            url,
-            headers={
-                'Authorization': 'Bearer ' + cv_access_token,
-                'Content-type': 'application/json'
-            },
-            json=params
-        )
-        if response.status_code // 100 != 2:
-            raise Exception(f'Got an error {response.status_code} from {url}: {response.text}')
-
-        body = json.loads(response.text)
-        state = 'queued'
-        while state == 'queued':
-            time.sleep(SLEEP_UPLOAD_APPRAISALS)
-            url = body['url']
-            response = requests.get(
-                url,
-                headers={
-                    'Authorization': 'Bearer ' + cv_access_token,
-                    'Content-type': 'application/json'
-                }
-            )
-            if response.status_code // 100 != 2:
-                raise Exception(
-                    f'Got an error {response.status_code} from {url}: {response.text}')
+    if resume and not journal:
+        raise ValueError('Cannot resume an upload without a journal.')
+    upload_journal = Journal(journal_filepath(in_filepath)) if journal else None
 
-            progress = json.loads(response.text)
-            state = progress['workflow_state']
+    with ensure_client(client, cv_access_token) as client:
+        fields = ['user_id', grade_header, submission_comment_header]
+        if validate:
+            refetch = None
+            if roster is None:
+                roster = cached_roster(client, cv_course_id, cv_assignment_id)
+                refetch = partial(cached_roster, client, cv_course_id, cv_assignment_id, refresh=True)
+            with client.metrics.stage('validate'):
+                issues = validate_rows(
+                    iter_rows(in_filepath, fields, workbook_tab, input_format), roster, grade_decimals, refetch,
+                    blank_grades)
+            if has_errors(issues):
+                raise ValidationError(issues)
+            if issues:
+                print(format_issues(issues))
 
-        responses.append(body)
+        rows = client.metrics.timed_iter('read', iter_rows(in_filepath, fields, workbook_tab, input_format))
+        rows = client.metrics.timed_iter(
+            'convert', convert_comments(
+                format_grades(coerce_user_ids(rows), grade_decimals, blank_grades), html_format, comment_processes))
+        if not changed_only:
+            return upload_rows(
+                client,
+                cv_course_id,
+                cv_assignment_id,
+                rows,
+                max_in_flight,
+                journal=upload_journal,
+                resume=resume,
+                chunk_sizer=chunk_sizer,
+                poll_interval=poll_interval
+            )
+
+        if current_state is None:
+            current_state = fetch_submission_state(client, cv_course_id, cv_assignment_id)
+        summary = Counter()
+        responses = upload_rows(
+            client,
+            cv_course_id,
+            cv_assignment_id,
+            changed_rows(rows, current_state, summary),
+            max_in_flight,
+            journal=upload_journal,
+            resume=resume,
+            chunk_sizer=chunk_sizer,
+            poll_interval=poll_interval
+        )
 
+    print(format_summary(summary))
     return responses
 
 
+def put_appraisal(
+        client: CanvasClient,
+        url: str,
+        grade: tp.Optional[str],
+        submission_comment: tp.Optional[str]
+) -> tp.Dict[str, tp.Any]:
+    """
+    Upload the grade and comment of a single student.
+
+    A request with only a grade is retried on server errors and timeouts. A request with a comment is not, as every
+    request adds the comment again; if its outcome is unknown, the submission is checked first and the request is
+    sent once more only if Canvas did not apply it.
+
+    :param client: Client to send the request with.
+    :type client: CanvasClient
+    :param url: The submission URL of the student.
+    :type url: str
+    :param grade: The grade to post, None to leave the grade as is.
+    :type grade: str or None
+    :param submission_comment: The plain text submission comment to post, if any.
+    :type submission_comment: str or None
+    :return: The updated submission, or a dictionary with keys "status_code" and "error" if Canvas returned an error
+    :rtype: dict
+    """
+
+    params = {}
+    if submission_comment:
+        params['comment'] = {'text_comment': submission_comment}
+    if grade is not None:
+        params['submission'] = {'posted_grade': grade}
+    # Only a grade can be sent twice safely, every request adds the comment again
+    try:
+        response = client.put(url, json=params, idempotent=not submission_comment)
+    except requests.RequestException as e:
+        if not submission_comment or not is_ambiguous(e):
+            raise
+        response = None
+
+    if submission_comment and (response is None or response.status_code in RETRY_STATUSES):
+        # Canvas may have applied the request, check before adding the comment again
+        current = check_response(client.get(url, params={'include[]': ['submission_comments']}), url)
+        submission = json.loads(current.text)
+        comments = submission.get('submission_comments') or []
+        if (grade is None or same_grade(grade, submission.get('grade'))) and comments and \
+                comments[-1]['comment'].strip() == submission_comment.strip():
+            return submission
+        response = client.put(url, json=params, idempotent=False)
+
+    if response.status_code // 100 != 2:
+        return {'status_code': response.status_code, 'error': response.text}
+
+    return json.loads(response.text)
+
+
 def upload_appraisal(
-        cv_access_token: str,
+        cv_access_token: tp.Optional[str],
         workbook_path: str,
         cv_course_id: int,
         cv_assignment_id: int,
         html_format: bool = DEFAULT_HTML_FORMAT,
         submission_comment_header: str = DEFAULT_SUBMISSION_COMMENT_HEADER,
         grade_header: str = DEFAULT_GRADE_HEADER,
-        workbook_tab: str = DEFAULT_WORKBOOK_TAB
+        workbook_tab: str = DEFAULT_WORKBOOK_TAB,
+        max_workers: int = DEFAULT_MAX_WORKERS,
+        client: tp.Optional[CanvasClient] = None,
+        comment_processes: tp.Optional[int] = None,
+        input_format: tp.Optional[str] = None,
+        validate: bool = True,
+        roster: tp.Optional[Roster] = None,
+        grade_decimals: int = GRADE_DECIMALS,
+        blank_grades: str = DEFAULT_BLANK_GRADES
 ) -> tp.Dict[int, tp.Any]:
     """
     Upload assignment comments and grades from an excel workbook, one assignment at a time.
 
+    Uploads run concurrently on at most `max_workers` threads. A failed upload does not stop the others; its entry in
+    the returned dictionary holds the status code and error text instead of the updated submission. With `validate`,
+    a `ValidationError` is raised before the first upload if any row fails the checks of `validate.check_rows`;
+    warnings are printed.
+
     :param cv_access_token: Canvas access token (generally 70 characters in length; see
     https://canvas.instructure.com/courses/785215/pages/getting-started-with-the-api).
     :type cv_access_token: str
-    :param workbook_path: File path to workbook containing grade and comment data, with Canvas user_id's included
-    under the header "user_id".
+    :param workbook_path: File path to workbook (or CSV, JSON Lines or Parquet file) containing grade and comment data,
+    with Canvas user_id's included under the header "user_id".
     :type workbook_path: str
     :param cv_course_id: Course identifier (see Canvas course URL).
     :type cv_course_id: int
@@ -137,39 +676,69 @@ def upload_appraisal(
     :type grade_header: str
     :param workbook_tab: The name of the worksheet from which data should be retrieved.
     :type workbook_tab: str
-    :return: Dictionary with updated assignment meta data or an error message
+    :param max_workers: Maximum number of uploads running at the same time.
+    :type max_workers: int
+    :param client: Client to share between calls. Default is a new client for `cv_access_token`.
+    :type client: CanvasClient or None
+    :param comment_processes: Number of worker processes converting HTML comments. Default is to convert them in this
+    process.
+    :type comment_processes: int or None
+    :param input_format: Format of the input file, one of "xlsx", "csv", "jsonl" or "parquet". Default is to detect the
+    format from the file extension.
+    :type input_format: str or None
+    :param validate: Boolean indicating whether to check all rows before uploading.
+    :type validate: bool
+    :param roster: Roster to validate against. Default is the cached roster of the assignment, see
+    `validate.cached_roster`.
+    :type roster: Roster or None
+    :param grade_decimals: Number of decimals to round numeric grades to, see `encoding.normalize_grade`.
+    :type grade_decimals: int
+    :param blank_grades: What to do with blank grades: "keep" the grade in Canvas or "clear" it.
+    :type blank_grades: str
+    :return: Dictionary with updated assignment meta data or an error message per user id, in workbook order
     :rtype: dict
     """
 
-    fields = ["user_id", grade_header, submission_comment_header]
-    data = get_excel(workbook_path, workbook_tab, include_fieldnames=fields, return_headers=False)
-    for i, row in enumerate(data):
-        data[i][0] = int(row[0])
-    responses = {}
-    for cv_user_id, grade, submission_comment in data:
-        params = {
-            'comment': {'text_comment': submission_comment if html_format is False else BeautifulSoup(
-                submission_comment.replace("<br>", "\n"), features="html.parser").get_text()},
-            'submission': {'posted_grade': grade}
-        }
+    if max_workers < 1:
+        raise ValueError(f'max_workers should be at least 1, got {max_workers}')
 
-        url = CANVAS_SUBMISSION_URL.format(
-            cid=cv_course_id,
-            aid=cv_assignment_id,
-            uid=cv_user_id
-        )
-        response = requests.put(
-            url,
-            headers={
-                'Authorization': 'Bearer ' + cv_access_token,
-                'Content-type': 'application/json'
-            },
-            json=params,
-        )
-        if response.status_code // 100 != 2:
-            raise Exception(f'Got an error {response.status_code} from {url}: {response.text}')
+    with ensure_client(client, cv_access_token) as client, ThreadPoolExecutor(max_workers=max_workers) as executor:
+        fields = ["user_id", grade_header, submission_comment_header]
+        if validate:
+            refetch = None
+            if roster is None:
+                roster = cached_roster(client, cv_course_id, cv_assignment_id)
+                refetch = partial(cached_roster, client, cv_course_id, cv_assignment_id, refresh=True)
+            with client.metrics.stage('validate'):
+                issues = validate_rows(
+                    iter_rows(workbook_path, fields, workbook_tab, input_format), roster, grade_decimals, refetch,
+                    blank_grades)
+            if has_errors(issues):
+                raise ValidationError(issues)
+            if issues:
+                print(format_issues(issues))
+        rows = client.metrics.timed_iter('read', iter_rows(workbook_path, fields, workbook_tab, input_format))
+        data = GradeBatch(client.metrics.timed_iter('convert', convert_comments(
+            format_grades(coerce_user_ids(rows), grade_decimals, blank_grades), html_format, comment_processes)))
+
+        futures = [
+            executor.submit(
+                put_appraisal,
+                client,
+                client.url(CANVAS_SUBMISSION_PATH, cid=cv_course_id, aid=cv_assignment_id, uid=cv_user_id),
+                grade,
+                submission_comment
+            )
+            for cv_user_id, grade, submission_comment in data
+        ]
 
-        time.sleep(SLEEP_UPLOAD_APPRAISAL)
-        responses[cv_user_id] = json.loads(response.text)
+        responses = {}
+        for (cv_user_id, _, _), future in zip(data, futures):
+            try:
+                responses[cv_user_id] = future.result()
+            except requests.RequestException as e:
+                responses[cv_user_id] = {'status_code': None, 'error': str(e)}
+            except CanvasError as e:
+                responses[cv_user_id] = {'status_code': e.status_code, 'error': str(e)}
 
     return responses
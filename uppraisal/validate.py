@@ -0,0 +1,304 @@
+# -*- coding: utf-8 -*-
+
+import hashlib
+import json
+import math
+import os
+import re
+import time
+import typing as tp
+
+from .constants import *
+from .client import CanvasClient
+from .encoding import normalize_grade
+from .errors import check_response
+from .helpers import iter_submissions
+from .records import parse_user_id
+
+
+class Roster(tp.NamedTuple):
+    """
+    The students of an assignment and its maximum number of points, as far as needed to validate uploads.
+    """
+
+    user_ids: tp.FrozenSet[int]
+    points_possible: tp.Optional[float]
+
+
+class Issue(tp.NamedTuple):
+    """
+    A problem with a row found before uploading. `row` is the number of the data row, starting at 1.
+
+    Issues of a kind in `VALIDATION_WARNINGS` are warnings: they are reported, but do not hold back the upload.
+    """
+
+    row: int
+    user_id: tp.Any
+    kind: str
+    message: str
+
+    @property
+    def warning(self) -> bool:
+        return self.kind in VALIDATION_WARNINGS
+
+
+def has_errors(issues: tp.Iterable[Issue]) -> bool:
+    """
+    Check whether any of the issues is not a warning, i.e. whether the upload should be held back.
+    """
+
+    return any(not issue.warning for issue in issues)
+
+
+class ValidationError(ValueError):
+    """
+    Raised when rows fail pre-flight validation; the problems are available as `issues`.
+    """
+
+    def __init__(self, issues: tp.Sequence[Issue]):
+        super().__init__(format_issues(issues))
+        self.issues = list(issues)
+
+
+def fetch_roster(client: CanvasClient, cv_course_id: int, cv_assignment_id: int, refresh: bool = False) -> Roster:
+    """
+    Retrieve the user ids of all students of an assignment and the points possible for it.
+
+    :param client: Client to send the requests with.
+    :type client: CanvasClient
+    :param cv_course_id: Course identifier (see Canvas course URL).
+    :type cv_course_id: int
+    :param cv_assignment_id: Assignment identifier (see Canvas assignment URL).
+    :type cv_assignment_id: int
+    :param refresh: Boolean indicating whether cached pages of the submission listing are revalidated with Canvas even
+    if they are still fresh.
+    :type refresh: bool
+    :return: The roster of the assignment
+    :rtype: Roster
+    """
+
+    url = client.url(CANVAS_ASSIGNMENT_PATH, cid=cv_course_id, aid=cv_assignment_id)
+    response = check_response(client.get(url), url)
+    points_possible = json.loads(response.text).get('points_possible')
+
+    submissions = iter_submissions(
+        None,
+        cv_course_id,
+        cv_assignment_id,
+        select_columns=('user_id',),
+        client=client,
+        include=(),
+        submitted_only=False,
+        refresh=refresh
+    )
+    return Roster(
+        frozenset(int(submission['user_id']) for submission in submissions),
+        None if points_possible is None else float(points_possible)
+    )
+
+
+def roster_filepath(
+        cv_course_id: int,
+        cv_assignment_id: int,
+        cache_dir: str = CACHE_DIR,
+        base_url: str = CANVAS_BASE_URL
+) -> str:
+    """
+    Location of the cached roster of an assignment; rosters of different Canvas instances are kept apart.
+    """
+
+    instance = hashlib.sha1(base_url.rstrip('/').encode('utf-8')).hexdigest()[:12]
+    return os.path.join(cache_dir, f'roster_{instance}_{cv_course_id}_{cv_assignment_id}.json')
+
+
+def save_roster(filepath: str, roster: Roster) -> None:
+    """
+    Save a roster to a JSON file, see `load_roster`.
+    """
+
+    os.makedirs(os.path.dirname(os.path.abspath(filepath)), exist_ok=True)
+    with open(filepath, 'w', encoding='utf-8') as f:
+        json.dump({'user_ids': sorted(roster.user_ids), 'points_possible': roster.points_possible}, f)
+
+
+def load_roster(filepath: str) -> Roster:
+    """
+    Load a roster saved with `save_roster`.
+    """
+
+    with open(filepath, encoding='utf-8') as f:
+        data = json.load(f)
+    return Roster(frozenset(data['user_ids']), data['points_possible'])
+
+
+def cached_roster(
+        client: CanvasClient,
+        cv_course_id: int,
+        cv_assignment_id: int,
+        cache_dir: str = CACHE_DIR,
+        ttl: float = ROSTER_CACHE_TTL,
+        refresh: bool = False
+) -> Roster:
+    """
+    Roster of an assignment from the local cache, retrieved from Canvas if it is missing, older than `ttl` seconds or
+    `refresh` is True.
+
+    :param client: Client to send the requests with.
+    :type client: CanvasClient
+    :param cv_course_id: Course identifier (see Canvas course URL).
+    :type cv_course_id: int
+    :param cv_assignment_id: Assignment identifier (see Canvas assignment URL).
+    :type cv_assignment_id: int
+    :param cache_dir: Directory of the cached rosters.
+    :type cache_dir: str
+    :param ttl: Maximum age of a cached roster in seconds.
+    :type ttl: float
+    :param refresh: Boolean indicating whether to ignore the cached roster and revalidate the cached listing pages.
+    :type refresh: bool
+    :return: The roster of the assignment
+    :rtype: Roster
+    """
+
+    filepath = roster_filepath(cv_course_id, cv_assignment_id, cache_dir, client.base_url)
+    if not refresh and os.path.exists(filepath) and time.time() - os.path.getmtime(filepath) < ttl:
+        return load_roster(filepath)
+
+    roster = fetch_roster(client, cv_course_id, cv_assignment_id, refresh)
+    save_roster(filepath, roster)
+    return roster
+
+
+def _grade_issue(
+        grade: tp.Any,
+        roster: tp.Optional[Roster],
+        decimals: int,
+        blank: str
+) -> tp.Optional[tp.Tuple[str, str]]:
+    # Check the grade as it will be posted, so rounding and the handling of blank grades apply as in the upload
+    if isinstance(grade, str) and re.fullmatch(r'-?\d+,\d+', grade.strip()):
+        grade = grade.strip()
+        return 'grade_format', f'grade {grade!r} uses a decimal comma, Canvas expects {grade.replace(",", ".")!r}'
+    try:
+        posted = normalize_grade(grade, decimals, blank)
+    except ValueError as e:
+        return 'grade_format', str(e)
+    if not posted:
+        return None
+
+    try:
+        value = float(posted.rstrip('%'))
+    except ValueError:
+        # Letter grades, "pass", "complete" and the like are checked by Canvas
+        return None
+    if not math.isfinite(value):
+        return 'grade_format', f'grade {grade!r} is not a number'
+    if posted.endswith('%'):
+        if value < 0:
+            return 'out_of_range', f'grade {posted} is below 0%'
+        if value > 100:
+            return 'above_points_possible', f'grade {posted} is above 100%, extra credit?'
+        return None
+    if value < 0:
+        return 'out_of_range', f'grade {posted} is below 0'
+    points_possible = roster.points_possible if roster is not None else None
+    if points_possible is not None and value > points_possible:
+        return 'above_points_possible', f'grade {posted} is above {points_possible:g} points possible, extra credit?'
+    return None
+
+
+def check_rows(
+        rows: tp.Iterable[tp.Sequence[tp.Any]],
+        issues: tp.List[Issue],
+        roster: tp.Optional[Roster] = None,
+        decimals: int = GRADE_DECIMALS,
+        refetch: tp.Optional[tp.Callable[[], Roster]] = None,
+        blank: str = DEFAULT_BLANK_GRADES
+) -> tp.Iterator[tp.Sequence[tp.Any]]:
+    """
+    Pipeline stage passing on rows unchanged while appending the problems it finds to `issues`.
+
+    Rows are checked as read, before any other stage: the user id must be an integer, occur only once and, with a
+    `roster`, belong to a student of the assignment. As a cached roster may predate the enrollment of a student, the
+    roster is retrieved again with `refetch`, once, before a user id is reported as not enrolled. Grades are checked
+    as they will be posted, i.e. after `encoding.normalize_grade` with `decimals` and `blank`: the grade must be a
+    number or text that can be normalized, and must not be negative if it is a number. Blank grades are not reported,
+    as `blank` decides what happens to them. Grades above the points possible (100% for percentages) and blank
+    comments are reported as warnings, see `Issue`.
+
+    :param rows: Iterable of rows with the user id, grade and submission comment as read from the file.
+    :type rows: iterable
+    :param issues: List the problems are appended to.
+    :type issues: list
+    :param roster: Roster to check user ids and grades against. Default is to skip those checks.
+    :type roster: Roster or None
+    :param decimals: Number of decimals that grades are rounded to.
+    :type decimals: int
+    :param refetch: Function retrieving the current roster, e.g. `cached_roster` with `refresh`. Default is to report
+    user ids missing from `roster` right away.
+    :type refetch: callable or None
+    :param blank: What to do with blank grades, one of `BLANK_GRADES`.
+    :type blank: str
+    :return: Iterator over the unchanged rows
+    :rtype: iterator
+    """
+
+    first_row: tp.Dict[int, int] = {}
+    for row_nr, row in enumerate(rows, 1):
+        raw_user_id, grade, comment = row
+        user_id = parse_user_id(raw_user_id)
+        if user_id is None:
+            issues.append(Issue(row_nr, raw_user_id, 'invalid_user_id', f'user id {raw_user_id!r} is not an integer'))
+        elif user_id in first_row:
+            issues.append(Issue(row_nr, user_id, 'duplicate_user_id', f'user id also in row {first_row[user_id]}'))
+        else:
+            first_row[user_id] = row_nr
+            if roster is not None and user_id not in roster.user_ids and refetch is not None:
+                roster, refetch = refetch(), None
+            if roster is not None and user_id not in roster.user_ids:
+                issues.append(Issue(row_nr, user_id, 'not_enrolled', 'user id is not a student of the assignment'))
+
+        grade_issue = _grade_issue(grade, roster, decimals, blank)
+        if grade_issue is not None:
+            issues.append(Issue(row_nr, raw_user_id if user_id is None else user_id, *grade_issue))
+        if comment is None or (isinstance(comment, str) and not comment.strip()):
+            issues.append(Issue(row_nr, raw_user_id if user_id is None else user_id, 'blank_comment',
+                                'the submission comment is blank'))
+
+        yield row
+
+
+def validate_rows(
+        rows: tp.Iterable[tp.Sequence[tp.Any]],
+        roster: tp.Optional[Roster] = None,
+        decimals: int = GRADE_DECIMALS,
+        refetch: tp.Optional[tp.Callable[[], Roster]] = None,
+        blank: str = DEFAULT_BLANK_GRADES
+) -> tp.List[Issue]:
+    """
+    Check all rows at once, see `check_rows`.
+
+    :return: List with the problems found, in row order
+    :rtype: list
+    """
+
+    issues: tp.List[Issue] = []
+    for _ in check_rows(rows, issues, roster, decimals, refetch, blank):
+        pass
+    return issues
+
+
+def format_issues(issues: tp.Sequence[Issue], limit: int = VALIDATION_REPORT_LIMIT) -> str:
+    """
+    Format validation problems and warnings as one line per issue, listing at most `limit` of them.
+    """
+
+    n_warnings = sum(issue.warning for issue in issues)
+    lines = [f'{len(issues) - n_warnings} problems found before uploading'
+             + (f' and {n_warnings} warnings:' if n_warnings else ':')]
+    lines += [
+        f"row {issue.row} (user id {issue.user_id}): {'warning, ' if issue.warning else ''}{issue.message}"
+        for issue in issues[:limit]
+    ]
+    if len(issues) > limit:
+        lines.append(f'... and {len(issues) - limit} more')
+    return '\n'.join(lines)
@@ -0,0 +1,253 @@
+# -*- coding: utf-8 -*-
+
+import hashlib
+import os
+import threading
+import time
+import typing as tp
+
+import requests
+
+from .constants import *
+from .batch import read_manifest_rows
+from .client import CanvasClient
+from .errors import CanvasError
+from .journal import Journal
+from .journal import journal_filepath
+from .journal import row_digest
+from .records import GradeRecord
+from .uppraisal import upload_rows
+from .validate import Issue
+from .validate import cached_roster
+from .validate import format_issues
+from .validate import has_errors
+
+Signature = tp.Optional[tp.Tuple[int, int]]
+
+
+def file_signature(filepath: str) -> Signature:
+    """
+    Modification time in nanoseconds and size of a file, None if it does not exist.
+    """
+
+    try:
+        stat = os.stat(filepath)
+    except FileNotFoundError:
+        return None
+    return stat.st_mtime_ns, stat.st_size
+
+
+def file_digest(filepath: str) -> tp.Optional[str]:
+    """
+    Content hash of a file, None if it does not exist.
+    """
+
+    digest = hashlib.sha1()
+    try:
+        with open(filepath, 'rb') as f:
+            for block in iter(lambda: f.read(1 << 20), b''):
+                digest.update(block)
+    except FileNotFoundError:
+        return None
+    return digest.hexdigest()
+
+
+class FileWatcher(object):
+    """
+    Poll a set of files for saves.
+
+    A file counts as saved once its modification time and size have not changed for `debounce` seconds, so that
+    several saves in quick succession (or a save that is still being written) are reported once. A new modification
+    time whose content hash equals the last reported content, e.g. after saving without changes, is not reported.
+
+    :param filepaths: Files to watch.
+    :type filepaths: iterable
+    :param debounce: Seconds a file should be left alone before its change is reported.
+    :type debounce: float
+    """
+
+    def __init__(self, filepaths: tp.Iterable[str], debounce: float = WATCH_DEBOUNCE):
+        self.debounce = debounce
+        self._signatures: tp.Dict[str, Signature] = {}
+        self._digests: tp.Dict[str, tp.Optional[str]] = {}
+        self._changed_at: tp.Dict[str, float] = {}
+        for filepath in filepaths:
+            self._signatures[filepath] = file_signature(filepath)
+            self._digests[filepath] = file_digest(filepath)
+
+    def poll(self) -> tp.List[str]:
+        """
+        Return the files whose changes have settled since the last poll.
+        """
+
+        now = time.monotonic()
+        saved = []
+        for filepath, signature in self._signatures.items():
+            current = file_signature(filepath)
+            if current != signature:
+                self._signatures[filepath] = current
+                self._changed_at[filepath] = now
+            elif filepath in self._changed_at and now - self._changed_at[filepath] >= self.debounce:
+                del self._changed_at[filepath]
+                digest = file_digest(filepath)
+                if digest is not None and digest != self._digests[filepath]:
+                    self._digests[filepath] = digest
+                    saved.append(filepath)
+        return saved
+
+    def retry(self, filepath: str) -> None:
+        """
+        Report a file again after the debounce time, e.g. because it could not be read while it was being saved.
+        """
+
+        self._digests[filepath] = None
+        self._changed_at[filepath] = time.monotonic()
+
+
+class WatchedUpload(object):
+    """
+    Rows of one assignment as last uploaded from a watched file.
+
+    `uploaded` maps every user id to the digest of the row that was last uploaded successfully (see
+    `journal.row_digest`), so that only rows that changed since are uploaded again, including rows that were changed
+    back to an earlier version.
+    """
+
+    def __init__(self, entry: tp.Dict[str, tp.Any], journal: tp.Optional[Journal] = None):
+        self.entry = entry
+        self.journal = journal
+        self.uploaded: tp.Optional[tp.Dict[int, str]] = None
+
+    def changed(self, records: tp.Iterable[GradeRecord]) -> tp.Dict[int, tp.Tuple[str, GradeRecord]]:
+        """
+        Map the user id of every record that differs from its last upload to its digest and the record.
+
+        On the first call, rows that the journal shows as completed in an earlier run count as uploaded.
+        """
+
+        digests = {
+            record.user_id: (row_digest(self.entry['course'], self.entry['assignment'], record), record)
+            for record in records
+        }
+        if self.uploaded is None:
+            completed = self.journal.completed_rows(
+                self.entry['course'], self.entry['assignment']) if self.journal is not None else set()
+            self.uploaded = {user_id: digest for user_id, (digest, _) in digests.items() if digest in completed}
+        return {user_id: pair for user_id, pair in digests.items() if self.uploaded.get(user_id) != pair[0]}
+
+
+def watch(
+        entries: tp.Sequence[tp.Dict[str, tp.Any]],
+        client: CanvasClient,
+        interval: float = WATCH_INTERVAL,
+        debounce: float = WATCH_DEBOUNCE,
+        max_in_flight: int = DEFAULT_MAX_IN_FLIGHT,
+        journal: bool = True,
+        validate: bool = True,
+        stop: tp.Optional[threading.Event] = None,
+        log: tp.Callable[[str], None] = print
+) -> None:
+    """
+    Watch the files of one or more uploads and upload the rows that changed whenever a file is saved.
+
+    Every file is checked every `interval` seconds (see `FileWatcher`). When a file is saved, the rows of every upload
+    from that file are read and, with `validate`, checked against the cached roster of their assignment; rows with
+    problems hold back the whole upload until the next save. Only the rows that differ from what was last uploaded are
+    sent to the update_grades endpoint with `upload_rows`. Rows of chunks that failed are uploaded again with the next
+    change of the file. If Canvas cannot be reached for the roster or the upload, the error is logged and the file is
+    tried again after the debounce time, so the watch keeps running. At the start, the rows that changed since the
+    last upload recorded in the journal are uploaded.
+
+    :param entries: Uploads as returned by `batch.load_manifest`. The "changed_only" option is ignored, as only
+    changed rows are uploaded anyway.
+    :type entries: list
+    :param client: Client to send the requests with.
+    :type client: CanvasClient
+    :param interval: Seconds between checks of the files.
+    :type interval: float
+    :param debounce: Seconds a file should be left alone after a save before it is uploaded.
+    :type debounce: float
+    :param max_in_flight: Maximum number of unfinished Progress jobs per assignment.
+    :type max_in_flight: int
+    :param journal: Boolean indicating whether uploaded chunks are recorded in the journal next to each file.
+    :type journal: bool
+    :param validate: Boolean indicating whether to check all rows of an upload before uploading.
+    :type validate: bool
+    :param stop: Event that ends watching when set. Default is to watch until interrupted.
+    :type stop: threading.Event or None
+    :param log: Function called with a line describing every upload.
+    :type log: callable
+    """
+
+    stop = stop or threading.Event()
+    journals = {
+        entry['filepath']: Journal(journal_filepath(entry['filepath'])) for entry in entries
+    } if journal else {}
+    uploads = [WatchedUpload(entry, journals.get(entry['filepath'])) for entry in entries]
+    by_file: tp.Dict[str, tp.List[WatchedUpload]] = {}
+    for upload in uploads:
+        by_file.setdefault(upload.entry['filepath'], []).append(upload)
+
+    watcher = FileWatcher(by_file, debounce)
+    saved = list(by_file)
+    while True:
+        for filepath in saved:
+            name = os.path.basename(filepath)
+            watched = by_file[filepath]
+            if validate:
+                try:
+                    rosters = [cached_roster(client, upload.entry['course'], upload.entry['assignment'])
+                               for upload in watched]
+                except (CanvasError, requests.RequestException) as e:
+                    log(f'{name}: could not retrieve the roster, trying again: {e}')
+                    watcher.retry(filepath)
+                    continue
+                issues: tp.Optional[tp.List[tp.List[Issue]]] = [[] for _ in watched]
+            else:
+                rosters = issues = None
+            try:
+                with client.metrics.stage('read'):
+                    data = read_manifest_rows(
+                        [upload.entry for upload in watched], rosters=rosters, issues=issues, client=client)
+            except Exception as e:
+                # Most likely the file was read while it was being saved
+                log(f'{name}: could not read the file, trying again: {e}')
+                watcher.retry(filepath)
+                continue
+
+            for index, (upload, rows) in enumerate(zip(watched, data)):
+                entry = upload.entry
+                label = f"{name}, course {entry['course']}, assignment {entry['assignment']}"
+                if issues is not None and has_errors(issues[index]):
+                    log(f'{label}: not uploaded until the next save, {format_issues(issues[index], limit=3)}')
+                    continue
+                changed = upload.changed(rows)
+                if not changed:
+                    continue
+                if issues is not None and issues[index]:
+                    log(f'{label}: {format_issues(issues[index], limit=3)}')
+                try:
+                    responses = upload_rows(
+                        client,
+                        entry['course'],
+                        entry['assignment'],
+                        [record for _, record in changed.values()],
+                        max_in_flight,
+                        journal=upload.journal
+                    )
+                except (CanvasError, requests.RequestException) as e:
+                    # Rows that were not confirmed are still changed, so they are uploaded again with the retry
+                    log(f'{label}: upload interrupted, trying again: {e}')
+                    watcher.retry(filepath)
+                    continue
+                for response in responses:
+                    if response['workflow_state'] == 'completed':
+                        for user_id in response.get('user_ids', ()):
+                            upload.uploaded[user_id] = changed[user_id][0]
+                failed = sum(response['workflow_state'] != 'completed' for response in responses)
+                log(f'{label}: uploaded {len(changed)} changed rows in {len(responses)} chunks'
+                    + (f', {failed} chunks failed and are uploaded again with the next change' if failed else ''))
+
+        if stop.wait(interval):
+            return
+        saved = watcher.poll()